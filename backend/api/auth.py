@@ -1,11 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from pydantic import BaseModel
-from ..models import SessionLocal, User
+from ..models import SessionLocal, get_db, User
+from ..services.login_throttle import login_throttle, LoginThrottled
+from ..services.token_cache import token_cache
+import asyncio
+import math
+import os
 
 router = APIRouter()
 
@@ -16,6 +23,11 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/v1/auth/token")
 
+# bcrypt releases the GIL, so a small thread pool keeps hashing off the
+# event loop while capping how many cores a login burst can take
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+password_pool = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -34,13 +46,6 @@ class UserResponse(BaseModel):
     class Config:
         from_attributes = True
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -51,7 +56,23 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def load_user(username: str, user_id: Optional[int] = None) -> Optional[User]:
+    """Find a token's user, by primary key when the token carries a uid claim"""
+    db = SessionLocal()
+    try:
+        query = db.query(User).filter(User.username == username)
+        if user_id is not None:
+            query = query.filter(User.id == user_id)
+        return query.first()
+    finally:
+        db.close()
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    # Verified tokens are cached, so most requests skip both decoding and the database
+    user = token_cache.get(token)
+    if user is not None:
+        return user
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -64,9 +85,10 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = db.query(User).filter(User.username == username).first()
+    user = await run_in_threadpool(load_user, username, payload.get("uid"))
     if user is None:
         raise credentials_exception
+    token_cache.put(token, user, payload.get("exp"))
     return user
 
 @router.post("/auth/register", response_model=UserResponse)
@@ -79,7 +101,7 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    hashed_password = User.get_password_hash(user.password)
+    hashed_password = password_pool.submit(User.get_password_hash, user.password).result()
     db_user = User(
         username=user.username,
         email=user.email,
@@ -91,9 +113,21 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
     return db_user
 
 @router.post("/auth/token", response_model=Token)
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == form_data.username).first()
-    if not user or not User.verify_password(form_data.password, user.hashed_password):
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends()):
+    address = request.client.host if request.client else ""
+    try:
+        login_throttle.attempt(form_data.username, address)
+    except LoginThrottled as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(math.ceil(e.retry_after))},
+        )
+    user = await run_in_threadpool(load_user, form_data.username)
+    verified = user is not None and await asyncio.get_running_loop().run_in_executor(
+        password_pool, User.verify_password, form_data.password, user.hashed_password
+    )
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -101,6 +135,6 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
         )
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data={"sub": user.username, "uid": user.id}, expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
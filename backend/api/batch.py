@@ -0,0 +1,216 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from functools import partial
+from typing import Any, Dict, List, Tuple
+from ..executor.concurrency import ConcurrencyLimitExceeded, EXECUTOR_WORKERS
+from ..services.metrics_writer import record_invocations, METRICS_BATCH_SIZE
+from ..services.result_cache import result_cache
+from ..tracing import Trace
+from .execute import executor, worker_pool, limiter, find_function, resolve_layer, response_body
+import asyncio
+import json
+import os
+import time
+import uuid
+
+router = APIRouter()
+
+# Batch invocation configuration
+BATCH_DEFAULT_PARALLELISM = int(os.getenv("BATCH_DEFAULT_PARALLELISM", "4"))
+BATCH_MAX_PARALLELISM = int(os.getenv("BATCH_MAX_PARALLELISM", str(EXECUTOR_WORKERS)))
+BATCH_BUFFER_SIZE = int(os.getenv("BATCH_BUFFER_SIZE", "1000"))  # events read ahead of the results sent
+BATCH_RETRY_BACKOFF_MAX = float(os.getenv("BATCH_RETRY_BACKOFF_MAX", "1"))  # seconds between tries for a slot
+BATCH_RETRY_BACKOFF_MIN = 0.05  # seconds
+
+class InvalidEvent:
+    """An NDJSON line that isn't JSON, answered with an error line in its place"""
+
+    def __init__(self, error: str):
+        self.error = error
+
+def parse_event(line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return InvalidEvent(f"Invalid JSON event: {str(e)}")
+
+async def read_events(request: Request) -> List[Any]:
+    """Events from a JSON array body, or from an NDJSON body parsed line by line as it arrives.
+
+    The whole body is read before the response starts, since the response
+    listens on the same channel for the client disconnecting.
+    """
+    if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+        events = []
+        pending = b""
+        async for chunk in request.stream():
+            lines = (pending + chunk).split(b"\n")
+            pending = lines.pop()
+            events.extend(parse_event(line) for line in lines if line.strip())
+        if pending.strip():
+            events.append(parse_event(pending))
+        return events
+    try:
+        events = json.loads(await request.body())
+    except ValueError:
+        events = None
+    if not isinstance(events, list):
+        raise HTTPException(
+            status_code=400, detail="Batch body must be a JSON array of events or NDJSON, one event per line"
+        )
+    return events
+
+class Batch:
+    """One batch request: events fanned out to workers, results relayed as NDJSON.
+
+    Each of the parallelism workers runs its events one after another,
+    so it keeps getting back the warm container or process it just
+    released. At most buffer_size events are in flight or awaiting
+    their turn to be sent, however large the input. Metrics rows are
+    handed to the metrics writer in blocks of METRICS_BATCH_SIZE, which
+    it inserts with one executemany each.
+    """
+
+    def __init__(self, function, layer, events: List[Any], parallelism: int,
+                 ordered: bool, buffer_size: int = BATCH_BUFFER_SIZE):
+        self.function = function
+        self.layer = layer
+        self.events = events
+        self.parallelism = parallelism
+        self.ordered = ordered
+        self.window = asyncio.Semaphore(buffer_size)
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.outbox: asyncio.Queue = asyncio.Queue()
+        self.pending_metrics: List[Tuple[dict, float, Trace]] = []
+        self.summary = {"count": 0, "succeeded": 0, "failed": 0, "cache_hits": 0}
+
+    async def relay(self):
+        start_time = time.time()
+        tasks = [asyncio.create_task(self.produce())]
+        tasks += [asyncio.create_task(self.work()) for _ in range(self.parallelism)]
+        waiting: Dict[int, dict] = {}
+        next_index = 0
+        try:
+            while self.summary["count"] < len(self.events):
+                index, body = await self.outbox.get()
+                waiting[index] = body
+                if self.ordered:
+                    ready = []
+                    while next_index in waiting:
+                        ready.append(waiting.pop(next_index))
+                        next_index += 1
+                else:
+                    ready = [waiting.pop(index)]
+                for body in ready:
+                    self.count(body)
+                    self.window.release()
+                    yield json.dumps(body, default=str) + "\n"
+                if len(self.pending_metrics) >= METRICS_BATCH_SIZE:
+                    self.flush_metrics()
+            summary = dict(self.summary, type="summary", execution_time=time.time() - start_time)
+            yield json.dumps(summary) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.flush_metrics()
+
+    async def produce(self):
+        for index, event in enumerate(self.events):
+            await self.window.acquire()
+            await self.inbox.put((index, event))
+        for _ in range(self.parallelism):
+            await self.inbox.put(None)
+
+    async def work(self):
+        while True:
+            item = await self.inbox.get()
+            if item is None:
+                return
+            index, event = item
+            try:
+                body = await self.run(event)
+            except Exception as e:
+                # Any failure is reported as this event's result, so relay always gets one per event
+                body = response_body(uuid.uuid4().hex, {"status": "error", "output": str(e), "exit_code": -1}, 0.0)
+            await self.outbox.put((index, dict(body, type="result", index=index)))
+
+    async def run(self, event: Any) -> dict:
+        function = self.function
+        request_id = uuid.uuid4().hex
+        if isinstance(event, InvalidEvent):
+            result = {"status": "error", "output": event.error, "exit_code": -1}
+            return response_body(request_id, result, 0.0)
+        trace = Trace("batch")
+        cache_key = None
+        if function.cacheable:
+            lookup_start = time.time()
+            cache_key = result_cache.key(function, event)
+            cached = result_cache.get(function.id, cache_key)
+            if cached is not None:
+                return response_body(request_id, dict(cached, cache_hit=True), time.time() - lookup_start)
+
+        delay = BATCH_RETRY_BACKOFF_MIN
+        while True:
+            try:
+                async with limiter.slot(function.id, function.max_concurrency):
+                    start_time = time.time()
+                    try:
+                        result = await asyncio.get_running_loop().run_in_executor(
+                            worker_pool,
+                            partial(
+                                executor.execute,
+                                code=function.code,
+                                runtime=function.runtime,
+                                timeout=function.timeout,
+                                limits=function.limits,
+                                event=event,
+                                context=function.context(request_id),
+                                layer=self.layer
+                            )
+                        )
+                    except Exception as e:
+                        result = {"status": "error", "output": str(e), "exit_code": -1}
+                    execution_time = time.time() - start_time
+                break
+            except ConcurrencyLimitExceeded:
+                # Batch events wait their turn rather than fail, backing off so they don't spin on the limiter
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, BATCH_RETRY_BACKOFF_MAX)
+
+        self.pending_metrics.append((result, execution_time, trace))
+        if cache_key is not None:
+            await run_in_threadpool(result_cache.put, function.id, cache_key, result, function.cache_ttl)
+        return response_body(request_id, result, execution_time)
+
+    def count(self, body: dict):
+        self.summary["count"] += 1
+        self.summary["succeeded" if body["status"] == "success" else "failed"] += 1
+        self.summary["cache_hits"] += bool(body.get("cache_hit"))
+
+    def flush_metrics(self):
+        pending, self.pending_metrics = self.pending_metrics, []
+        if pending:
+            record_invocations(self.function, pending)
+
+@router.post("/execute/{function_id}/batch")
+async def batch_function(function_id: int, request: Request, parallelism: int = BATCH_DEFAULT_PARALLELISM,
+                         ordered: bool = False):
+    """Run a function over many events, streaming a result line for each as NDJSON.
+
+    The body is a JSON array of events, or NDJSON with one event per line
+    (Content-Type: application/x-ndjson).
+    Each {"type": "result", "index": ...} line has the fields of /execute
+    and the event's position in the input; results come in input order
+    with ordered=true, otherwise as they finish. A final
+    {"type": "summary", ...} line counts the results.
+    """
+    function = await find_function(function_id)
+    if not function:
+        raise HTTPException(status_code=404, detail="Function not found")
+    events = await read_events(request)
+    layer = await resolve_layer(function)
+    parallelism = max(1, min(parallelism, BATCH_MAX_PARALLELISM,
+                             function.max_concurrency or limiter.per_function_limit))
+    batch = Batch(function, layer, events, parallelism, ordered)
+    return StreamingResponse(batch.relay(), media_type="application/x-ndjson")
@@ -1,64 +1,331 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from ..models import SessionLocal, Function, FunctionMetrics
-from ..executor.docker.executor import DockerExecutor
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AsyncExitStack
+from functools import partial
+from typing import Any, List, Optional
+from datetime import datetime
+from pydantic import BaseModel
+from ..models import SessionLocal, Invocation
+from ..executor import LazyExecutor
+from ..executor.concurrency import ConcurrencyLimiter, ConcurrencyLimitExceeded, EXECUTOR_WORKERS
+from ..monitoring import gauges
+from ..tracing import Trace, trace_exporter
+from ..services.invocation_queue import InvocationQueue
+from ..services.layers import LayerService, LayerNotReady
+from ..services.metrics_writer import metrics_writer, record_invocation
+from ..services.prewarm import PrewarmScheduler
+from ..services.result_cache import result_cache
+from ..services.retention import retention
+from ..services.route_table import route_table
+import asyncio
+import json
 import time
+import uuid
 
 router = APIRouter()
-executor = DockerExecutor()
+# Built in the background on startup so the API serves while images are provisioned
+executor = LazyExecutor()
+# Executor calls block on the container, so they run on a dedicated bounded pool
+worker_pool = ThreadPoolExecutor(max_workers=EXECUTOR_WORKERS, thread_name_prefix="executor")
+limiter = ConcurrencyLimiter()
+layers = LayerService(executor)
+queue = InvocationQueue(executor, layers, limiter)
+prewarmer = PrewarmScheduler(executor, layers)
 
-def get_db():
+# Streamed output kept for the error message of a failed run
+ERROR_OUTPUT_TAIL = 4096
+
+def runtime_gauges():
+    """Occupancy of the execution path, read when /metrics is scraped"""
+    yield ("serverless_executions_in_flight", "Function calls currently executing",
+           [], [([], limiter.in_flight)])
+    yield ("serverless_executions_waiting", "Function calls queued for an execution slot",
+           [], [([], limiter.waiting)])
+    pools = executor.stats()
+    yield ("serverless_pool_size", "Pooled containers, or worker slots for the process engine, by runtime",
+           ["runtime"], [([runtime], stats["size"]) for runtime, stats in pools.items()])
+    yield ("serverless_pool_idle", "Idle pooled containers or workers by runtime",
+           ["runtime"], [([runtime], stats["idle"]) for runtime, stats in pools.items()])
+    yield ("serverless_invocation_queue_depth", "Asynchronous invocations waiting to run",
+           [], [([], queue.depth())])
+    prewarm = prewarmer.stats()
+    yield ("serverless_prewarm_target", "Environments the pre-warmer keeps warm by function",
+           ["function_id"], [([str(function_id)], stats["target"]) for function_id, stats in prewarm["functions"].items()])
+    yield ("serverless_prewarm_starts", "Invocations seen by the pre-warmer: hit for a warm start, miss for a cold start",
+           ["result"], [(["hit"], prewarm["hits"]), (["miss"], prewarm["misses"])])
+    yield ("serverless_layers", "Dependency layers ready, queued, built, failed and collected",
+           ["stat"], [([stat], value) for stat, value in layers.stats().items()])
+    yield ("serverless_result_cache", "Result cache entries, bytes, hits, misses and evictions",
+           ["stat"], [([stat], value) for stat, value in result_cache.stats().items()])
+    yield ("serverless_metrics_writer", "Metrics writer rows buffered, written and dropped, and flushes",
+           ["stat"], [([stat], value) for stat, value in metrics_writer.stats().items()])
+
+gauges.add(runtime_gauges)
+
+class InvocationResponse(BaseModel):
+    id: str
+    function_id: int
+    status: str
+    output: Optional[str] = None
+    result: Optional[Any] = None
+    exit_code: Optional[int] = None
+    execution_time: Optional[float] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+def list_invocations(function_id: int, limit: int):
+    db = SessionLocal()
+    try:
+        return (
+            db.query(Invocation)
+            .filter(Invocation.function_id == function_id)
+            .order_by(Invocation.created_at.desc())
+            .limit(limit)
+            .all()
+        )
+    finally:
+        db.close()
+
+def load_invocation(job_id: str):
     db = SessionLocal()
     try:
-        yield db
+        return db.query(Invocation).filter(Invocation.id == job_id).first()
     finally:
         db.close()
 
+async def read_event(request: Request):
+    """The request body as the handler's event: JSON when it parses, otherwise text"""
+    body = await request.body()
+    if not body:
+        return None
+    try:
+        return json.loads(body)
+    except ValueError:
+        return body.decode(errors="replace")
+
+def response_body(request_id: str, result: dict, execution_time: float,
+                  trace: Optional[Trace] = None) -> dict:
+    body = {
+        "request_id": request_id,
+        "status": result["status"],
+        "result": result.get("result"),
+        "output": result["output"],
+        "execution_time": execution_time,
+        "cold_start": result.get("cold_start", False),
+        "startup_time": result.get("startup_time", 0.0),
+        "memory_usage": result.get("memory_usage", 0.0),
+        "cpu_time": result.get("cpu_time", 0.0),
+        "wall_time": result.get("wall_time", 0.0),
+        "cache_hit": result.get("cache_hit", False)
+    }
+    if trace is not None:
+        body["trace"] = trace.to_dict()
+    return body
+
+def close_quietly(messages):
+    try:
+        messages.close()
+    except ValueError:
+        # Still running on a worker thread; it is closed when collected
+        pass
+
+async def find_function(function_id: int):
+    function = route_table.by_id(function_id)
+    if function is None:
+        function = await run_in_threadpool(route_table.fetch, function_id)
+    return function
+
+async def resolve_layer(function) -> Optional[str]:
+    """The function's dependency layer: 503 while it is being installed, 424 if that failed"""
+    try:
+        if not function.layer_hash or layers.ready_path(function) is not None:
+            return layers.resolve(function)
+        return await run_in_threadpool(layers.resolve, function)
+    except LayerNotReady as e:
+        if e.failed:
+            raise HTTPException(status_code=424, detail=str(e))
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
+async def invoke(function, event, request_id: str, trace: Optional[Trace] = None):
+    """Run a function within its concurrency limits and record its metrics.
+
+    Returns the executor result, tagged with request_id, and the execution time.
+    Cacheable functions are answered from the result cache when they can be,
+    without an execution slot or metrics.
+    """
+    trace = trace or Trace("invoke")
+    cache_key = None
+    if function.cacheable:
+        lookup_start = time.time()
+        with trace.span("cache"):
+            cache_key = result_cache.key(function, event)
+            cached = result_cache.get(function.id, cache_key)
+        if cached is not None:
+            trace.finish()
+            result = dict(cached, request_id=request_id, trace_id=trace.trace_id, cache_hit=True)
+            return result, time.time() - lookup_start
+    layer = await resolve_layer(function)
+    queued_at = time.time()
+    try:
+        async with limiter.slot(function.id, function.max_concurrency):
+            start_time = time.time()
+            trace.add("queue", queued_at, start_time - queued_at)
+            try:
+                with trace.span("execute"):
+                    result = await asyncio.get_running_loop().run_in_executor(
+                        worker_pool,
+                        partial(
+                            executor.execute,
+                            code=function.code,
+                            runtime=function.runtime,
+                            timeout=function.timeout,
+                            limits=function.limits,
+                            event=event,
+                            context=function.context(request_id),
+                            layer=layer
+                        )
+                    )
+                execution_time = time.time() - start_time
+            except Exception as e:
+                # Record error metrics
+                record_invocation(function, {"status": "error", "output": str(e)}, time.time() - start_time, trace)
+                raise HTTPException(status_code=500, detail=str(e))
+    except ConcurrencyLimitExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+
+    record_invocation(function, result, execution_time, trace)
+    if cache_key is not None:
+        await run_in_threadpool(result_cache.put, function.id, cache_key, result, function.cache_ttl)
+    result["request_id"] = request_id
+    return result, execution_time
+
+def startup():
+    executor.start()
+    result_cache.start()
+    route_table.start()
+    metrics_writer.start()
+    trace_exporter.start()
+    retention.start()
+    layers.start()
+    prewarmer.start()
+    # Startup runs on the event loop, which queued jobs take their execution slots on
+    queue.start(asyncio.get_event_loop())
+
+def shutdown():
+    queue.stop()
+    prewarmer.stop()
+    layers.stop()
+    route_table.stop()
+    retention.stop()
+    worker_pool.shutdown(wait=False)
+    executor.shutdown()
+    result_cache.stop()
+    # Last, so metrics from calls that finish during shutdown are written too
+    metrics_writer.stop()
+    trace_exporter.stop()
+
 @router.post("/execute/{function_id}")
-async def execute_function(function_id: int, db: Session = Depends(get_db)):
+async def execute_function(function_id: int, request: Request, invocation_type: str = "RequestResponse",
+                           trace: bool = False):
+    """Run a function with the request body as its event; trace=true adds its phase timings"""
+    if invocation_type not in ("RequestResponse", "Event"):
+        raise HTTPException(status_code=400, detail="invocation_type must be RequestResponse or Event")
+
     # Get function
-    function = db.query(Function).filter(Function.id == function_id).first()
+    invocation_trace = Trace("execute")
+    with invocation_trace.span("lookup"):
+        function = await find_function(function_id)
     if not function:
         raise HTTPException(status_code=404, detail="Function not found")
-    
-    # Execute function
-    start_time = time.time()
-    try:
-        result = executor.execute(
-            code=function.code,
-            runtime=function.runtime,
-            timeout=function.timeout
-        )
-        execution_time = time.time() - start_time
-        
-        # Record metrics
-        metrics = FunctionMetrics(
-            function_id=function_id,
-            execution_time=execution_time,
-            memory_usage=0.0,  # TODO: Implement memory tracking
-            status="success" if result["status"] == "success" else "error",
-            error_message=result["output"] if result["status"] == "error" else None
-        )
-        db.add(metrics)
-        db.commit()
-        
-        return {
-            "status": result["status"],
-            "output": result["output"],
-            "execution_time": execution_time
-        }
-        
-    except Exception as e:
-        execution_time = time.time() - start_time
-        # Record error metrics
-        metrics = FunctionMetrics(
-            function_id=function_id,
-            execution_time=execution_time,
-            memory_usage=0.0,
-            status="error",
-            error_message=str(e)
+
+    event = await read_event(request)
+
+    # Event invocations are queued and polled through /invocations/{job_id}
+    if invocation_type == "Event":
+        invocation = await run_in_threadpool(queue.enqueue, function_id, event)
+        return JSONResponse(
+            status_code=202,
+            content={"job_id": invocation.id, "status": invocation.status}
         )
-        db.add(metrics)
-        db.commit()
-        
-        raise HTTPException(status_code=500, detail=str(e))
+
+    result, execution_time = await invoke(function, event, uuid.uuid4().hex, invocation_trace)
+    return response_body(result["request_id"], result, execution_time, invocation_trace if trace else None)
+
+@router.post("/execute/{function_id}/stream")
+async def stream_function(function_id: int, request: Request, trace: bool = False):
+    """Run a function, relaying its output as newline-delimited JSON while it runs.
+
+    Output arrives as {"type": "chunk", "data": ...} lines followed by one
+    {"type": "result", ...} line with the same fields as /execute.
+    """
+    invocation_trace = Trace("stream")
+    with invocation_trace.span("lookup"):
+        function = await find_function(function_id)
+    if not function:
+        raise HTTPException(status_code=404, detail="Function not found")
+    event = await read_event(request)
+    request_id = uuid.uuid4().hex
+    layer = await resolve_layer(function)
+
+    # The slot is held until the stream finishes, not just until the response starts
+    cleanup = AsyncExitStack()
+    try:
+        with invocation_trace.span("queue"):
+            await cleanup.enter_async_context(limiter.slot(function_id, function.max_concurrency))
+    except ConcurrencyLimitExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+
+    messages = executor.stream(
+        code=function.code,
+        runtime=function.runtime,
+        timeout=function.timeout,
+        limits=function.limits,
+        event=event,
+        context=function.context(request_id),
+        layer=layer
+    )
+    cleanup.callback(worker_pool.submit, close_quietly, messages)
+
+    async def relay():
+        loop = asyncio.get_running_loop()
+        start_time = time.time()
+        tail = ""
+        try:
+            while True:
+                message = await loop.run_in_executor(worker_pool, next, messages, None)
+                if message is None:
+                    break
+                if message.get("type") == "chunk":
+                    tail = (tail + message["data"])[-ERROR_OUTPUT_TAIL:]
+                    yield json.dumps(message) + "\n"
+                    continue
+                execution_time = time.time() - start_time
+                invocation_trace.add("execute", start_time, execution_time)
+                result = dict(message, output=(tail + (message.get("output") or "")).strip())
+                record_invocation(function, result, execution_time, invocation_trace)
+                body = response_body(request_id, message, execution_time, invocation_trace if trace else None)
+                yield json.dumps(dict(body, type="result"), default=str) + "\n"
+        finally:
+            await cleanup.aclose()
+
+    # A client that disconnects before the body is sent leaves relay() unstarted, so the
+    # background task releases the slot too; closing the stack a second time does nothing
+    return StreamingResponse(relay(), media_type="application/x-ndjson", background=BackgroundTask(cleanup.aclose))
+
+@router.get("/invocations/{job_id}", response_model=InvocationResponse)
+async def get_invocation(job_id: str):
+    invocation = await run_in_threadpool(load_invocation, job_id)
+    if invocation is None:
+        raise HTTPException(status_code=404, detail="Invocation not found")
+    return invocation
+
+@router.get("/functions/{function_id}/invocations", response_model=List[InvocationResponse])
+async def get_function_invocations(function_id: int, limit: int = 100):
+    return await run_in_threadpool(list_invocations, function_id, min(limit, 1000))
@@ -0,0 +1,52 @@
+from fastapi import APIRouter, Depends, Header, HTTPException
+from typing import Dict, List, Optional
+from pydantic import BaseModel, Field
+import hmac
+from .auth import get_current_user
+from ..executor.fleet.registry import registry, FLEET_TOKEN, FLEET_NODE_TIMEOUT
+
+router = APIRouter()
+
+class NodeHeartbeat(BaseModel):
+    id: str
+    url: str
+    capacity: int = Field(..., ge=0)  # concurrent calls
+    in_flight: int = 0
+    free_memory: Optional[float] = None  # in MB
+    warm: List[str] = []  # code hashes of recently run functions
+    pools: Dict[str, Dict[str, int]] = {}
+
+class NodeResponse(BaseModel):
+    id: str
+    url: str
+    capacity: int
+    in_flight: int
+    free_memory: Optional[float] = None
+    warm_functions: int
+    pools: Dict[str, Dict[str, int]]
+    alive: bool
+    last_seen: float  # epoch seconds
+
+def verify_fleet_token(x_fleet_token: Optional[str] = Header(None)):
+    """Nodes authenticate with the shared fleet token rather than as users"""
+    if not FLEET_TOKEN or not hmac.compare_digest(x_fleet_token or "", FLEET_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid fleet token")
+
+@router.post("/fleet/nodes/heartbeat", dependencies=[Depends(verify_fleet_token)])
+def node_heartbeat(heartbeat: NodeHeartbeat):
+    """Register a worker node or refresh its state"""
+    registry.heartbeat(
+        heartbeat.id, heartbeat.url, heartbeat.capacity, heartbeat.in_flight,
+        heartbeat.free_memory, heartbeat.warm, heartbeat.pools
+    )
+    return {"node_timeout": FLEET_NODE_TIMEOUT}
+
+@router.delete("/fleet/nodes/{node_id}", dependencies=[Depends(verify_fleet_token)])
+def remove_node(node_id: str):
+    if not registry.remove(node_id):
+        raise HTTPException(status_code=404, detail="Node not found")
+    return {"message": "Node removed"}
+
+@router.get("/fleet/nodes", response_model=List[NodeResponse], dependencies=[Depends(get_current_user)])
+def list_nodes():
+    return registry.nodes()
@@ -1,8 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from typing import List
-from ..models import SessionLocal, Function
-from pydantic import BaseModel
+from typing import List, Optional
+from ..models import get_db, Function, FunctionMetrics, Invocation, MetricsRollup
+from ..executor.runtimes import DEFAULT_MEMORY_LIMIT, DEFAULT_CPU_LIMIT
+from ..executor.cache import artifact_cache
+from ..services.result_cache import result_cache
+from ..services.route_table import route_table
+from .execute import layers
+from pydantic import BaseModel, Field
 from datetime import datetime
 
 router = APIRouter()
@@ -13,6 +18,31 @@ class FunctionCreate(BaseModel):
     code: str
     route: str
     timeout: float = 30.0
+    memory_limit: int = Field(DEFAULT_MEMORY_LIMIT, ge=16)  # in MB
+    cpu_limit: float = Field(DEFAULT_CPU_LIMIT, gt=0)  # in cores
+    max_concurrency: Optional[int] = Field(None, ge=1)
+    prewarm: bool = True
+    min_warm: int = Field(0, ge=0)
+    keep_alive: Optional[float] = Field(None, ge=0)  # in seconds
+    dependencies: Optional[str] = None  # requirements.txt for Python, package.json for JavaScript
+    cacheable: bool = False
+    cache_ttl: Optional[float] = Field(None, gt=0)  # in seconds
+
+class FunctionUpdate(BaseModel):
+    name: Optional[str] = None
+    runtime: Optional[str] = None
+    code: Optional[str] = None
+    route: Optional[str] = None
+    timeout: Optional[float] = None
+    memory_limit: Optional[int] = Field(None, ge=16)
+    cpu_limit: Optional[float] = Field(None, gt=0)
+    max_concurrency: Optional[int] = Field(None, ge=1)
+    prewarm: Optional[bool] = None
+    min_warm: Optional[int] = Field(None, ge=0)
+    keep_alive: Optional[float] = Field(None, ge=0)
+    dependencies: Optional[str] = None
+    cacheable: Optional[bool] = None
+    cache_ttl: Optional[float] = Field(None, gt=0)
 
 class FunctionResponse(BaseModel):
     id: int
@@ -20,31 +50,67 @@ class FunctionResponse(BaseModel):
     runtime: str
     route: str
     timeout: float
+    memory_limit: Optional[int] = None
+    cpu_limit: Optional[float] = None
+    max_concurrency: Optional[int] = None
+    prewarm: Optional[bool] = None
+    min_warm: Optional[int] = None
+    keep_alive: Optional[float] = None
+    dependencies: Optional[str] = None
+    layer_hash: Optional[str] = None
+    cacheable: Optional[bool] = None
+    cache_ttl: Optional[float] = None
     created_at: datetime
     updated_at: datetime
 
     class Config:
         from_attributes = True
 
-def get_db():
-    db = SessionLocal()
+class LayerResponse(BaseModel):
+    hash: str
+    runtime: str
+    dependencies: str
+    status: str
+    error: Optional[str] = None
+    size_bytes: Optional[int] = None
+    created_at: datetime
+    built_at: Optional[datetime] = None
+    last_used_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+def request_layer(runtime: str, dependencies: Optional[str]) -> Optional[str]:
+    """Queue the build of a function's dependency layer, returning its hash"""
     try:
-        yield db
-    finally:
-        db.close()
+        return layers.request(runtime, dependencies)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid dependencies: {str(e)}")
 
 @router.post("/functions/", response_model=FunctionResponse)
 def create_function(function: FunctionCreate, db: Session = Depends(get_db)):
+    layer_hash = request_layer(function.runtime, function.dependencies)
     db_function = Function(
         name=function.name,
         runtime=function.runtime,
         code=function.code,
         route=function.route,
-        timeout=function.timeout
+        timeout=function.timeout,
+        memory_limit=function.memory_limit,
+        cpu_limit=function.cpu_limit,
+        max_concurrency=function.max_concurrency,
+        prewarm=function.prewarm,
+        min_warm=function.min_warm,
+        keep_alive=function.keep_alive,
+        dependencies=function.dependencies,
+        layer_hash=layer_hash,
+        cacheable=function.cacheable,
+        cache_ttl=function.cache_ttl
     )
     db.add(db_function)
     db.commit()
     db.refresh(db_function)
+    route_table.put(db_function)
     return db_function
 
 @router.get("/functions/", response_model=List[FunctionResponse])
@@ -58,11 +124,48 @@ def get_function(function_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Function not found")
     return function
 
+@router.put("/functions/{function_id}", response_model=FunctionResponse)
+def update_function(function_id: int, update: FunctionUpdate, db: Session = Depends(get_db)):
+    function = db.query(Function).filter(Function.id == function_id).first()
+    if function is None:
+        raise HTTPException(status_code=404, detail="Function not found")
+    old_code, old_runtime = function.code, function.runtime
+    old_dependencies = function.dependencies
+    for field, value in update.dict(exclude_unset=True).items():
+        setattr(function, field, value)
+    if (function.runtime, function.dependencies) != (old_runtime, old_dependencies):
+        function.layer_hash = request_layer(function.runtime, function.dependencies)
+    db.commit()
+    db.refresh(function)
+    route_table.put(function)
+    result_cache.invalidate(function_id)
+    if (function.code, function.runtime) != (old_code, old_runtime):
+        artifact_cache.invalidate(old_code, old_runtime)
+    return function
+
 @router.delete("/functions/{function_id}")
 def delete_function(function_id: int, db: Session = Depends(get_db)):
     function = db.query(Function).filter(Function.id == function_id).first()
     if function is None:
         raise HTTPException(status_code=404, detail="Function not found")
+    code, runtime = function.code, function.runtime
+    # Bulk delete metrics and invocations over the index rather than loading them for the cascade
+    for model in (FunctionMetrics, MetricsRollup, Invocation):
+        db.query(model).filter(model.function_id == function_id).delete(synchronize_session=False)
     db.delete(function)
     db.commit()
+    route_table.remove(function_id)
+    result_cache.invalidate(function_id)
+    artifact_cache.invalidate(code, runtime)
     return {"message": "Function deleted"}
+
+@router.get("/layers", response_model=List[LayerResponse])
+def list_layers():
+    return layers.layers()
+
+@router.get("/layers/{layer_hash}", response_model=LayerResponse)
+def get_layer(layer_hash: str):
+    layer = layers.get(layer_hash)
+    if layer is None:
+        raise HTTPException(status_code=404, detail="Layer not found")
+    return layer
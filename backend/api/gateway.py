@@ -0,0 +1,120 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from starlette.routing import Match
+import base64
+import json
+import uuid
+from ..models import Function
+from ..services.route_table import route_table
+from ..tracing import Trace
+from .auth import get_current_user
+from .execute import invoke
+
+router = APIRouter()
+
+METHODS = ["GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"]
+
+# Executor statuses that mean the function itself failed
+ERROR_STATUS_CODES = {"timeout": 504}
+
+# Headers carrying the caller's platform credentials, which the function must not see
+CREDENTIAL_HEADERS = {"authorization", "proxy-authorization"}
+
+async def http_event(request: Request, route: str) -> dict:
+    """The HTTP request as the handler's event, in the shape of a Lambda proxy event"""
+    body = await request.body()
+    try:
+        text, is_base64 = body.decode(), False
+    except UnicodeDecodeError:
+        text, is_base64 = base64.b64encode(body).decode(), True
+    return {
+        "httpMethod": request.method,
+        "path": "/" + route,
+        "headers": {name: value for name, value in request.headers.items() if name not in CREDENTIAL_HEADERS},
+        "queryStringParameters": dict(request.query_params),
+        "body": text or None,
+        "isBase64Encoded": is_base64
+    }
+
+def http_response(request_id: str, result: dict) -> Response:
+    """Map a handler result to the HTTP response.
+
+    A result with a statusCode is used as the response, like a Lambda
+    proxy integration; any other result is returned as JSON.
+    """
+    headers = {"X-Request-Id": request_id, "X-Trace-Id": result["trace_id"]}
+    if result["status"] != "success":
+        return JSONResponse(
+            status_code=ERROR_STATUS_CODES.get(result["status"], 502),
+            content={"status": result["status"], "output": result["output"]},
+            headers=headers
+        )
+
+    value = result.get("result")
+    if isinstance(value, dict) and "statusCode" in value:
+        headers.update({str(k): str(v) for k, v in (value.get("headers") or {}).items()})
+        body = value.get("body")
+        if body is None:
+            content = b""
+        elif value.get("isBase64Encoded"):
+            content = base64.b64decode(body)
+        elif isinstance(body, str):
+            content = body
+        else:
+            content = json.dumps(body)
+            headers.setdefault("Content-Type", "application/json")
+        try:
+            status_code = int(value["statusCode"])
+        except (TypeError, ValueError):
+            status_code = None
+        if status_code is None or not 100 <= status_code <= 599:
+            return JSONResponse(
+                status_code=502,
+                content={"status": "error",
+                         "output": f"Handler returned an invalid statusCode: {value['statusCode']!r}"},
+                headers=headers
+            )
+        return Response(content=content, status_code=status_code, headers=headers)
+    return JSONResponse(content=value, headers=headers)
+
+def allowed_methods(request: Request) -> set:
+    """Methods of the API routes matching the request's path, when only its method doesn't match"""
+    methods = set()
+    for api_route in request.app.routes:
+        if getattr(api_route, "endpoint", None) is invoke_route:
+            continue
+        match, _ = api_route.matches(request.scope)
+        if match == Match.PARTIAL:
+            methods |= getattr(api_route, "methods", None) or set()
+    return methods
+
+async def routed_function(route: str, request: Request) -> Function:
+    """The function deployed at the route, resolved before the caller is authenticated.
+
+    Paths with no function get a 404, or a 405 when they are an API path
+    called with the wrong method, without asking for credentials.
+    """
+    trace = request.state.trace = Trace("gateway")
+    with trace.span("lookup"):
+        function = route_table.by_route(route)
+        if function is None:
+            methods = allowed_methods(request)
+            if methods:
+                raise HTTPException(status_code=405, detail="Method Not Allowed",
+                                    headers={"Allow": ", ".join(sorted(methods))})
+            # Possibly created by another API process since this one loaded its routes
+            function = await run_in_threadpool(route_table.fetch_route, route)
+    if function is None:
+        raise HTTPException(status_code=404, detail="No function at this route")
+    return function
+
+# Dependencies are solved in order, so unknown routes are rejected before authentication
+@router.api_route("/{route:path}", methods=METHODS, include_in_schema=False)
+async def invoke_route(route: str, request: Request, function: Function = Depends(routed_function),
+                       current_user=Depends(get_current_user)):
+    """Serve a function at its route, with the HTTP request as its event"""
+    trace = request.state.trace
+    request_id = uuid.uuid4().hex
+    result, _ = await invoke(function, await http_event(request, route), request_id, trace)
+    return http_response(request_id, result)
@@ -1,37 +1,107 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from typing import List
-from ..models import SessionLocal, FunctionMetrics
+from typing import Any, Dict, List, Optional, Union
+from ..models import get_db, FunctionMetrics
+from .execute import prewarmer
+from ..services.result_cache import result_cache
+from ..services.rollups import update_rollups, window_stats, downsample, utc, POINT_FIELDS
 from pydantic import BaseModel
 from datetime import datetime
 
 router = APIRouter()
 
+METRICS_PAGE_SIZE = 1000
+METRICS_MAX_PAGE_SIZE = 10000
+METRICS_MAX_POINTS = 5000
+
+METRICS_COLUMNS = [
+    FunctionMetrics.id,
+    FunctionMetrics.function_id,
+    FunctionMetrics.execution_time,
+    FunctionMetrics.memory_usage,
+    FunctionMetrics.cpu_time,
+    FunctionMetrics.wall_time,
+    FunctionMetrics.status,
+    FunctionMetrics.error_message,
+    FunctionMetrics.cold_start,
+    FunctionMetrics.startup_time,
+    FunctionMetrics.timestamp,
+    FunctionMetrics.trace_id
+]
+
 class MetricsCreate(BaseModel):
     function_id: int
     execution_time: float
     memory_usage: float
     status: str
-    error_message: str = None
+    error_message: Optional[str] = None
 
 class MetricsResponse(BaseModel):
     id: int
     function_id: int
     execution_time: float
     memory_usage: float
+    cpu_time: Optional[float] = None
+    wall_time: Optional[float] = None
     status: str
-    error_message: str = None
+    error_message: Optional[str] = None
+    cold_start: Optional[bool] = None
+    startup_time: Optional[float] = None
     timestamp: datetime
+    trace_id: Optional[str] = None
 
     class Config:
         from_attributes = True
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+class MetricsPoint(BaseModel):
+    """One downsampled interval, for points=N"""
+    timestamp: datetime  # start of the interval
+    count: int
+    success_count: int
+    cold_starts: int
+    avg_execution_time: float
+    max_execution_time: Optional[float] = None
+    p95_execution_time: Optional[float] = None
+    avg_memory_usage: float
+    max_memory_usage: Optional[float] = None
+    avg_cpu_time: float
+
+class ColumnarMetrics(BaseModel):
+    """Metrics rows or intervals as one array per field, for format=columnar"""
+    data: Dict[str, List[Any]]
+    next_after_id: Optional[int] = None
+
+class SpanResponse(BaseModel):
+    name: str
+    start: float  # seconds from the start of the trace
+    duration: float
+
+class PrewarmFunctionStats(BaseModel):
+    rate: float  # calls per second, moving average
+    predicted_rate: float  # calls per second expected over the pre-warm horizon
+    target: int  # environments kept warm
+    hits: int  # warm starts
+    misses: int  # cold starts
+    hit_rate: Optional[float] = None  # fraction of starts that were warm, 0-1
+
+class PrewarmStats(BaseModel):
+    prewarmed: int  # environments started ahead of traffic
+    hits: int
+    misses: int
+    hit_rate: Optional[float] = None  # fraction, 0-1
+    functions: Dict[int, PrewarmFunctionStats]
+
+class TraceResponse(BaseModel):
+    trace_id: str
+    function_id: int
+    status: str
+    execution_time: float
+    timestamp: datetime
+    spans: List[SpanResponse] = []
+
+    class Config:
+        from_attributes = True
 
 @router.post("/metrics/", response_model=MetricsResponse)
 def create_metrics(metrics: MetricsCreate, db: Session = Depends(get_db)):
@@ -40,37 +110,88 @@ def create_metrics(metrics: MetricsCreate, db: Session = Depends(get_db)):
         execution_time=metrics.execution_time,
         memory_usage=metrics.memory_usage,
         status=metrics.status,
-        error_message=metrics.error_message
+        error_message=metrics.error_message,
+        timestamp=datetime.utcnow()
     )
     db.add(db_metrics)
+    update_rollups(db.connection(), [dict(metrics.dict(), timestamp=db_metrics.timestamp)])
     db.commit()
     db.refresh(db_metrics)
     return db_metrics
 
-@router.get("/metrics/function/{function_id}", response_model=List[MetricsResponse])
-def get_function_metrics(function_id: int, db: Session = Depends(get_db)):
-    return db.query(FunctionMetrics).filter(FunctionMetrics.function_id == function_id).all()
+def encode(value):
+    return value.isoformat() if isinstance(value, datetime) else value
 
-@router.get("/metrics/stats/function/{function_id}")
-def get_function_stats(function_id: int, db: Session = Depends(get_db)):
-    metrics = db.query(FunctionMetrics).filter(FunctionMetrics.function_id == function_id).all()
-    
-    if not metrics:
-        return {
-            "total_executions": 0,
-            "avg_execution_time": 0,
-            "avg_memory_usage": 0,
-            "success_rate": 0,
-            "error_rate": 0
+def metrics_response(names: List[str], rows: List[tuple], format: str,
+                     next_after_id: Optional[int]) -> JSONResponse:
+    """Rows as a list of objects, or as one array per column for format=columnar"""
+    if format == "columnar":
+        columns = list(zip(*rows)) if rows else [()] * len(names)
+        content: Any = {
+            "data": {name: [encode(v) for v in column] for name, column in zip(names, columns)},
+            "next_after_id": next_after_id
         }
-    
-    total = len(metrics)
-    successes = len([m for m in metrics if m.status == "success"])
-    
-    return {
-        "total_executions": total,
-        "avg_execution_time": sum(m.execution_time for m in metrics) / total,
-        "avg_memory_usage": sum(m.memory_usage for m in metrics) / total,
-        "success_rate": (successes / total) * 100,
-        "error_rate": ((total - successes) / total) * 100
-    }
+    else:
+        content = [{name: encode(v) for name, v in zip(names, row)} for row in rows]
+    headers = {"X-Next-After-Id": str(next_after_id)} if next_after_id is not None else None
+    return JSONResponse(content=content, headers=headers)
+
+@router.get("/metrics/function/{function_id}",
+            response_model=Union[List[MetricsResponse], List[MetricsPoint], ColumnarMetrics])
+def get_function_metrics(
+    function_id: int,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    after_id: Optional[int] = None,
+    limit: int = Query(METRICS_PAGE_SIZE, ge=1, le=METRICS_MAX_PAGE_SIZE),
+    points: Optional[int] = Query(None, ge=1, le=METRICS_MAX_POINTS),
+    format: str = Query("rows", pattern="^(rows|columnar)$"),
+    db: Session = Depends(get_db)
+):
+    """Metrics in [since, until), a page at a time or downsampled to points.
+
+    Pages are ordered by id. When a page is full, the id to pass as after_id
+    for the next page is returned in the X-Next-After-Id header, and also
+    as next_after_id in columnar responses. With points, metrics are
+    aggregated from the rollups into at most that many intervals instead.
+    """
+    if points:
+        intervals = downsample(db, function_id, since, until, points)
+        rows = [tuple(interval[name] for name in POINT_FIELDS) for interval in intervals]
+        return metrics_response(list(POINT_FIELDS), rows, format, None)
+
+    query = db.query(*METRICS_COLUMNS).filter(FunctionMetrics.function_id == function_id)
+    if since is not None:
+        query = query.filter(FunctionMetrics.timestamp >= utc(since))
+    if until is not None:
+        query = query.filter(FunctionMetrics.timestamp < utc(until))
+    if after_id is not None:
+        query = query.filter(FunctionMetrics.id > after_id)
+    rows = query.order_by(FunctionMetrics.id).limit(limit).all()
+    next_after_id = rows[-1].id if len(rows) == limit else None
+    return metrics_response([c.key for c in METRICS_COLUMNS], rows, format, next_after_id)
+
+@router.get("/metrics/stats/function/{function_id}")
+def get_function_stats(function_id: int, since: Optional[datetime] = None,
+                       until: Optional[datetime] = None, db: Session = Depends(get_db)):
+    """Execution stats from the metrics rollups, optionally for the window [since, until).
+
+    Result cache hits never execute, so they are counted apart under
+    result_cache. Those counts are kept in memory by each API process since
+    it started, which the scope and pid fields say, so they differ
+    between workers and ignore the window.
+    """
+    return dict(window_stats(db, function_id, since, until), result_cache=result_cache.function_stats(function_id))
+
+@router.get("/metrics/traces/{trace_id}", response_model=TraceResponse)
+def get_trace(trace_id: str, db: Session = Depends(get_db)):
+    """Phase timings recorded for one invocation"""
+    metrics = db.query(FunctionMetrics).filter(FunctionMetrics.trace_id == trace_id).first()
+    if metrics is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return metrics
+
+@router.get("/metrics/prewarm", response_model=PrewarmStats)
+def get_prewarm_stats():
+    """Pre-warming targets and warm start hit rates, overall and by function"""
+    return prewarmer.stats()
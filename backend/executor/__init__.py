@@ -1 +1,133 @@
+import os
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
+# Execution engine: docker, process, fleet, or auto to use Docker when it is reachable
+EXECUTOR_ENGINE = os.getenv("EXECUTOR_ENGINE", "auto")
+# Seconds a call waits for the executor to finish starting before failing
+EXECUTOR_STARTUP_TIMEOUT = float(os.getenv("EXECUTOR_STARTUP_TIMEOUT", "60"))
+
+
+def create_executor(engine: str = EXECUTOR_ENGINE):
+    """Build the executor backend selected by engine"""
+    if engine == "process":
+        from .process.executor import ProcessExecutor
+        return ProcessExecutor()
+    if engine == "fleet":
+        from .fleet.executor import FleetExecutor
+        return FleetExecutor()
+
+    from .docker.executor import DockerExecutor
+    executor = DockerExecutor()
+    if engine == "auto" and executor.client is None:
+        from .process.executor import ProcessExecutor
+        print("Docker unavailable, using the process pool executor")
+        return ProcessExecutor()
+    return executor
+
+
+class LazyExecutor:
+    """An executor backend built on a background thread.
+
+    Connecting to Docker and provisioning images can take minutes, so the
+    app starts serving straight away and calls that arrive before the
+    backend is ready wait for it, up to startup_timeout.
+    """
+
+    def __init__(self, engine: str = EXECUTOR_ENGINE, startup_timeout: float = EXECUTOR_STARTUP_TIMEOUT):
+        self.engine = engine
+        self.startup_timeout = startup_timeout
+        self.error: Optional[str] = None
+        self._backend = None
+        self._built = threading.Event()
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._build, name="executor-startup", daemon=True)
+                self._thread.start()
+
+    @property
+    def ready(self) -> bool:
+        return self._backend is not None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "engine": self._backend.name if self._backend is not None else None,
+            "error": self.error
+        }
+
+    def execute(self, code: str, runtime: str, timeout: float,
+                limits: Optional[Dict[str, Any]] = None, event: Any = None,
+                context: Optional[Dict[str, Any]] = None, layer: Optional[str] = None) -> Dict[str, Any]:
+        try:
+            backend = self._wait()
+        except RuntimeError as e:
+            return self._unavailable(e)
+        return backend.execute(code, runtime, timeout, limits, event, context, layer)
+
+    def stream(self, code: str, runtime: str, timeout: float,
+               limits: Optional[Dict[str, Any]] = None, event: Any = None,
+               context: Optional[Dict[str, Any]] = None, layer: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        # Waiting happens on the first next(), which callers make off the event loop
+        try:
+            backend = self._wait()
+        except RuntimeError as e:
+            yield self._unavailable(e)
+            return
+        yield from backend.stream(code, runtime, timeout, limits, event, context, layer)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return self._backend.stats() if self._backend is not None else {}
+
+    def prewarm(self, targets: List[Tuple[str, Optional[Dict[str, Any]], Optional[str], int]]) -> int:
+        # Nothing to warm until the backend exists; the caller tries again later
+        return self._backend.prewarm(targets) if self._backend is not None else 0
+
+    def build_layer(self, runtime: str, directory: str):
+        """Install a dependency layer with the backend, waiting for it to start however long that takes"""
+        self.start()
+        self._built.wait()
+        if self._backend is None:
+            raise RuntimeError(f"Executor failed to start: {self.error}")
+        self._backend.build_layer(runtime, directory)
+
+    def shutdown(self):
+        self._stopped.set()
+        with self._lock:
+            backend = self._backend
+        if backend is not None:
+            backend.shutdown()
+
+    def _wait(self):
+        self.start()
+        if not self._built.wait(self.startup_timeout):
+            raise RuntimeError("Executor is still starting")
+        if self._backend is None:
+            raise RuntimeError(f"Executor failed to start: {self.error}")
+        return self._backend
+
+    def _unavailable(self, error: Exception) -> Dict[str, Any]:
+        return {"status": "error", "output": str(error), "exit_code": -1, "execution_time": 0}
+
+    def _build(self):
+        try:
+            backend = create_executor(self.engine)
+        except Exception as e:
+            print(f"Executor startup failed: {str(e)}")
+            self.error = str(e)
+            self._built.set()
+            return
+        with self._lock:
+            if not self._stopped.is_set():
+                self._backend = backend
+        if self._stopped.is_set():
+            # Shut down while starting; don't leave pool threads behind
+            backend.shutdown()
+        else:
+            print(f"Executor ready: {backend.name}")
+        self._built.set()
@@ -0,0 +1,169 @@
+// Function runner for Node.js containers.
+//
+// Without arguments it is long-lived: it reads one JSON request per line
+// from stdin, runs the submitted code and writes one JSON response per line
+// to stdout. Given a file path it runs that file once, streaming its output,
+// and exits; an optional second path holds the event and context as JSON.
+//
+// Code exporting a handler is called as handler(event, context) and its
+// return value is reported as the result. Requests with "stream" set
+// report output as it is written, in "chunk" messages ahead of the final
+// "result" message.
+const fs = require("fs");
+const readline = require("readline");
+const util = require("util");
+const vm = require("vm");
+
+// Compiled scripts by code hash, so repeat calls skip compilation
+const CODE_CACHE_SIZE = 64;
+const codeCache = new Map();
+
+// Output is sent in chunks of at most this many characters
+const CHUNK_SIZE = 8192;
+
+function load(code, hash) {
+  if (!hash) {
+    return new vm.Script(code, { filename: "function.js" });
+  }
+  let script = codeCache.get(hash);
+  if (script) {
+    codeCache.delete(hash);
+  } else {
+    script = new vm.Script(code, { filename: "function.js" });
+    if (codeCache.size >= CODE_CACHE_SIZE) {
+      codeCache.delete(codeCache.keys().next().value);
+    }
+  }
+  codeCache.set(hash, script);
+  return script;
+}
+
+function send(message) {
+  process.stdout.write(JSON.stringify(message) + "\n");
+}
+
+function sendChunks(data) {
+  for (let start = 0; start < data.length; start += CHUNK_SIZE) {
+    send({ type: "chunk", data: data.slice(start, start + CHUNK_SIZE) });
+  }
+}
+
+function createContext(details) {
+  const deadline = details.timeout ? Date.now() + details.timeout * 1000 : null;
+  return {
+    functionName: details.function_name,
+    requestId: details.request_id,
+    memoryLimitInMB: details.memory_limit,
+    timeout: details.timeout,
+    getRemainingTimeInMillis: () => (deadline === null ? null : Math.max(0, deadline - Date.now())),
+  };
+}
+
+// Reset VmHWM so the next reading only covers one invocation
+function resetPeakMemory() {
+  try {
+    fs.writeFileSync("/proc/self/clear_refs", "5");
+  } catch (err) {}
+}
+
+function peakMemoryMb() {
+  try {
+    const match = /VmHWM:\s+(\d+)/.exec(fs.readFileSync("/proc/self/status", "utf8"));
+    if (match) {
+      return Number(match[1]) / 1024;
+    }
+  } catch (err) {}
+  // Lifetime high-water mark of the runner when /proc is unavailable
+  return process.resourceUsage().maxRSS / 1024;
+}
+
+async function run(code, hash, event, context, stream) {
+  const lines = [];
+  const capture = stream
+    ? (...args) => sendChunks(util.format(...args) + "\n")
+    : (...args) => lines.push(util.format(...args));
+  const sandbox = {
+    console: { log: capture, info: capture, warn: capture, error: capture, debug: capture },
+    module: { exports: {} },
+    require,
+    Buffer,
+    process,
+    setTimeout,
+    clearTimeout,
+    setInterval,
+    clearInterval,
+    setImmediate,
+    clearImmediate,
+  };
+  sandbox.exports = sandbox.module.exports;
+
+  resetPeakMemory();
+  const cpuStart = process.cpuUsage();
+  const wallStart = process.hrtime.bigint();
+  const usage = () => {
+    const cpu = process.cpuUsage(cpuStart);
+    return {
+      memory_usage: peakMemoryMb(),
+      cpu_time: (cpu.user + cpu.system) / 1e6,
+      wall_time: Number(process.hrtime.bigint() - wallStart) / 1e9,
+    };
+  };
+
+  const output = () => (stream ? "" : lines.join("\n").trim());
+
+  try {
+    const completion = load(code, hash).runInNewContext(sandbox);
+    if (completion && typeof completion.then === "function") {
+      await completion;
+    }
+    let result = null;
+    const handler = sandbox.module.exports.handler || sandbox.exports.handler;
+    if (typeof handler === "function") {
+      result = await handler(event === undefined ? null : event, createContext(context || {}));
+      if (result && typeof result[Symbol.asyncIterator] === "function") {
+        // Async generator handlers stream each item as it is produced
+        const items = [];
+        for await (const item of result) {
+          if (stream) {
+            sendChunks(typeof item === "string" ? item : JSON.stringify(item));
+          } else {
+            items.push(item);
+          }
+        }
+        result = stream ? null : items;
+      }
+    }
+    // Let callbacks queued by the script run before collecting output
+    await new Promise((resolve) => setImmediate(resolve));
+    if (result === undefined) {
+      result = null;
+    }
+    return { type: "result", status: "success", output: output(), result, exit_code: 0, ...usage() };
+  } catch (err) {
+    capture(err && err.stack ? err.stack : String(err));
+    // Buffers and typed arrays that don't fit under the memory limit fail to allocate
+    const oom = err instanceof RangeError && /allocation failed/i.test(err.message);
+    return { type: "result", status: oom ? "oom" : "error", output: output(), result: null, exit_code: 1, ...usage() };
+  }
+}
+
+async function main() {
+  if (process.argv.length > 1) {
+    const payload = process.argv.length > 2 ? JSON.parse(fs.readFileSync(process.argv[2], "utf8")) : {};
+    const result = await run(fs.readFileSync(process.argv[1], "utf8"), null, payload.event, payload.context, true);
+    process.stdout.write(JSON.stringify(result) + "\n", () => process.exit(result.exit_code));
+    return;
+  }
+
+  send({ type: "ready" });
+  const input = readline.createInterface({ input: process.stdin });
+  for await (const line of input) {
+    if (!line.trim()) {
+      continue;
+    }
+    const request = JSON.parse(line);
+    send(await run(request.code, request.hash, request.event, request.context, request.stream));
+  }
+}
+
+main();
@@ -0,0 +1,274 @@
+"""Function runner for Python containers.
+
+Without arguments it is long-lived: it reads one JSON request per line
+from stdin, runs the submitted code and writes one JSON response per line
+to stdout. Given a file path it runs that file once, streaming its output,
+and exits; an optional second path holds the event and context as JSON.
+
+Requests with "stream" set report output as it is written, in "chunk"
+messages ahead of the final "result" message.
+"""
+import contextlib
+import inspect
+import io
+import json
+import os
+import resource
+import signal
+import sys
+import time
+import traceback
+from collections import OrderedDict
+
+# Compiled code objects by code hash, so repeat calls skip compilation
+CODE_CACHE_SIZE = 64
+code_cache = OrderedDict()
+
+# Output is sent in chunks of at most this many characters
+CHUNK_SIZE = 8192
+
+# Address space a per-call memory limit always leaves on top of the current mapping
+MEMORY_HEADROOM = 16 * 1024 * 1024
+
+
+class CpuLimitExceeded(BaseException):
+    """Raised from SIGXCPU; a BaseException so handlers can't swallow it"""
+
+
+def on_cpu_limit(signum, frame):
+    raise CpuLimitExceeded()
+
+
+def set_cpu_limit(seconds):
+    """Allow seconds more CPU time, or lift the soft limit when seconds is None"""
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    if seconds is None:
+        soft = hard
+    else:
+        used = resource.getrusage(resource.RUSAGE_SELF)
+        soft = int(used.ru_utime + used.ru_stime) + seconds
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def set_memory_limit(megabytes):
+    """Cap the address space at megabytes, or lift the soft limit when megabytes is None"""
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if megabytes is None:
+        soft = hard
+    else:
+        # Never below what is already mapped, or every allocation would fail
+        soft = max(megabytes * 1024 * 1024, (read_status("VmSize") or 0) * 1024 + MEMORY_HEADROOM)
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (soft, hard))
+
+
+def apply_process_limits(limits):
+    """Limits for the whole runner, given in FUNCTION_LIMITS"""
+    if limits.get("memory"):
+        size = limits["memory"] * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (size, size))
+    if limits.get("open_files"):
+        count = limits["open_files"]
+        resource.setrlimit(resource.RLIMIT_NOFILE, (count, count))
+
+
+def send(channel, message):
+    channel.write(json.dumps(message, default=str) + "\n")
+    channel.flush()
+
+
+class ChunkWriter(io.TextIOBase):
+    """Text stream forwarding whole lines to the channel as chunk messages"""
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.pending = []
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        self.pending.append(text)
+        self.size += len(text)
+        if "\n" in text or self.size >= CHUNK_SIZE:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        if not self.size:
+            return
+        data = "".join(self.pending)
+        self.pending, self.size = [], 0
+        for start in range(0, len(data), CHUNK_SIZE):
+            send(self.channel, {"type": "chunk", "data": data[start:start + CHUNK_SIZE]})
+
+
+class Context:
+    """Invocation details passed to handler(event, context)"""
+
+    def __init__(self, details):
+        self.function_name = details.get("function_name")
+        self.request_id = details.get("request_id")
+        self.memory_limit_in_mb = details.get("memory_limit")
+        self.timeout = details.get("timeout")
+        self._deadline = time.monotonic() + self.timeout if self.timeout else None
+
+    def get_remaining_time_in_millis(self):
+        if self._deadline is None:
+            return None
+        return max(0, int((self._deadline - time.monotonic()) * 1000))
+
+
+def handler_args(handler, event, context):
+    """Pass as many of (event, context) as the handler accepts"""
+    try:
+        params = list(inspect.signature(handler).parameters.values())
+    except (TypeError, ValueError):
+        return event, context
+    if any(p.kind == p.VAR_POSITIONAL for p in params):
+        return event, context
+    positional = [p for p in params if p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD)]
+    return (event, context)[:len(positional)]
+
+
+def load(code, code_hash):
+    if code_hash is None:
+        return compile(code, "function.py", "exec")
+    code_object = code_cache.get(code_hash)
+    if code_object is None:
+        code_object = code_cache[code_hash] = compile(code, "function.py", "exec")
+        if len(code_cache) > CODE_CACHE_SIZE:
+            code_cache.popitem(last=False)
+    else:
+        code_cache.move_to_end(code_hash)
+    return code_object
+
+
+def reset_peak_memory():
+    """Reset VmHWM so the next reading only covers one invocation"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def read_status(field):
+    """A kB value from /proc/self/status, or None when unavailable"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def peak_memory_mb():
+    peak = read_status("VmHWM")
+    if peak is not None:
+        return peak / 1024
+    # Lifetime high-water mark of the runner when /proc is unavailable
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(code, code_hash=None, limits=None, event=None, context=None, channel=None):
+    """Run code and call its handler; with a channel, output is streamed as it is written"""
+    buffer = ChunkWriter(channel) if channel else io.StringIO()
+    namespace = {"__name__": "__main__"}
+    status = "success"
+    exit_code = 0
+    result = None
+    cpu_seconds = (limits or {}).get("cpu_seconds")
+    memory = (limits or {}).get("memory")
+    reset_peak_memory()
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    try:
+        if cpu_seconds:
+            set_cpu_limit(cpu_seconds)
+        if memory:
+            set_memory_limit(memory)
+        with contextlib.redirect_stdout(buffer), contextlib.redirect_stderr(buffer):
+            exec(load(code, code_hash), namespace)
+            handler = namespace.get("handler")
+            if not callable(handler):
+                raise NameError("name 'handler' is not defined")
+            result = handler(*handler_args(handler, event, Context(context or {})))
+            if inspect.isgenerator(result):
+                if channel:
+                    # Generator handlers stream each item as it is produced
+                    for item in result:
+                        buffer.write(item if isinstance(item, str) else json.dumps(item, default=str))
+                        buffer.flush()
+                    result = None
+                else:
+                    result = list(result)
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else 1
+        status = "success" if exit_code == 0 else "error"
+    except CpuLimitExceeded:
+        buffer.write(f"CPU limit of {cpu_seconds} seconds exceeded")
+        status, exit_code = "cpu_throttled", 1
+    except MemoryError:
+        buffer.write(traceback.format_exc())
+        status, exit_code = "oom", 1
+    except Exception:
+        buffer.write(traceback.format_exc())
+        status, exit_code = "error", 1
+    finally:
+        if cpu_seconds:
+            set_cpu_limit(None)
+        if memory:
+            set_memory_limit(None)
+
+    if channel:
+        buffer.flush()
+    return {
+        "type": "result",
+        "status": status,
+        "output": "" if channel else buffer.getvalue().strip(),
+        "result": result,
+        "exit_code": exit_code,
+        "memory_usage": peak_memory_mb(),
+        "cpu_time": time.process_time() - cpu_start,
+        "wall_time": time.perf_counter() - wall_start
+    }
+
+
+def main():
+    channel = sys.stdout
+    signal.signal(signal.SIGXCPU, on_cpu_limit)
+    limits = json.loads(os.environ.get("FUNCTION_LIMITS", "{}"))
+    apply_process_limits(limits)
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as f:
+            code = f.read()
+        payload = {}
+        if len(sys.argv) > 2:
+            with open(sys.argv[2]) as f:
+                payload = json.load(f)
+        result = run(code, limits=limits, event=payload.get("event"),
+                     context=payload.get("context"), channel=channel)
+        send(channel, result)
+        sys.exit(result["exit_code"])
+
+    send(channel, {"type": "ready"})
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        send(channel, run(
+            request["code"], request.get("hash"), request.get("limits"),
+            request.get("event"), request.get("context"),
+            channel if request.get("stream") else None
+        ))
+
+
+if __name__ == "__main__":
+    main()
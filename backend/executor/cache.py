@@ -0,0 +1,135 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Any
+
+from .runtimes import get_runtime
+
+# Artifact cache configuration
+ARTIFACT_CACHE_DIR = os.getenv(
+    "ARTIFACT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "serverless-artifacts")
+)
+ARTIFACT_CACHE_MAX_BYTES = int(os.getenv("ARTIFACT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+ARTIFACT_CACHE_MAX_ENTRIES = int(os.getenv("ARTIFACT_CACHE_MAX_ENTRIES", "512"))
+
+
+def code_hash(code: str, runtime: str) -> str:
+    """Content hash identifying a function's code for a runtime"""
+    name = get_runtime(runtime)["name"]
+    return hashlib.sha256(f"{name}\0{code}".encode()).hexdigest()
+
+
+class ArtifactCache:
+    """LRU cache of prepared code directories.
+
+    Entries are keyed by code_hash, so an updated function naturally maps
+    to a new entry; invalidate() drops the old one straight away. Every
+    written entry gets its own directory, so a stale entry still pinned by
+    a running call never shares files with its replacement.
+    """
+
+    def __init__(self, root: str = ARTIFACT_CACHE_DIR, max_bytes: int = ARTIFACT_CACHE_MAX_BYTES,
+                 max_entries: int = ARTIFACT_CACHE_MAX_ENTRIES):
+        # Each process gets its own directory so workers don't evict each other's files
+        self.root = os.path.join(root, str(os.getpid()))
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    @contextmanager
+    def prepared(self, code: str, runtime: str, source: str):
+        """Directory holding source written as the runtime's function file.
+
+        The directory is pinned for the duration of the block so it can't
+        be evicted while a container has it mounted.
+        """
+        key = code_hash(code, runtime)
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is None or entry["path"] is None:
+                entry = self._insert(key, len(code))
+                entry["path"] = self._write(key, runtime, source)
+            entry["pins"] += 1
+            path = entry["path"]
+            self._evict()
+        try:
+            yield path
+        finally:
+            with self._lock:
+                entry["pins"] -= 1
+                if entry["stale"] and entry["pins"] == 0:
+                    shutil.rmtree(path, ignore_errors=True)
+
+    def invalidate(self, code: str, runtime: str):
+        with self._lock:
+            self._remove(code_hash(code, runtime))
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+    def _lookup(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry
+
+    def _insert(self, key: str, size: int) -> Dict[str, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = {"size": size, "path": None, "pins": 0, "stale": False}
+            self._entries[key] = entry
+            self._size += size
+        self._entries.move_to_end(key)
+        return entry
+
+    def _write(self, key: str, runtime: str, source: str) -> str:
+        path = os.path.join(self.root, f"{key}-{uuid.uuid4().hex}")
+        os.makedirs(path)
+        with open(os.path.join(path, get_runtime(runtime)["filename"]), "w") as f:
+            f.write(source)
+        return path
+
+    def _evict(self):
+        for key in list(self._entries):
+            if self._size <= self.max_bytes and len(self._entries) <= self.max_entries:
+                break
+            if self._entries[key]["pins"] == 0:
+                self._remove(key)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._size -= entry["size"]
+        if entry["path"] is not None:
+            if entry["pins"] == 0:
+                shutil.rmtree(entry["path"], ignore_errors=True)
+            else:
+                entry["stale"] = True
+
+
+artifact_cache = ArtifactCache()
@@ -0,0 +1,81 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple
+
+# Concurrency configuration
+EXECUTOR_WORKERS = int(os.getenv("EXECUTOR_WORKERS", str(min(32, (os.cpu_count() or 1) * 4))))
+MAX_CONCURRENT_EXECUTIONS = int(os.getenv("MAX_CONCURRENT_EXECUTIONS", str(EXECUTOR_WORKERS)))
+MAX_CONCURRENT_PER_FUNCTION = int(os.getenv("MAX_CONCURRENT_PER_FUNCTION", "10"))
+EXECUTION_QUEUE_TIMEOUT = float(os.getenv("EXECUTION_QUEUE_TIMEOUT", "5"))  # seconds
+
+
+class ConcurrencyLimitExceeded(Exception):
+    pass
+
+
+class ConcurrencyLimiter:
+    """Caps in-flight executions globally and per function.
+
+    Callers over a limit queue for up to queue_timeout seconds before
+    ConcurrencyLimitExceeded is raised.
+    """
+
+    def __init__(
+        self,
+        global_limit: int = MAX_CONCURRENT_EXECUTIONS,
+        per_function_limit: int = MAX_CONCURRENT_PER_FUNCTION,
+        queue_timeout: float = EXECUTION_QUEUE_TIMEOUT
+    ):
+        self.global_limit = global_limit
+        self.per_function_limit = per_function_limit
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiting = 0
+        # Semaphores are created lazily so they bind to the running event loop
+        self._global: Optional[asyncio.Semaphore] = None
+        self._functions: Dict[int, Tuple[int, asyncio.Semaphore]] = {}
+
+    @asynccontextmanager
+    async def slot(self, function_id: int, limit: Optional[int] = None):
+        """Hold an execution slot; limit overrides the per-function default"""
+        if self._global is None:
+            self._global = asyncio.Semaphore(self.global_limit)
+        limit = limit or self.per_function_limit
+        entry = self._functions.get(function_id)
+        if entry is None or entry[0] != limit:
+            # A changed limit takes effect for new callers; holders release the old semaphore
+            entry = self._functions[function_id] = (limit, asyncio.Semaphore(limit))
+        semaphore = entry[1]
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.queue_timeout
+        self.waiting += 1
+        try:
+            await self._acquire(semaphore, self.queue_timeout)
+            try:
+                await self._acquire(self._global, deadline - loop.time())
+            except ConcurrencyLimitExceeded:
+                semaphore.release()
+                raise
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._global.release()
+            semaphore.release()
+
+    async def _acquire(self, semaphore: asyncio.Semaphore, timeout: float):
+        if timeout <= 0:
+            if semaphore.locked():
+                raise ConcurrencyLimitExceeded("Too many concurrent executions")
+            await semaphore.acquire()
+            return
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout)
+        except asyncio.TimeoutError:
+            raise ConcurrencyLimitExceeded("Too many concurrent executions")
@@ -1,11 +1,50 @@
 import docker
-import tempfile
+import json
 import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
 import time
-from typing import Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, ExitStack
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from ..runtimes import RUNTIMES, get_runtime, cpu_budget, FUNCTION_OPEN_FILES_LIMIT
+from ..cache import artifact_cache, code_hash
+from ..protocol import invoke_request, invocation_context, iter_lines, parse_messages, collect, with_spans
+from ..layers import (
+    install_command, install_layer, layer_env, LAYER_BUILD_TIMEOUT, LAYER_MOUNT,
+    LAYER_PIP_FIND_LINKS, WHEELHOUSE_MOUNT
+)
+from .pool import WarmPool, container_limits, layer_mount
+from ...tracing import phase, record_phase
+
+PAYLOAD_FILENAME = "payload.json"
+
+@contextmanager
+def _payload(event: Any, context: Dict[str, Any]):
+    """Directory holding the event and context for a one-off run"""
+    payloaddir = tempfile.mkdtemp(prefix="serverless-payload-")
+    try:
+        with open(os.path.join(payloaddir, PAYLOAD_FILENAME), "w") as f:
+            json.dump({"event": event, "context": context}, f, default=str)
+        yield payloaddir
+    finally:
+        shutil.rmtree(payloaddir, ignore_errors=True)
+
+def _oom_killed(container) -> bool:
+    """Whether Docker's OOM killer stopped the container"""
+    try:
+        container.reload()
+        return bool(container.attrs["State"].get("OOMKilled"))
+    except Exception:
+        return False
 
 class DockerExecutor:
     def __init__(self):
+        self.pool = None
         try:
             # Try different Docker connection methods
             try:
@@ -23,123 +62,426 @@ class DockerExecutor:
             self.client.ping()
             print("Docker connection successful")
             self._create_base_images()
+            self.pool = WarmPool(self.client)
         except Exception as e:
             print(f"Docker initialization failed: {str(e)}")
             self.client = None
 
-    def execute(self, code: str, runtime: str, timeout: float) -> Dict[str, Any]:
-        """Execute function code in a Docker container or locally"""
+    @property
+    def name(self) -> str:
+        """Engine name: functions run locally when Docker isn't reachable"""
+        return "docker" if self.client else "local"
+
+    def execute(self, code: str, runtime: str, timeout: float,
+                limits: Optional[Dict[str, Any]] = None, event: Any = None,
+                context: Optional[Dict[str, Any]] = None, layer: Optional[str] = None) -> Dict[str, Any]:
+        """Execute function code in a Docker container or locally.
+
+        limits holds "memory" in MB and "cpus" in cores; None leaves the
+        function unconstrained. event and context are passed to the handler.
+        layer is the directory of a built dependency layer, if any.
+        """
+        return collect(self._invoke(code, runtime, timeout, limits, event, context, layer, stream=False))
+
+    def stream(self, code: str, runtime: str, timeout: float,
+               limits: Optional[Dict[str, Any]] = None, event: Any = None,
+               context: Optional[Dict[str, Any]] = None, layer: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Like execute, but yields output chunk messages as they are written before the result"""
+        return self._invoke(code, runtime, timeout, limits, event, context, layer, stream=True)
+
+    def _invoke(self, code: str, runtime: str, timeout: float, limits: Optional[Dict[str, Any]],
+                event: Any, context: Optional[Dict[str, Any]], layer: Optional[str],
+                stream: bool) -> Iterator[Dict[str, Any]]:
+        """Run the call; the final message carries spans timing its phases"""
+        spans: List[Dict[str, Any]] = []
+        return with_spans(
+            self._dispatch(code, runtime, timeout, limits, event, context, layer, stream, spans), spans
+        )
+
+    def _dispatch(self, code: str, runtime: str, timeout: float, limits: Optional[Dict[str, Any]],
+                  event: Any, context: Optional[Dict[str, Any]], layer: Optional[str], stream: bool,
+                  spans: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        context = invocation_context(context, timeout, limits)
         if not self.client:
-            # Enhanced local execution for Python functions
             if runtime == "python":
-                try:
-                    start_time = time.time()
-                    # Create a local Python environment to execute the code
-                    local_globals = {}
-                    exec(code, local_globals)
-                    if "handler" in local_globals and callable(local_globals["handler"]):
-                        result = local_globals["handler"]()
-                        execution_time = time.time() - start_time
-                        return {
-                            "status": "success",
-                            "output": str(result),
-                            "exit_code": 0,
-                            "execution_time": execution_time
-                        }
-                except Exception as e:
-                    return {
-                        "status": "error",
-                        "output": f"Local execution failed: {str(e)}",
-                        "exit_code": -1,
-                        "execution_time": 0
-                    }
-            return {
+                yield from self._execute_local(code, runtime, timeout, limits, event, context, layer, spans)
+                return
+            yield {
                 "status": "error",
                 "output": "Docker is not available and function cannot be executed locally",
                 "exit_code": -1,
                 "execution_time": 0
             }
-            
-        # Create temporary directory for function code
-        with tempfile.TemporaryDirectory() as tmpdir:
-            # Write function code to file
-            filename = "function.py" if runtime == "python" else "function.js"
-            filepath = os.path.join(tmpdir, filename)
-            
-            # For Python functions, add a print statement to capture the return value
-            if runtime == "python":
-                code_with_print = code + "\n\nif __name__ == '__main__':\n    result = handler()\n    print(result)"
-            else:
-                code_with_print = code
-                
-            with open(filepath, "w") as f:
-                f.write(code_with_print)
-            
+            return
+
+        # Prefer a warm container, falling back to a one-off container when the pool is full
+        if self.pool:
+            with phase(spans, "docker", "lease"):
+                lease = self._lease(runtime, limits, layer)
+            if lease is not None:
+                yield from self._execute_warm(lease, code, runtime, timeout, limits, event, context, stream, spans)
+                return
+
+        config = get_runtime(runtime)
+        filename = config["filename"]
+        volumes, environment = layer_mount(runtime, layer)
+        environment["FUNCTION_LIMITS"] = json.dumps({"cpu_seconds": cpu_budget(timeout, limits)})
+
+        with ExitStack() as stack:
+            with phase(spans, "docker", "prepare"):
+                # Function code is written once per code hash and reused across calls
+                codedir = stack.enter_context(artifact_cache.prepared(code, runtime, code))
+                payloaddir = stack.enter_context(_payload(event, context))
             try:
                 start_time = time.time()
                 # Use pre-built images
-                image_name = "python:3.9-slim" if runtime == "python" else "node:16-slim"
+                image_name = config["image"]
                 
-                # Run container with mounted code
+                # Run container with mounted code; the bootstrap runs it once, streaming its output
                 container = self.client.containers.run(
                     image_name,
-                    command=[runtime, f"/code/{filename}"],
-                    volumes={
-                        os.path.abspath(tmpdir): {
+                    command=config["bootstrap"] + [f"/code/{filename}", f"/payload/{PAYLOAD_FILENAME}"],
+                    volumes=dict(volumes, **{
+                        os.path.abspath(codedir): {
                             "bind": "/code",
                             "mode": "ro"
+                        },
+                        os.path.abspath(payloaddir): {
+                            "bind": "/payload",
+                            "mode": "ro"
                         }
-                    },
+                    }),
                     working_dir="/code",
+                    environment=environment,
                     detach=True,
-                    remove=True
+                    **container_limits(limits)
                 )
-                
+                startup_time = time.time() - start_time
+                record_phase(spans, "docker", "create_start", start_time, startup_time)
+            except Exception as e:
+                yield {
+                    "status": "error",
+                    "output": f"Docker execution failed: {str(e)}",
+                    "exit_code": -1,
+                    "execution_time": 0
+                }
+                return
+
+            # Stop the container at the timeout; following its logs then ends
+            timed_out = threading.Event()
+            def stop():
+                timed_out.set()
                 try:
-                    # Wait for result with timeout
-                    result = container.wait(timeout=timeout)
-                    logs = container.logs().decode().strip()
-                    execution_time = time.time() - start_time
-                    
-                    return {
-                        "status": "success" if result["StatusCode"] == 0 else "error",
-                        "output": logs,
-                        "exit_code": result["StatusCode"],
-                        "execution_time": execution_time
-                    }
+                    container.kill()
+                except Exception:
+                    pass
+            timer = threading.Timer(timeout, stop)
+            timer.start()
+            try:
+                response = None
+                try:
+                    # Output is relayed as it is written instead of being read whole after exit
+                    # Covers the function's run as well as relaying its output
+                    with phase(spans, "docker", "logs"):
+                        logs = container.logs(stream=True, follow=True)
+                        for message in parse_messages(iter_lines(logs)):
+                            if message["type"] == "chunk":
+                                yield message
+                            else:
+                                response = message
+                    with phase(spans, "docker", "wait"):
+                        result = container.wait(timeout=max(1.0, timeout))
                 except Exception as e:
-                    # Make sure to cleanup container
-                    try:
-                        container.remove(force=True)
-                    except:
-                        pass
-                    return {
-                        "status": "error",
-                        "output": f"Container execution failed: {str(e)}",
+                    yield {
+                        "status": "timeout" if timed_out.is_set() else "error",
+                        "output": (
+                            f"Function timed out after {timeout} seconds" if timed_out.is_set()
+                            else f"Container execution failed: {str(e)}"
+                        ),
                         "exit_code": -1,
-                        "execution_time": time.time() - start_time
+                        "execution_time": time.time() - start_time,
+                        "cold_start": True,
+                        "startup_time": startup_time
                     }
-                    
+                    return
+                execution_time = time.time() - start_time
+
+                if response is not None:
+                    status = response["status"]
+                elif timed_out.is_set():
+                    status = "timeout"
+                elif result["StatusCode"] != 0 and _oom_killed(container):
+                    status = "oom"
+                else:
+                    status = "success" if result["StatusCode"] == 0 else "error"
+                response = response or {"output": ""}
+
+                yield {
+                    "status": status,
+                    "output": (
+                        f"Function timed out after {timeout} seconds" if status == "timeout"
+                        else response["output"]
+                    ),
+                    "result": response.get("result"),
+                    "exit_code": result["StatusCode"],
+                    "execution_time": execution_time,
+                    "cold_start": True,
+                    "startup_time": startup_time,
+                    "memory_usage": response.get("memory_usage", 0.0),
+                    "cpu_time": response.get("cpu_time", 0.0),
+                    "wall_time": response.get("wall_time", execution_time - startup_time)
+                }
+            finally:
+                timer.cancel()
+                # Make sure to cleanup container
+                try:
+                    with phase(spans, "docker", "remove"):
+                        container.remove(force=True)
+                except:
+                    pass
+
+    def _execute_local(self, code: str, runtime: str, timeout: float, limits: Optional[Dict[str, Any]],
+                       event: Any, context: Dict[str, Any], layer: Optional[str],
+                       spans: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Run code in a local subprocess under rlimits when Docker is unavailable"""
+        config = get_runtime(runtime)
+        process_limits = {
+            "cpu_seconds": cpu_budget(timeout, limits),
+            "open_files": FUNCTION_OPEN_FILES_LIMIT
+        }
+        if limits and limits.get("memory"):
+            process_limits["memory"] = limits["memory"]
+        command = [sys.executable] + config["bootstrap"][1:]
+        env = dict(os.environ, FUNCTION_LIMITS=json.dumps(process_limits))
+        if layer:
+            env.update(layer_env(runtime, layer))
+
+        with ExitStack() as stack:
+            with phase(spans, "local", "prepare"):
+                codedir = stack.enter_context(artifact_cache.prepared(code, runtime, code))
+                payloaddir = stack.enter_context(_payload(event, context))
+            start_time = time.time()
+            try:
+                with phase(spans, "local", "spawn"):
+                    process = subprocess.Popen(
+                        command + [
+                            os.path.join(codedir, config["filename"]),
+                            os.path.join(payloaddir, PAYLOAD_FILENAME)
+                        ],
+                        cwd=codedir,
+                        env=env,
+                        stdout=subprocess.PIPE,
+                        stderr=subprocess.STDOUT,
+                        start_new_session=True
+                    )
             except Exception as e:
-                return {
+                yield {
                     "status": "error",
-                    "output": f"Docker execution failed: {str(e)}",
+                    "output": f"Local execution failed: {str(e)}",
                     "exit_code": -1,
                     "execution_time": 0
                 }
+                return
+
+            timed_out = threading.Event()
+            def stop():
+                timed_out.set()
+                try:
+                    os.killpg(process.pid, signal.SIGKILL)
+                except OSError:
+                    pass
+            timer = threading.Timer(timeout, stop)
+            timer.start()
+            try:
+                response = None
+                with phase(spans, "local", "run"):
+                    for message in parse_messages(iter_lines(iter(lambda: process.stdout.read1(65536), b""))):
+                        if message["type"] == "chunk":
+                            yield message
+                        else:
+                            response = message
+                    returncode = process.wait()
+            finally:
+                timer.cancel()
+                if process.poll() is None:
+                    stop()
+                    process.wait()
+                process.stdout.close()
+        execution_time = time.time() - start_time
+
+        if timed_out.is_set() and response is None:
+            yield {
+                "status": "timeout",
+                "output": f"Function timed out after {timeout} seconds",
+                "exit_code": -1,
+                "execution_time": execution_time,
+                "cold_start": False,
+                "startup_time": 0.0
+            }
+            return
+        if response is not None:
+            status = response["status"]
+        elif returncode == -signal.SIGXCPU or returncode == -signal.SIGKILL:
+            # Killed at the CPU rlimit before the runner could report
+            status = "cpu_throttled"
+        else:
+            status = "success" if returncode == 0 else "error"
+        response = response or {"output": ""}
+
+        yield {
+            "status": status,
+            "output": response["output"],
+            "result": response.get("result"),
+            "exit_code": returncode,
+            "execution_time": execution_time,
+            "cold_start": False,
+            "startup_time": 0.0,
+            "memory_usage": response.get("memory_usage", 0.0),
+            "cpu_time": response.get("cpu_time", 0.0),
+            "wall_time": response.get("wall_time", execution_time)
+        }
+
+    def _lease(self, runtime: str, limits: Optional[Dict[str, Any]], layer: Optional[str]):
+        """A pooled container as (container, cold_start), or None if none could be leased"""
+        try:
+            return self.pool.acquire(runtime, limits, layer)
+        except Exception as e:
+            print(f"Warm container start failed: {str(e)}")
+            return None
+
+    def _execute_warm(self, lease, code: str, runtime: str, timeout: float,
+                      limits: Optional[Dict[str, Any]], event: Any, context: Dict[str, Any],
+                      stream: bool, spans: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Run code on a leased pooled container"""
+        container, cold_start = lease
+        startup_time = container.startup_time if cold_start else 0.0
+        start_time = time.time()
+        deadline = start_time + timeout
+        failure = None
+        healthy = False
+        try:
+            container.invocations += 1
+            container.send(invoke_request(
+                code, code_hash(code, runtime), {"cpu_seconds": cpu_budget(timeout, limits)},
+                event, context, stream
+            ))
+            while True:
+                response = container.receive(deadline - time.time())
+                if response.get("type") != "chunk":
+                    break
+                yield response
+            healthy = True
+            record_phase(spans, "docker", "invoke", start_time, time.time() - start_time)
+        except TimeoutError:
+            failure = {
+                "status": "timeout",
+                "output": f"Function timed out after {timeout} seconds",
+                "exit_code": -1,
+                "execution_time": time.time() - start_time,
+                "cold_start": cold_start,
+                "startup_time": startup_time
+            }
+        except Exception as e:
+            oom = _oom_killed(container.container)
+            failure = {
+                "status": "oom" if oom else "error",
+                "output": (
+                    "Function exceeded its memory limit" if oom
+                    else f"Warm container execution failed: {str(e)}"
+                ),
+                "exit_code": -1,
+                "execution_time": time.time() - start_time,
+                "cold_start": cold_start,
+                "startup_time": startup_time
+            }
+        finally:
+            # A call abandoned mid-stream leaves unread output behind, so the container is dropped
+            if healthy:
+                self.pool.release(container)
+            else:
+                self.pool.discard(container)
+        if failure:
+            yield failure
+            return
+
+        yield {
+            "status": response["status"],
+            "output": response["output"],
+            "result": response.get("result"),
+            "exit_code": response["exit_code"],
+            "execution_time": time.time() - start_time,
+            "cold_start": cold_start,
+            "startup_time": startup_time,
+            "memory_usage": response.get("memory_usage", 0.0),
+            "cpu_time": response.get("cpu_time", 0.0),
+            "wall_time": response.get("wall_time", 0.0)
+        }
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Warm container counts per runtime; empty without Docker"""
+        return self.pool.stats() if self.pool else {}
+
+    def prewarm(self, targets: List[Tuple[str, Optional[Dict[str, Any]], Optional[str], int]]) -> int:
+        """Keep containers warm for each (runtime, limits, layer, count); returns how many were started"""
+        return self.pool.prewarm(targets) if self.pool else 0
+
+    def build_layer(self, runtime: str, directory: str):
+        """Install the manifest in directory into a layer, inside the runtime's image so native packages match"""
+        if not self.client:
+            install_layer(runtime, directory)
+            return
+        volumes = {os.path.abspath(directory): {"bind": LAYER_MOUNT, "mode": "rw"}}
+        if LAYER_PIP_FIND_LINKS:
+            volumes[os.path.abspath(LAYER_PIP_FIND_LINKS)] = {"bind": WHEELHOUSE_MOUNT, "mode": "ro"}
+        container = self.client.containers.run(
+            get_runtime(runtime)["image"],
+            command=install_command(
+                runtime, LAYER_MOUNT, python="python",
+                wheelhouse=WHEELHOUSE_MOUNT if LAYER_PIP_FIND_LINKS else ""
+            ),
+            volumes=volumes,
+            # Files owned by this process, so collecting the layer can remove them
+            user=f"{os.getuid()}:{os.getgid()}",
+            environment={"HOME": "/tmp"},
+            detach=True
+        )
+        try:
+            result = container.wait(timeout=LAYER_BUILD_TIMEOUT)
+            if result["StatusCode"] != 0:
+                raise RuntimeError(container.logs().decode(errors="replace")[-2000:])
+        finally:
+            try:
+                container.remove(force=True)
+            except Exception:
+                pass
+
+    def shutdown(self):
+        """Stop pooled containers and remove cached artifacts"""
+        if self.pool:
+            self.pool.shutdown()
+        artifact_cache.clear()
 
     def _create_base_images(self):
-        """Pull base images for Python and JavaScript functions"""
+        """Pull the runtime images that aren't already present, in parallel"""
         if not self.client:
             return
-            
+
+        images = sorted({config["image"] for config in RUNTIMES.values()})
+        with ThreadPoolExecutor(max_workers=len(images)) as pool:
+            list(pool.map(self._ensure_image, images))
+
+    def _ensure_image(self, image: str):
         try:
-            print("Pulling Python base image...")
-            self.client.images.pull("python:3.9-slim")
-            print("Python image pulled successfully")
-            
-            print("Pulling Node.js base image...")
-            self.client.images.pull("node:16-slim")
-            print("Node.js image pulled successfully")
+            # The local image cache is checked first; only missing images are pulled
+            self.client.images.get(image)
+            return
+        except docker.errors.ImageNotFound:
+            pass
+        except Exception as e:
+            print(f"Error inspecting image {image}: {str(e)}")
+        try:
+            print(f"Pulling {image}...")
+            self.client.images.pull(image)
+            print(f"{image} pulled successfully")
         except Exception as e:
-            print(f"Error pulling base images: {str(e)}")
+            print(f"Error pulling {image}: {str(e)}")
@@ -0,0 +1,317 @@
+import json
+import os
+import socket
+import struct
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Dict, Any, List, Optional, Tuple
+
+from docker.types import Ulimit
+
+from ...monitoring import EXECUTOR_PHASE, timed
+from ..layers import layer_env, LAYER_MOUNT
+from ..runtimes import (
+    RUNTIMES, get_runtime, DEFAULT_MEMORY_LIMIT, DEFAULT_CPU_LIMIT,
+    FUNCTION_PIDS_LIMIT, FUNCTION_OPEN_FILES_LIMIT
+)
+
+# Warm pool configuration
+WARM_POOL_MIN_SIZE = int(os.getenv("WARM_POOL_MIN_SIZE", "1"))  # per runtime
+WARM_POOL_MAX_SIZE = int(os.getenv("WARM_POOL_MAX_SIZE", "10"))  # per runtime and limits
+WARM_POOL_IDLE_TIMEOUT = float(os.getenv("WARM_POOL_IDLE_TIMEOUT", "300"))  # seconds
+WARM_POOL_MAX_INVOCATIONS = int(os.getenv("WARM_POOL_MAX_INVOCATIONS", "100"))
+WARM_POOL_STARTUP_TIMEOUT = float(os.getenv("WARM_POOL_STARTUP_TIMEOUT", "30"))
+
+STDOUT = 1
+
+
+def container_limits(limits: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Docker create arguments enforcing a function's resource limits"""
+    if not limits:
+        return {}
+    memory = f"{limits['memory']}m"
+    return {
+        "mem_limit": memory,
+        "memswap_limit": memory,  # no swap on top of the memory limit
+        "nano_cpus": int(limits["cpus"] * 1e9),
+        "pids_limit": FUNCTION_PIDS_LIMIT,
+        "ulimits": [Ulimit(name="nofile", soft=FUNCTION_OPEN_FILES_LIMIT, hard=FUNCTION_OPEN_FILES_LIMIT)]
+    }
+
+
+def layer_mount(runtime: str, layer: Optional[str]) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """Docker volumes and environment that make a dependency layer available read-only"""
+    if not layer:
+        return {}, {}
+    return {os.path.abspath(layer): {"bind": LAYER_MOUNT, "mode": "ro"}}, layer_env(runtime, LAYER_MOUNT)
+
+
+def profile(runtime: str, limits: Optional[Dict[str, Any]], layer: Optional[str] = None) -> Tuple:
+    """Pool key: containers are only shared between functions with the same limits and layer"""
+    limits = limits or {}
+    return get_runtime(runtime)["name"], limits.get("memory"), limits.get("cpus"), layer
+
+
+DEFAULT_PROFILES = [
+    profile(name, {"memory": DEFAULT_MEMORY_LIMIT, "cpus": DEFAULT_CPU_LIMIT}) for name in RUNTIMES
+]
+
+
+class WarmContainer:
+    """A running runtime container that executes code sent over its attached stdin"""
+
+    def __init__(self, container, sock, key: Tuple):
+        self.container = container
+        self.key = key
+        self.runtime = key[0]
+        self.invocations = 0
+        self.startup_time = 0.0
+        self.last_used = time.time()
+        self.closed = False
+        self._sock = sock
+        self._raw = getattr(sock, "_sock", sock)
+        self._stdout = b""
+        self._stderr = b""
+
+    def send(self, message: Dict[str, Any]):
+        self._raw.sendall(json.dumps(message, default=str).encode() + b"\n")
+
+    def receive(self, timeout: float) -> Dict[str, Any]:
+        """Read the next protocol message, raising TimeoutError once timeout has elapsed"""
+        deadline = time.time() + timeout
+        while b"\n" not in self._stdout:
+            header = self._recv_exactly(8, deadline)
+            stream = header[0]
+            size = struct.unpack(">I", header[4:])[0]
+            data = self._recv_exactly(size, deadline)
+            if stream == STDOUT:
+                self._stdout += data
+            else:
+                self._stderr = (self._stderr + data)[-65536:]
+        line, self._stdout = self._stdout.split(b"\n", 1)
+        return json.loads(line)
+
+    def _recv_exactly(self, size: int, deadline: float) -> bytes:
+        data = b""
+        while len(data) < size:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise TimeoutError("Timed out waiting for container")
+            self._raw.settimeout(remaining)
+            try:
+                chunk = self._raw.recv(size - len(data))
+            except socket.timeout:
+                raise TimeoutError("Timed out waiting for container")
+            if not chunk:
+                raise ConnectionError(
+                    f"Container exited: {self._stderr.decode(errors='replace').strip()}"
+                )
+            data += chunk
+        return data
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._sock.close()
+        except Exception:
+            pass
+        try:
+            self.container.remove(force=True)
+        except Exception:
+            pass
+
+
+class WarmPool:
+    """Pool of pre-started containers reused across invocations.
+
+    Containers are grouped by runtime and resource limits; sizes apply to
+    each group and min_size is kept warm for the default limits. Targets
+    set with prewarm() raise how many containers a group keeps warm.
+    """
+
+    def __init__(
+        self,
+        client,
+        min_size: int = WARM_POOL_MIN_SIZE,
+        max_size: int = WARM_POOL_MAX_SIZE,
+        idle_timeout: float = WARM_POOL_IDLE_TIMEOUT,
+        max_invocations: int = WARM_POOL_MAX_INVOCATIONS
+    ):
+        self.client = client
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.max_invocations = max_invocations
+        self._idle: Dict[Tuple, deque] = defaultdict(deque)
+        self._size: Dict[Tuple, int] = defaultdict(int)
+        self._targets: Dict[Tuple, int] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._maintainer = threading.Thread(target=self._maintain, daemon=True)
+        self._maintainer.start()
+
+    def acquire(self, runtime: str, limits: Optional[Dict[str, Any]] = None,
+                layer: Optional[str] = None) -> Optional[Tuple[WarmContainer, bool]]:
+        """Lease a container as (container, cold_start), or None when the pool is full"""
+        key = profile(runtime, limits, layer)
+        with self._lock:
+            idle = self._idle[key]
+            while idle:
+                # Most recently used first, so surplus containers can idle out
+                container = idle.pop()
+                if not container.closed:
+                    return container, False
+                self._size[key] -= 1
+            if self._stopped.is_set() or self._size[key] >= self.max_size:
+                return None
+            self._size[key] += 1
+
+        try:
+            container = self._start(key)
+        except Exception:
+            with self._lock:
+                self._size[key] -= 1
+            raise
+        return container, True
+
+    def release(self, container: WarmContainer):
+        """Return a healthy container to the pool, recycling it once it has served enough calls"""
+        with self._lock:
+            if (
+                not container.closed
+                and not self._stopped.is_set()
+                and container.invocations < self.max_invocations
+            ):
+                container.last_used = time.time()
+                self._idle[container.key].append(container)
+                return
+            self._size[container.key] -= 1
+        container.close()
+
+    def discard(self, container: WarmContainer):
+        """Drop a container that timed out or failed mid-invocation"""
+        with self._lock:
+            self._size[container.key] -= 1
+        container.close()
+
+    def prewarm(self, targets: List[Tuple[str, Optional[Dict[str, Any]], Optional[str], int]]) -> int:
+        """Keep at least count containers warm for each (runtime, limits, layer, count).
+
+        Replaces the previous targets and starts missing containers on the
+        calling thread, returning how many were started; groups no longer
+        targeted idle out as usual.
+        """
+        keyed: Dict[Tuple, int] = defaultdict(int)
+        for runtime, limits, layer, count in targets:
+            keyed[profile(runtime, limits, layer)] += count
+        with self._lock:
+            self._targets = dict(keyed)
+        return self._replenish()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Container counts per runtime across all limit profiles"""
+        stats = {name: {"size": 0, "idle": 0} for name in RUNTIMES}
+        with self._lock:
+            for key, size in self._size.items():
+                stats[key[0]]["size"] += size
+                stats[key[0]]["idle"] += len(self._idle[key])
+        return stats
+
+    def shutdown(self):
+        self._stopped.set()
+        with self._lock:
+            containers = [c for idle in self._idle.values() for c in idle]
+            for key, idle in self._idle.items():
+                self._size[key] -= len(idle)
+                idle.clear()
+        for container in containers:
+            container.close()
+
+    def _start(self, key: Tuple) -> WarmContainer:
+        name, memory, cpus, layer = key
+        config = RUNTIMES[name]
+        limits = {"memory": memory, "cpus": cpus} if memory else None
+        volumes, environment = layer_mount(name, layer)
+        start_time = time.time()
+        # Not auto-removed, so an OOM kill can still be inspected before discard()
+        with timed(EXECUTOR_PHASE, "docker", "create"):
+            container = self.client.containers.create(
+                config["image"],
+                command=config["bootstrap"],
+                stdin_open=True,
+                detach=True,
+                volumes=volumes,
+                environment=environment,
+                **container_limits(limits)
+            )
+        try:
+            # Attach before starting so the ready message can't be missed
+            sock = container.attach_socket(
+                params={"stdin": 1, "stdout": 1, "stderr": 1, "stream": 1}
+            )
+            with timed(EXECUTOR_PHASE, "docker", "start"):
+                container.start()
+                warm = WarmContainer(container, sock, key)
+                message = warm.receive(WARM_POOL_STARTUP_TIMEOUT)
+            if message.get("type") != "ready":
+                raise RuntimeError(f"Unexpected message from runtime: {message}")
+        except Exception:
+            try:
+                container.remove(force=True)
+            except Exception:
+                pass
+            raise
+        warm.startup_time = time.time() - start_time
+        return warm
+
+    def _maintain(self):
+        interval = max(1.0, min(self.idle_timeout / 2, 30.0))
+        while not self._stopped.is_set():
+            self._evict_idle()
+            self._replenish()
+            self._stopped.wait(interval)
+
+    def _evict_idle(self):
+        now = time.time()
+        evicted = []
+        with self._lock:
+            for key, idle in self._idle.items():
+                keep = self._desired(key)
+                while (
+                    idle
+                    and self._size[key] > keep
+                    and now - idle[0].last_used > self.idle_timeout
+                ):
+                    evicted.append(idle.popleft())
+                    self._size[key] -= 1
+        for container in evicted:
+            container.close()
+
+    def _desired(self, key: Tuple) -> int:
+        # Only the default profiles are kept at min_size
+        keep = self.min_size if key in DEFAULT_PROFILES else 0
+        return min(max(keep, self._targets.get(key, 0)), self.max_size)
+
+    def _replenish(self) -> int:
+        started = 0
+        with self._lock:
+            keys = list(dict.fromkeys(DEFAULT_PROFILES + list(self._targets)))
+        for key in keys:
+            while not self._stopped.is_set():
+                with self._lock:
+                    if self._size[key] >= self._desired(key):
+                        break
+                    self._size[key] += 1
+                try:
+                    container = self._start(key)
+                except Exception as e:
+                    with self._lock:
+                        self._size[key] -= 1
+                    print(f"Failed to pre-warm {key[0]} container: {str(e)}")
+                    break
+                started += 1
+                self.release(container)
+        return started
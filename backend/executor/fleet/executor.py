@@ -0,0 +1,146 @@
+import json
+import os
+import time
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from ..cache import code_hash
+from ..concurrency import EXECUTOR_WORKERS
+from ..protocol import collect
+from ..runtimes import get_runtime
+from ...tracing import phase, record_phase
+from .registry import registry as default_registry, FLEET_TOKEN, FLEET_TOKEN_HEADER
+
+FLEET_CONNECT_TIMEOUT = float(os.getenv("FLEET_CONNECT_TIMEOUT", "2"))  # seconds
+# On top of the function's timeout before a node that stopped answering is given up on
+FLEET_READ_GRACE = float(os.getenv("FLEET_READ_GRACE", "30"))  # seconds
+
+
+def _undelivered(error: requests.RequestException) -> bool:
+    """Whether a request failed before reaching the node, so sending it elsewhere can't run it twice"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+class FleetExecutor:
+    """Dispatches calls to worker nodes registered with the node registry.
+
+    Each call goes to the least loaded live node with room for it,
+    preferring nodes where the function is already warm. A node that
+    can't be reached is marked down and the call moves to the next one;
+    a node lost mid-call fails that call, since it may already have run.
+    """
+
+    name = "fleet"
+
+    def __init__(self, registry=None):
+        self.registry = registry or default_registry
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=EXECUTOR_WORKERS)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def execute(self, code: str, runtime: str, timeout: float,
+                limits: Optional[Dict[str, Any]] = None, event: Any = None,
+                context: Optional[Dict[str, Any]] = None, layer: Optional[str] = None) -> Dict[str, Any]:
+        return collect(self._dispatch(code, runtime, timeout, limits, event, context, layer, stream=False))
+
+    def stream(self, code: str, runtime: str, timeout: float,
+               limits: Optional[Dict[str, Any]] = None, event: Any = None,
+               context: Optional[Dict[str, Any]] = None, layer: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Like execute, but yields output chunk messages as the node relays them before the result"""
+        return self._dispatch(code, runtime, timeout, limits, event, context, layer, stream=True)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return self.registry.pools()
+
+    def prewarm(self, targets: List[Tuple[str, Optional[Dict[str, Any]], Optional[str], int]]) -> int:
+        # Nodes keep their own pools warm
+        return 0
+
+    def build_layer(self, runtime: str, directory: str):
+        # A layer installed on the API host never reaches the nodes, so the
+        # install fails and calls get a clear error instead of missing modules
+        raise RuntimeError("Dependency layers are not supported with the fleet engine")
+
+    def shutdown(self):
+        self.session.close()
+
+    def _dispatch(self, code: str, runtime: str, timeout: float, limits: Optional[Dict[str, Any]],
+                  event: Any, context: Optional[Dict[str, Any]], layer: Optional[str],
+                  stream: bool) -> Iterator[Dict[str, Any]]:
+        """Run the call on a node; the final message carries the node's spans and the dispatch"""
+        spans: List[Dict[str, Any]] = []
+        name = get_runtime(runtime)["name"]
+        key = code_hash(code, runtime)
+        request = {
+            "code": code, "runtime": runtime, "timeout": timeout, "limits": limits,
+            "event": event, "context": context, "layer": layer, "stream": stream
+        }
+        tried = set()
+        start_time = time.time()
+        while True:
+            with phase(spans, "fleet", "select"):
+                node = self.registry.acquire(name, key, (limits or {}).get("memory"), tried)
+            if node is None:
+                yield {
+                    "status": "error",
+                    "output": "No executor node available",
+                    "exit_code": -1,
+                    "execution_time": time.time() - start_time,
+                    "spans": spans
+                }
+                return
+            tried.add(node.id)
+            try:
+                response = self.session.post(
+                    node.url + "/invoke", json=request, headers={FLEET_TOKEN_HEADER: FLEET_TOKEN},
+                    stream=True, timeout=(FLEET_CONNECT_TIMEOUT, timeout + FLEET_READ_GRACE)
+                )
+            except requests.RequestException as e:
+                self.registry.release(node)
+                if _undelivered(e):
+                    self.registry.mark_down(node)
+                    continue
+                yield self._failed(node, e, start_time, spans)
+                return
+            if response.status_code == 503:
+                # Full or still starting; another node may have room
+                response.close()
+                self.registry.release(node)
+                continue
+            break
+
+        try:
+            if response.status_code != 200:
+                yield self._failed(node, f"HTTP {response.status_code}: {response.text[:200]}", start_time, spans)
+                return
+            dispatch_start = time.time()
+            for line in response.iter_lines(chunk_size=None):
+                if not line:
+                    continue
+                message = json.loads(line)
+                if message.get("type") != "chunk":
+                    record_phase(spans, "fleet", "dispatch", dispatch_start, time.time() - dispatch_start)
+                    message["spans"] = (message.get("spans") or []) + spans
+                yield message
+        except requests.RequestException as e:
+            self.registry.mark_down(node)
+            yield self._failed(node, e, start_time, spans)
+        finally:
+            response.close()
+            self.registry.release(node)
+
+    def _failed(self, node, error, start_time: float, spans: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            "status": "error",
+            "output": f"Execution on node {node.id} failed: {str(error)}",
+            "exit_code": -1,
+            "execution_time": time.time() - start_time,
+            "spans": spans
+        }
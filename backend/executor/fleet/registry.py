@@ -0,0 +1,177 @@
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set
+
+from ...monitoring import gauges
+
+# Fleet configuration
+FLEET_TOKEN = os.getenv("FLEET_TOKEN", "")  # shared by the API and its worker nodes; empty disables the fleet
+FLEET_TOKEN_HEADER = "X-Fleet-Token"
+FLEET_NODE_TIMEOUT = float(os.getenv("FLEET_NODE_TIMEOUT", "15"))  # seconds without a heartbeat before a node is lost
+FLEET_AFFINITY_BONUS = float(os.getenv("FLEET_AFFINITY_BONUS", "0.25"))  # load a warm node may carry over a cold one
+
+
+class Node:
+    """A worker node as last reported by its heartbeat.
+
+    in_flight counts the calls this API has dispatched to the node. Calls
+    the node reported beyond those came from other API instances and are
+    added on until the next heartbeat.
+    """
+
+    def __init__(self, node_id: str, url: str):
+        self.id = node_id
+        self.url = url.rstrip("/")
+        self.capacity = 0
+        self.in_flight = 0
+        self.others_in_flight = 0
+        self.free_memory: Optional[float] = None  # in MB, None when the node can't tell
+        self.warm: Set[str] = set()  # code hashes of functions the node has run recently
+        self.pools: Dict[str, Dict[str, int]] = {}
+        self.last_seen = 0.0
+        self.down = False
+
+    def alive(self, now: float) -> bool:
+        return not self.down and now - self.last_seen < FLEET_NODE_TIMEOUT
+
+    @property
+    def busy(self) -> int:
+        return self.in_flight + self.others_in_flight
+
+    @property
+    def load(self) -> float:
+        return self.busy / self.capacity if self.capacity else 1.0
+
+    def to_dict(self, now: float) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "url": self.url,
+            "capacity": self.capacity,
+            "in_flight": self.busy,
+            "free_memory": self.free_memory,
+            "warm_functions": len(self.warm),
+            "pools": self.pools,
+            "alive": self.alive(now),
+            "last_seen": self.last_seen
+        }
+
+
+class NodeRegistry:
+    """Worker nodes known to this API, kept current by their heartbeats.
+
+    A node that misses heartbeats for FLEET_NODE_TIMEOUT seconds, or that
+    can't be reached, gets no more calls until it reports in again.
+    """
+
+    def __init__(self, affinity_bonus: float = FLEET_AFFINITY_BONUS):
+        self.affinity_bonus = affinity_bonus
+        self._nodes: Dict[str, Node] = {}
+        self._lock = threading.Lock()
+
+    def heartbeat(self, node_id: str, url: str, capacity: int, in_flight: int = 0,
+                  free_memory: Optional[float] = None, warm: Optional[List[str]] = None,
+                  pools: Optional[Dict[str, Dict[str, int]]] = None) -> Node:
+        now = time.time()
+        with self._lock:
+            node = self._nodes.get(node_id)
+            if node is None:
+                print(f"Executor node {node_id} joined at {url}")
+                node = self._nodes[node_id] = Node(node_id, url)
+            node.url = url.rstrip("/")
+            node.capacity = capacity
+            node.others_in_flight = max(0, in_flight - node.in_flight)
+            node.free_memory = free_memory
+            node.warm = set(warm or [])
+            node.pools = pools or {}
+            node.last_seen = now
+            node.down = False
+            # Forget nodes that have been gone for a while
+            for stale in [n for n in self._nodes.values() if now - n.last_seen > 10 * FLEET_NODE_TIMEOUT]:
+                del self._nodes[stale.id]
+        return node
+
+    def remove(self, node_id: str) -> bool:
+        with self._lock:
+            return self._nodes.pop(node_id, None) is not None
+
+    def acquire(self, runtime: str, code_hash: str, memory: Optional[float] = None,
+                exclude: Optional[Set[str]] = None) -> Optional[Node]:
+        """Reserve a slot on the best node for a call, or None when no node can take it.
+
+        Nodes are ranked by load, less a bonus when the function or its
+        runtime is warm there; ties go to the node with more free memory.
+        """
+        now = time.time()
+        with self._lock:
+            candidates = [
+                node for node in self._nodes.values()
+                if node.alive(now)
+                and node.id not in (exclude or ())
+                and node.busy < node.capacity
+                and (memory is None or node.free_memory is None or node.free_memory >= memory)
+            ]
+            if not candidates:
+                return None
+            random.shuffle(candidates)
+            node = min(candidates, key=lambda node: (
+                node.load - self._affinity(node, runtime, code_hash), -(node.free_memory or 0)
+            ))
+            node.in_flight += 1
+            node.warm.add(code_hash)
+        return node
+
+    def release(self, node: Node):
+        with self._lock:
+            node.in_flight -= 1
+
+    def mark_down(self, node: Node):
+        with self._lock:
+            if not node.down:
+                print(f"Executor node {node.id} is unreachable")
+            node.down = True
+
+    def nodes(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            return [node.to_dict(now) for node in self._nodes.values()]
+
+    def pools(self) -> Dict[str, Dict[str, int]]:
+        """Warm pool counts per runtime, summed over live nodes"""
+        now = time.time()
+        totals: Dict[str, Dict[str, int]] = {}
+        with self._lock:
+            for node in self._nodes.values():
+                if not node.alive(now):
+                    continue
+                for runtime, stats in node.pools.items():
+                    total = totals.setdefault(runtime, {"size": 0, "idle": 0})
+                    total["size"] += stats.get("size", 0)
+                    total["idle"] += stats.get("idle", 0)
+        return totals
+
+    def _affinity(self, node: Node, runtime: str, code_hash: str) -> float:
+        if code_hash in node.warm:
+            return self.affinity_bonus
+        if node.pools.get(runtime, {}).get("idle"):
+            return self.affinity_bonus / 2
+        return 0.0
+
+
+registry = NodeRegistry()
+
+
+def fleet_gauges():
+    """Worker node state, read when /metrics is scraped"""
+    nodes = registry.nodes()
+    if not nodes:
+        return
+    yield ("serverless_fleet_nodes", "Registered executor nodes by state",
+           ["state"], [(["alive"], sum(node["alive"] for node in nodes)),
+                       (["lost"], sum(not node["alive"] for node in nodes))])
+    yield ("serverless_fleet_node_load", "Calls in flight on each executor node over its capacity",
+           ["node"], [([node["id"]], node["in_flight"] / node["capacity"] if node["capacity"] else 0)
+                      for node in nodes])
+
+gauges.add(fleet_gauges)
@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List
+
+from .runtimes import get_runtime
+
+# Dependency layer build configuration
+LAYER_PIP_INDEX_URL = os.getenv("LAYER_PIP_INDEX_URL", "")  # such as a local mirror; empty uses PyPI
+LAYER_PIP_FIND_LINKS = os.getenv("LAYER_PIP_FIND_LINKS", "")  # a wheelhouse directory, installed from offline
+LAYER_NPM_REGISTRY = os.getenv("LAYER_NPM_REGISTRY", "")
+LAYER_BUILD_TIMEOUT = float(os.getenv("LAYER_BUILD_TIMEOUT", "600"))  # seconds
+
+# Where layers and the wheelhouse are mounted in containers
+LAYER_MOUNT = "/opt/layer"
+WHEELHOUSE_MOUNT = "/wheelhouse"
+
+
+def normalize_dependencies(runtime: str, dependencies: str) -> str:
+    """Canonical form of a requirements.txt or package.json, so equal sets share a layer.
+
+    Raises ValueError for a package.json that isn't a JSON object.
+    """
+    if get_runtime(runtime)["name"] == "python":
+        lines = {line.strip() for line in dependencies.splitlines()}
+        return "\n".join(sorted(line for line in lines if line and not line.startswith("#")))
+    manifest = json.loads(dependencies)
+    if not isinstance(manifest, dict):
+        raise ValueError("package.json must be a JSON object")
+    if not manifest.get("dependencies"):
+        return ""
+    # Only the dependencies matter to the layer
+    return json.dumps({"private": True, "dependencies": manifest["dependencies"]}, indent=2, sort_keys=True)
+
+
+def layer_hash(runtime: str, dependencies: str) -> str:
+    """Content hash identifying a normalized dependency set for a runtime"""
+    name = get_runtime(runtime)["name"]
+    return hashlib.sha256(f"{name}\0{dependencies}".encode()).hexdigest()
+
+
+def install_command(runtime: str, directory: str, python: str = sys.executable,
+                    wheelhouse: str = LAYER_PIP_FIND_LINKS) -> List[str]:
+    """Command installing the manifest in directory into the layer alongside it"""
+    config = get_runtime(runtime)
+    manifest = os.path.join(directory, config["manifest"])
+    if config["name"] == "python":
+        command = [
+            python, "-m", "pip", "install", "--no-cache-dir", "--disable-pip-version-check",
+            "--target", os.path.join(directory, config["layer_path"][1]), "-r", manifest
+        ]
+        if wheelhouse:
+            command += ["--no-index", "--find-links", wheelhouse]
+        elif LAYER_PIP_INDEX_URL:
+            command += ["--index-url", LAYER_PIP_INDEX_URL]
+        return command
+    command = ["npm", "install", "--omit=dev", "--no-audit", "--no-fund", "--prefix", directory]
+    if LAYER_NPM_REGISTRY:
+        command += ["--registry", LAYER_NPM_REGISTRY]
+    return command
+
+
+def layer_env(runtime: str, directory: str) -> Dict[str, str]:
+    """Environment that makes a layer's packages importable by the runtime"""
+    variable, subdirectory = get_runtime(runtime)["layer_path"]
+    return {variable: os.path.join(directory, subdirectory)}
+
+
+def install_layer(runtime: str, directory: str):
+    """Build a layer with the host's own runtime, for the process engine and local runs"""
+    try:
+        result = subprocess.run(
+            install_command(runtime, directory), stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            timeout=LAYER_BUILD_TIMEOUT
+        )
+    except subprocess.TimeoutExpired:
+        raise RuntimeError(f"Dependency install timed out after {LAYER_BUILD_TIMEOUT} seconds")
+    if result.returncode != 0:
+        raise RuntimeError(result.stdout.decode(errors="replace")[-2000:])
@@ -0,0 +1,395 @@
+import json
+import os
+import queue
+import resource
+import select
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+from ..layers import install_layer, layer_env
+from ..runtimes import RUNTIMES, get_runtime, cpu_budget, FUNCTION_OPEN_FILES_LIMIT
+from ..cache import code_hash
+from ..protocol import invoke_request, invocation_context, collect, with_spans
+from ...monitoring import EXECUTOR_PHASE
+from ...tracing import phase, record_phase
+
+# Process pool configuration
+PROCESS_POOL_SIZE = int(os.getenv("PROCESS_POOL_SIZE", str(os.cpu_count() or 1)))  # per runtime
+PROCESS_POOL_MAX_INVOCATIONS = int(os.getenv("PROCESS_POOL_MAX_INVOCATIONS", "1000"))
+PROCESS_POOL_STARTUP_TIMEOUT = float(os.getenv("PROCESS_POOL_STARTUP_TIMEOUT", "10"))
+
+# Whether limits can be set on a running worker from outside, for runtimes that don't apply them per call
+PROCESS_LIMITS_SUPPORTED = hasattr(resource, "prlimit") and os.path.exists("/proc/self/stat")
+
+
+def worker_memory(runtime: str, limits: Optional[Dict[str, Any]]) -> Optional[int]:
+    """The memory limit a worker must be started with, for runtimes that can't limit each call"""
+    if get_runtime(runtime)["call_limits"]:
+        return None
+    return (limits or {}).get("memory") or None
+
+
+class Worker:
+    """A runtime process that executes code sent over its stdin.
+
+    Runners that can't apply limits to each call are started with their
+    memory limit, and have their CPU limit set from here before each call.
+    """
+
+    def __init__(self, runtime: str, layer: Optional[str] = None, memory: Optional[int] = None):
+        config = get_runtime(runtime)
+        command = list(config["bootstrap"])
+        if config["name"] == "python":
+            command[0] = sys.executable
+        elif memory:
+            # A heap overflow fails in V8 rather than at the data limit below
+            command.insert(1, f"--max-old-space-size={memory}")
+        self.runtime = config["name"]
+        self.layer = layer
+        self.memory = memory
+        env = dict(os.environ, FUNCTION_LIMITS=json.dumps({"open_files": FUNCTION_OPEN_FILES_LIMIT}))
+        if layer:
+            env.update(layer_env(runtime, layer))
+        self.invocations = 0
+        self.closed = False
+        self.workdir = tempfile.mkdtemp(prefix="serverless-worker-")
+        start_time = time.time()
+        # Own session so a hard kill also takes down anything the function spawned
+        self.process = subprocess.Popen(
+            command,
+            cwd=self.workdir,
+            env=env,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True
+        )
+        self._stdout = b""
+        try:
+            if memory:
+                size = memory * 1024 * 1024
+                resource.prlimit(self.process.pid, resource.RLIMIT_DATA, (size, size))
+            message = self.receive(PROCESS_POOL_STARTUP_TIMEOUT)
+            if message.get("type") != "ready":
+                raise RuntimeError(f"Unexpected message from runtime: {message}")
+        except Exception:
+            self.close()
+            raise
+        self.startup_time = time.time() - start_time
+        EXECUTOR_PHASE.labels("process", "spawn").observe(self.startup_time)
+
+    def limit_cpu(self, seconds: int):
+        """Allow the worker seconds more CPU time; it is killed with SIGXCPU past that"""
+        with open(f"/proc/{self.process.pid}/stat") as f:
+            # Fields after the parenthesized command name, which may contain spaces
+            fields = f.read().rsplit(")", 1)[1].split()
+        used = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        _, hard = resource.prlimit(self.process.pid, resource.RLIMIT_CPU)
+        soft = int(used) + seconds
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.prlimit(self.process.pid, resource.RLIMIT_CPU, (soft, hard))
+
+    def send(self, message: Dict[str, Any]):
+        self.process.stdin.write(json.dumps(message, default=str).encode() + b"\n")
+        self.process.stdin.flush()
+
+    def receive(self, timeout: float) -> Dict[str, Any]:
+        """Read the next protocol message, raising TimeoutError once timeout has elapsed"""
+        deadline = time.time() + timeout
+        fd = self.process.stdout.fileno()
+        while b"\n" not in self._stdout:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise TimeoutError("Timed out waiting for worker")
+            readable, _, _ = select.select([fd], [], [], remaining)
+            if not readable:
+                continue
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                raise ConnectionError(f"Worker exited with code {self.process.wait()}")
+            self._stdout += chunk
+        line, self._stdout = self._stdout.split(b"\n", 1)
+        return json.loads(line)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except OSError:
+            pass
+        self.process.wait()
+        for stream in (self.process.stdin, self.process.stdout):
+            try:
+                stream.close()
+            except Exception:
+                pass
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+class ProcessExecutor:
+    """Executes functions on a pool of pre-forked runtime processes.
+
+    Workers keep their interpreter between calls, run each call under
+    rlimits and are killed outright when a call overruns its timeout.
+    A worker's environment carries its dependency layer, and runners that
+    can't limit memory per call are started with it, so idle workers are
+    kept per runtime, layer and, for those, memory limit.
+    """
+
+    name = "process"
+
+    def __init__(self, size: int = PROCESS_POOL_SIZE,
+                 max_invocations: int = PROCESS_POOL_MAX_INVOCATIONS):
+        self.size = size
+        self.max_invocations = max_invocations
+        self._available = {name: self._runtime_available(name) for name in RUNTIMES}
+        self._idle = {(name, None, None): queue.LifoQueue() for name in RUNTIMES}
+        self._idle_lock = threading.Lock()
+        self._slots = {name: threading.BoundedSemaphore(size) for name in RUNTIMES}
+        self._stopped = threading.Event()
+        # Python workers are forked in the background so startup isn't blocked
+        threading.Thread(target=self._prefork, args=("python",), daemon=True).start()
+
+    def execute(self, code: str, runtime: str, timeout: float,
+                limits: Optional[Dict[str, Any]] = None, event: Any = None,
+                context: Optional[Dict[str, Any]] = None, layer: Optional[str] = None) -> Dict[str, Any]:
+        return collect(self._invoke(code, runtime, timeout, limits, event, context, layer, stream=False))
+
+    def stream(self, code: str, runtime: str, timeout: float,
+               limits: Optional[Dict[str, Any]] = None, event: Any = None,
+               context: Optional[Dict[str, Any]] = None, layer: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Like execute, but yields output chunk messages as they are written before the result"""
+        return self._invoke(code, runtime, timeout, limits, event, context, layer, stream=True)
+
+    def _invoke(self, code: str, runtime: str, timeout: float, limits: Optional[Dict[str, Any]],
+                event: Any, context: Optional[Dict[str, Any]], layer: Optional[str],
+                stream: bool) -> Iterator[Dict[str, Any]]:
+        """Run the call; the final message carries spans timing its phases"""
+        spans: List[Dict[str, Any]] = []
+        return with_spans(
+            self._dispatch(code, runtime, timeout, limits, event, context, layer, stream, spans), spans
+        )
+
+    def _dispatch(self, code: str, runtime: str, timeout: float, limits: Optional[Dict[str, Any]],
+                  event: Any, context: Optional[Dict[str, Any]], layer: Optional[str], stream: bool,
+                  spans: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        name = get_runtime(runtime)["name"]
+        if not self._available[name]:
+            yield {
+                "status": "error",
+                "output": f"Runtime {runtime} is not available on this host",
+                "exit_code": -1,
+                "execution_time": 0
+            }
+            return
+        if not get_runtime(name)["call_limits"] and not PROCESS_LIMITS_SUPPORTED:
+            # Refused rather than run without its memory and CPU limits
+            yield {
+                "status": "error",
+                "output": f"Runtime {runtime} can't be run under resource limits on this host",
+                "exit_code": -1,
+                "execution_time": 0
+            }
+            return
+
+        start_time = time.time()
+        try:
+            with phase(spans, "process", "acquire"):
+                worker, cold_start = self._acquire(name, layer, worker_memory(name, limits), timeout)
+        except Exception as e:
+            yield {
+                "status": "error",
+                "output": f"Worker start failed: {str(e)}",
+                "exit_code": -1,
+                "execution_time": time.time() - start_time
+            }
+            return
+        startup_time = worker.startup_time if cold_start else 0.0
+
+        call_limits = {"cpu_seconds": cpu_budget(timeout, limits)}
+        if limits and limits.get("memory"):
+            call_limits["memory"] = limits["memory"]
+        start_time = time.time()
+        deadline = start_time + timeout
+        failure = None
+        healthy = False
+        try:
+            worker.invocations += 1
+            if not get_runtime(name)["call_limits"]:
+                worker.limit_cpu(call_limits["cpu_seconds"])
+            worker.send(invoke_request(
+                code, code_hash(code, runtime), call_limits,
+                event, invocation_context(context, timeout, limits), stream
+            ))
+            while True:
+                response = worker.receive(deadline - time.time())
+                if response.get("type") != "chunk":
+                    break
+                yield response
+            healthy = True
+            record_phase(spans, "process", "invoke", start_time, time.time() - start_time)
+        except TimeoutError:
+            failure = {
+                "status": "timeout",
+                "output": f"Function timed out after {timeout} seconds",
+                "exit_code": -1,
+                "execution_time": time.time() - start_time,
+                "cold_start": cold_start,
+                "startup_time": startup_time
+            }
+        except Exception as e:
+            returncode = worker.process.poll()
+            if returncode == -signal.SIGXCPU:
+                status, output = "cpu_throttled", f"CPU limit of {call_limits['cpu_seconds']} seconds exceeded"
+            elif worker.memory and returncode in (-signal.SIGABRT, -signal.SIGSEGV):
+                # V8 aborts when the heap or the data limit leaves it no room to grow
+                status, output = "oom", "Function exceeded its memory limit"
+            else:
+                status, output = "error", f"Worker execution failed: {str(e)}"
+            failure = {
+                "status": status,
+                "output": output,
+                "exit_code": -1,
+                "execution_time": time.time() - start_time,
+                "cold_start": cold_start,
+                "startup_time": startup_time
+            }
+        finally:
+            # A call abandoned mid-stream leaves unread output behind, so the worker is replaced
+            self._release(worker, healthy)
+        if failure:
+            yield failure
+            return
+
+        yield {
+            "status": response["status"],
+            "output": response["output"],
+            "result": response.get("result"),
+            "exit_code": response["exit_code"],
+            "execution_time": time.time() - start_time,
+            "cold_start": cold_start,
+            "startup_time": startup_time,
+            "memory_usage": response.get("memory_usage", 0.0),
+            "cpu_time": response.get("cpu_time", 0.0),
+            "wall_time": response.get("wall_time", 0.0)
+        }
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            name: {"size": self.size, "idle": self._idle_count(name)}
+            for name in RUNTIMES
+        }
+
+    def prewarm(self, targets: List[Tuple[str, Optional[Dict[str, Any]], Optional[str], int]]) -> int:
+        """Fork idle workers up to the count for each (runtime, limits, layer, count).
+
+        Targets add up per runtime, layer and the memory limit workers are
+        started with; returns how many workers were started.
+        """
+        counts: Dict[Tuple[str, Optional[str], Optional[int]], int] = {}
+        for runtime, limits, layer, count in targets:
+            key = (get_runtime(runtime)["name"], layer, worker_memory(runtime, limits))
+            counts[key] = counts.get(key, 0) + count
+        return sum(
+            self._prefork(
+                name, min(count, self.size) - self._idle_queue(name, layer, memory).qsize(), layer, memory
+            )
+            for (name, layer, memory), count in counts.items() if self._available[name]
+        )
+
+    def build_layer(self, runtime: str, directory: str):
+        install_layer(runtime, directory)
+
+    def shutdown(self):
+        self._stopped.set()
+        with self._idle_lock:
+            queues = list(self._idle.values())
+        for idle in queues:
+            while True:
+                try:
+                    idle.get_nowait().close()
+                except queue.Empty:
+                    break
+
+    def _idle_queue(self, name: str, layer: Optional[str], memory: Optional[int] = None) -> queue.LifoQueue:
+        with self._idle_lock:
+            return self._idle.setdefault((name, layer, memory), queue.LifoQueue())
+
+    def _idle_count(self, name: str) -> int:
+        with self._idle_lock:
+            return sum(idle.qsize() for (runtime, _, _), idle in self._idle.items() if runtime == name)
+
+    def _acquire(self, name: str, layer: Optional[str], memory: Optional[int],
+                 timeout: float) -> Tuple[Worker, bool]:
+        """Lease a worker as (worker, cold_start), waiting up to timeout for a free slot"""
+        if not self._slots[name].acquire(timeout=timeout):
+            raise RuntimeError("No worker became available")
+        try:
+            worker = self._idle_queue(name, layer, memory).get_nowait()
+            if not worker.closed and worker.process.poll() is None:
+                return worker, False
+            worker.close()
+        except queue.Empty:
+            pass
+        try:
+            return Worker(name, layer, memory), True
+        except Exception:
+            self._slots[name].release()
+            raise
+
+    def _release(self, worker: Worker, healthy: bool = True):
+        if (
+            healthy
+            and not self._stopped.is_set()
+            and worker.invocations < self.max_invocations
+        ):
+            if self._idle_count(worker.runtime) >= self.size:
+                self._evict_idle(worker.runtime)
+            self._idle_queue(worker.runtime, worker.layer, worker.memory).put(worker)
+        else:
+            worker.close()
+        self._slots[worker.runtime].release()
+
+    def _evict_idle(self, name: str):
+        """Close an idle worker of the runtime to make room, from the layer and limit with the most idle"""
+        with self._idle_lock:
+            queues = sorted(
+                (idle for (runtime, _, _), idle in self._idle.items() if runtime == name),
+                key=lambda idle: idle.qsize(), reverse=True
+            )
+        for idle in queues:
+            try:
+                idle.get_nowait().close()
+                return
+            except queue.Empty:
+                continue
+
+    def _prefork(self, name: str, count: Optional[int] = None, layer: Optional[str] = None,
+                 memory: Optional[int] = None) -> int:
+        """Start up to count idle workers, all of the pool by default; returns how many started"""
+        started = 0
+        for _ in range(self.size if count is None else count):
+            if self._stopped.is_set() or not self._slots[name].acquire(blocking=False):
+                break
+            try:
+                worker = Worker(name, layer, memory)
+            except Exception as e:
+                self._slots[name].release()
+                print(f"Failed to start {name} worker: {str(e)}")
+                break
+            self._release(worker)
+            started += 1
+        return started
+
+    def _runtime_available(self, name: str) -> bool:
+        command = RUNTIMES[name]["bootstrap"][0]
+        return name == "python" or shutil.which(command) is not None
@@ -0,0 +1,88 @@
+import json
+from typing import Dict, Any, Generator, Iterable, Iterator, List, Optional
+
+
+def invoke_request(code: str, code_hash: str, limits: Optional[Dict[str, Any]],
+                   event: Any = None, context: Optional[Dict[str, Any]] = None,
+                   stream: bool = False) -> Dict[str, Any]:
+    """Request message for a long-lived runner"""
+    return {
+        "type": "invoke",
+        "code": code,
+        "hash": code_hash,
+        "limits": limits,
+        "event": event,
+        "context": context,
+        "stream": stream
+    }
+
+
+def invocation_context(context: Optional[Dict[str, Any]], timeout: float,
+                       limits: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Context details for a call, completed with its timeout and memory limit"""
+    details = dict(context or {})
+    details["timeout"] = timeout
+    if limits and limits.get("memory"):
+        details["memory_limit"] = limits["memory"]
+    return details
+
+
+def iter_lines(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Split a stream of byte chunks into lines"""
+    pending = b""
+    for chunk in chunks:
+        pending += chunk
+        while b"\n" in pending:
+            line, pending = pending.split(b"\n", 1)
+            yield line
+    if pending:
+        yield pending
+
+
+def parse_messages(lines: Iterable[bytes]) -> Iterator[Dict[str, Any]]:
+    """Runner messages from output lines; anything outside the protocol becomes a chunk"""
+    for line in lines:
+        try:
+            message = json.loads(line)
+        except ValueError:
+            message = None
+        if not isinstance(message, dict) or message.get("type") not in ("chunk", "result"):
+            # Such as interpreter errors written before the runner started
+            message = {"type": "chunk", "data": line.decode(errors="replace") + "\n"}
+        yield message
+
+
+def collect(messages: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Fold streamed chunk messages into the output of the final result.
+
+    A stream that ends without a result, such as a runner or node that
+    exited early, is reported as an error with whatever output it wrote.
+    """
+    chunks = []
+    result = None
+    for message in messages:
+        if message.get("type") == "chunk":
+            chunks.append(message["data"])
+        else:
+            result = message
+    if result is None:
+        output = "".join(chunks).strip()
+        return {"status": "error", "output": output or "No result from runtime", "exit_code": -1}
+    result = dict(result)
+    result.pop("type", None)
+    if chunks:
+        result["output"] = ("".join(chunks) + (result.get("output") or "")).strip()
+    return result
+
+
+def with_spans(messages: Generator[Dict[str, Any], None, None],
+               spans: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """Relay messages, attaching the spans recorded while producing them to the final one"""
+    try:
+        for message in messages:
+            if message.get("type") != "chunk":
+                message["spans"] = spans
+            yield message
+    finally:
+        # Closing an abandoned stream lets the executor release its container or worker
+        messages.close()
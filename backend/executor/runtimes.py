@@ -0,0 +1,51 @@
+import math
+import os
+from typing import Dict, Any, Optional
+
+# Resource limit defaults
+DEFAULT_MEMORY_LIMIT = int(os.getenv("FUNCTION_DEFAULT_MEMORY_LIMIT", "256"))  # in MB
+DEFAULT_CPU_LIMIT = float(os.getenv("FUNCTION_DEFAULT_CPU_LIMIT", "1.0"))  # in cores
+FUNCTION_PIDS_LIMIT = int(os.getenv("FUNCTION_PIDS_LIMIT", "64"))
+FUNCTION_OPEN_FILES_LIMIT = int(os.getenv("FUNCTION_OPEN_FILES_LIMIT", "1024"))
+
+BOOTSTRAP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bootstrap")
+
+
+def _load_bootstrap(filename: str) -> str:
+    with open(os.path.join(BOOTSTRAP_DIR, filename)) as f:
+        return f.read()
+
+
+RUNTIMES: Dict[str, Dict[str, Any]] = {
+    "python": {
+        "name": "python",
+        "image": "python:3.9-slim",
+        "command": "python",
+        "filename": "function.py",
+        "bootstrap": ["python", "-u", "-c", _load_bootstrap("python_runtime.py")],
+        "manifest": "requirements.txt",
+        "layer_path": ("PYTHONPATH", "python"),  # where a dependency layer's packages are found
+        "call_limits": True,  # the runner applies memory and CPU limits to each call itself
+    },
+    "javascript": {
+        "name": "javascript",
+        "image": "node:16-slim",
+        "command": "node",
+        "filename": "function.js",
+        "bootstrap": ["node", "-e", _load_bootstrap("node_runtime.js")],
+        "manifest": "package.json",
+        "layer_path": ("NODE_PATH", "node_modules"),
+        "call_limits": False,
+    },
+}
+
+
+def get_runtime(runtime: str) -> Dict[str, Any]:
+    """Settings for a runtime; anything that is not Python runs on Node.js"""
+    return RUNTIMES["python" if runtime == "python" else "javascript"]
+
+
+def cpu_budget(timeout: float, limits: Optional[Dict[str, Any]]) -> int:
+    """CPU seconds a call may use: its share of cores for the whole timeout"""
+    cpus = (limits or {}).get("cpus") or DEFAULT_CPU_LIMIT
+    return max(1, math.ceil(timeout * cpus))
@@ -1,10 +1,13 @@
-from backend.models.base import Base, engine
+from backend.models.base import Base, engine, upgrade_schema
 from backend.models.function import Function
 from backend.models.metrics import FunctionMetrics
+from backend.models.invocation import Invocation
+from backend.models.rollup import MetricsRollup
 
 def init_db():
     # Create all tables
     Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
 
 if __name__ == "__main__":
     init_db()
@@ -1,6 +1,8 @@
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from .api import functions, metrics, auth, execute
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from .api import functions, metrics, auth, execute, batch, fleet, gateway
 from .api.auth import get_current_user
 
 app = FastAPI(title="Serverless Platform")
@@ -34,7 +36,38 @@ app.include_router(
     tags=["execute"],
     dependencies=[Depends(get_current_user)]
 )
+app.include_router(
+    batch.router,
+    prefix="/api/v1",
+    tags=["execute"],
+    dependencies=[Depends(get_current_user)]
+)
+# Worker nodes authenticate with the fleet token, so each route sets its own dependencies
+app.include_router(fleet.router, prefix="/api/v1", tags=["fleet"])
+
+@app.on_event("startup")
+def start_executor():
+    execute.startup()
+
+@app.on_event("shutdown")
+def shutdown_executor():
+    execute.shutdown()
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the Serverless Platform"}
+
+# Unauthenticated so Prometheus can scrape it; it exposes counts and timings, not data
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    return Response(generate_latest(), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+# Readiness for load balancers: 503 until the executor has finished starting
+@app.get("/ready", include_in_schema=False)
+def readiness():
+    status = execute.executor.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+# Functions are served at their routes; registered last so it can't shadow other paths.
+# The gateway authenticates callers itself, once their route has resolved to a function.
+app.include_router(gateway.router, tags=["gateway"])
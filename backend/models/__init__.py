@@ -1,7 +1,11 @@
-from .base import Base, engine, SessionLocal
+from .base import Base, engine, SessionLocal, get_db, upgrade_schema
 from .function import Function
 from .metrics import FunctionMetrics
+from .invocation import Invocation
+from .layer import Layer
+from .rollup import MetricsRollup
 from .user import User
 
 # Create all tables
 Base.metadata.create_all(bind=engine)
+upgrade_schema(engine)
@@ -1,10 +1,79 @@
-from sqlalchemy import create_engine
+import os
+
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+
+# Database configuration
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./serverless.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds waiting for a connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds before a connection is replaced
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))  # milliseconds waiting on a lock
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+
+
+def _create_engine(url: str):
+    backend = make_url(url)
+    pool = {
+        "poolclass": QueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+    }
+    if backend.get_backend_name() != "sqlite":
+        return create_engine(url, pool_pre_ping=True, pool_recycle=DB_POOL_RECYCLE, **pool)
+
+    if backend.database in (None, "", ":memory:"):
+        # In-memory databases live and die with a single connection
+        pool = {}
+    engine = create_engine(url, connect_args={"check_same_thread": False}, **pool)
+
+    @event.listens_for(engine, "connect")
+    def configure_sqlite(dbapi_connection, connection_record):
+        # WAL lets readers run alongside the writer; NORMAL only syncs at
+        # checkpoints, which is still safe against corruption in WAL mode
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+        cursor.close()
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./serverless.db"
+    return engine
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+
+engine = _create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
+
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def upgrade_schema(bind):
+    """Add columns and indexes introduced after a table was first created"""
+    inspector = inspect(bind)
+    with bind.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=bind.dialect)
+                    connection.execute(text(
+                        f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"
+                    ))
+            indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(connection)
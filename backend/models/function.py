@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .base import Base
+from ..executor.runtimes import DEFAULT_MEMORY_LIMIT, DEFAULT_CPU_LIMIT
 
 class Function(Base):
     __tablename__ = "functions"
@@ -12,8 +13,31 @@ class Function(Base):
     code = Column(String)
     route = Column(String, unique=True)
     timeout = Column(Float, default=30.0)  # timeout in seconds
+    memory_limit = Column(Integer, default=DEFAULT_MEMORY_LIMIT)  # in MB
+    cpu_limit = Column(Float, default=DEFAULT_CPU_LIMIT)  # in cores
+    max_concurrency = Column(Integer, nullable=True)  # in-flight executions, None for the platform default
+    prewarm = Column(Boolean, default=True)  # warm environments ahead of predicted traffic
+    min_warm = Column(Integer, default=0)  # environments kept warm regardless of traffic
+    keep_alive = Column(Float, nullable=True)  # seconds kept warm after the last call, None for the platform default
+    dependencies = Column(String, nullable=True)  # requirements.txt for Python, package.json for JavaScript
+    layer_hash = Column(String, nullable=True, index=True)  # the Layer holding the installed dependencies
+    cacheable = Column(Boolean, default=False)  # results depend only on the event, so they may be reused
+    cache_ttl = Column(Float, nullable=True)  # seconds a cached result is reused, None for the platform default
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relationship with metrics
     metrics = relationship("FunctionMetrics", back_populates="function", cascade="all, delete-orphan")
+    rollups = relationship("MetricsRollup", back_populates="function", cascade="all, delete-orphan")
+
+    @property
+    def limits(self) -> dict:
+        """Resource limits passed to the executor"""
+        return {
+            "memory": self.memory_limit or DEFAULT_MEMORY_LIMIT,
+            "cpus": self.cpu_limit or DEFAULT_CPU_LIMIT
+        }
+
+    def context(self, request_id: str) -> dict:
+        """Invocation details passed to the handler alongside its event"""
+        return {"function_name": self.name, "function_id": self.id, "request_id": request_id}
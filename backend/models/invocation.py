@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, Float, DateTime, String, ForeignKey, JSON
+from datetime import datetime
+from .base import Base
+
+class Invocation(Base):
+    __tablename__ = "invocations"
+
+    id = Column(String, primary_key=True)  # job id returned to the caller
+    function_id = Column(Integer, ForeignKey("functions.id"), index=True)
+    status = Column(String, default="queued", index=True)  # queued, running or a FunctionMetrics status
+    event = Column(JSON, nullable=True)  # payload passed to the handler
+    output = Column(String, nullable=True)
+    result = Column(JSON, nullable=True)  # handler return value
+    exit_code = Column(Integer, nullable=True)
+    execution_time = Column(Float, nullable=True)  # in seconds
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    owner = Column(String, nullable=True)  # queue instance running the job
+    heartbeat_at = Column(DateTime, nullable=True)  # last time the owner renewed its lease
+    completed_at = Column(DateTime, nullable=True)
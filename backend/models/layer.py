@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from datetime import datetime
+from .base import Base
+
+class Layer(Base):
+    """A dependency set installed once and shared by every function that declares it"""
+    __tablename__ = "layers"
+
+    id = Column(Integer, primary_key=True, index=True)
+    hash = Column(String, unique=True, index=True)  # see executor.layers.layer_hash
+    runtime = Column(String)
+    dependencies = Column(String)  # normalized requirements.txt or package.json
+    status = Column(String, default="pending")  # pending, building, ready or failed
+    error = Column(String, nullable=True)  # tail of the install output when the build failed
+    size_bytes = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    built_at = Column(DateTime, nullable=True)
+    last_used_at = Column(DateTime, nullable=True)
@@ -1,18 +1,44 @@
-from sqlalchemy import Column, Integer, Float, DateTime, String, ForeignKey
+from sqlalchemy import Column, Integer, Float, DateTime, String, ForeignKey, Boolean, Index, JSON
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .base import Base
 
 class FunctionMetrics(Base):
     __tablename__ = "function_metrics"
+    # Per-function time range scans, for queries and retention alike
+    __table_args__ = (Index("ix_function_metrics_function_id_timestamp", "function_id", "timestamp"),)
 
     id = Column(Integer, primary_key=True, index=True)
     function_id = Column(Integer, ForeignKey("functions.id"))
     execution_time = Column(Float)  # in seconds
-    memory_usage = Column(Float)    # in MB
-    status = Column(String)         # success or error
+    memory_usage = Column(Float)    # peak RSS in MB
+    cpu_time = Column(Float, default=0.0)   # user + system CPU in seconds
+    wall_time = Column(Float, default=0.0)  # in seconds, time spent inside the runtime
+    status = Column(String)         # success, error, timeout, oom or cpu_throttled
     error_message = Column(String, nullable=True)
+    cold_start = Column(Boolean, default=False)
+    startup_time = Column(Float, default=0.0)  # in seconds, time spent starting a container
     timestamp = Column(DateTime, default=datetime.utcnow)
+    trace_id = Column(String, nullable=True, index=True)
+    spans = Column(JSON, nullable=True)  # [{name, start, duration}], in seconds from the start of the trace
 
     # Relationship
     function = relationship("Function", back_populates="metrics")
+
+    @staticmethod
+    def values(function_id: int, result: dict, execution_time: float) -> dict:
+        """Column values for an executor result"""
+        return {
+            "function_id": function_id,
+            "execution_time": execution_time,
+            "memory_usage": result.get("memory_usage", 0.0),
+            "cpu_time": result.get("cpu_time", 0.0),
+            "wall_time": result.get("wall_time", 0.0),
+            "status": result["status"],
+            "error_message": result["output"] if result["status"] != "success" else None,
+            "cold_start": result.get("cold_start", False),
+            "startup_time": result.get("startup_time", 0.0),
+            "timestamp": datetime.utcnow(),
+            "trace_id": result.get("trace_id"),
+            "spans": result.get("spans")
+        }
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, Float, DateTime, String, ForeignKey, JSON, UniqueConstraint
+from sqlalchemy.orm import relationship
+from .base import Base
+
+class MetricsRollup(Base):
+    """Aggregated FunctionMetrics for one function over one time bucket"""
+    __tablename__ = "metrics_rollups"
+    __table_args__ = (UniqueConstraint("function_id", "resolution", "bucket_start"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    function_id = Column(Integer, ForeignKey("functions.id"), index=True)
+    resolution = Column(String)  # minute, hour, day or total
+    bucket_start = Column(DateTime)
+    count = Column(Integer, default=0)
+    success_count = Column(Integer, default=0)
+    cold_starts = Column(Integer, default=0)
+    sum_execution_time = Column(Float, default=0.0)  # in seconds
+    min_execution_time = Column(Float, nullable=True)
+    max_execution_time = Column(Float, nullable=True)
+    sum_memory_usage = Column(Float, default=0.0)  # in MB
+    max_memory_usage = Column(Float, nullable=True)
+    sum_cpu_time = Column(Float, default=0.0)  # in seconds
+    latency_sketch = Column(JSON)  # execution time histogram, see services.rollups.LatencySketch
+
+    function = relationship("Function", back_populates="rollups")
@@ -2,8 +2,12 @@ from sqlalchemy import Column, Integer, String, DateTime
 from datetime import datetime
 from .base import Base
 from passlib.context import CryptContext
+import os
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Cost factor for new hashes; existing hashes keep verifying at their own cost
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 class User(Base):
     __tablename__ = "users"
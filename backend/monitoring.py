@@ -0,0 +1,88 @@
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List
+
+from prometheus_client import Counter, Histogram, REGISTRY
+from prometheus_client.core import GaugeMetricFamily
+
+# Invocation latency spans warm calls of a few milliseconds to multi-minute timeouts
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+PHASE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+COMMIT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+
+INVOCATIONS = Counter(
+    "serverless_invocations_total",
+    "Function invocations by outcome",
+    ["function", "runtime", "status"]
+)
+INVOCATION_DURATION = Histogram(
+    "serverless_invocation_duration_seconds",
+    "End-to-end function invocation time, including any queueing for a container or worker",
+    ["function", "runtime"],
+    buckets=LATENCY_BUCKETS
+)
+COLD_STARTS = Counter(
+    "serverless_cold_starts_total",
+    "Invocations that had to start a container or worker",
+    ["runtime"]
+)
+EXECUTOR_PHASE = Histogram(
+    "serverless_executor_phase_seconds",
+    "Time spent in each executor phase: container create, start, logs, wait, and so on",
+    ["engine", "phase"],
+    buckets=PHASE_BUCKETS
+)
+DB_COMMIT = Histogram(
+    "serverless_db_commit_seconds",
+    "Database transaction commit time on the hot write paths",
+    ["operation"],
+    buckets=COMMIT_BUCKETS
+)
+
+
+def observe_invocation(function_id: int, runtime: str, result: Dict, execution_time: float):
+    INVOCATIONS.labels(str(function_id), runtime, result.get("status", "error")).inc()
+    INVOCATION_DURATION.labels(str(function_id), runtime).observe(execution_time)
+    if result.get("cold_start"):
+        COLD_STARTS.labels(runtime).inc()
+
+
+@contextmanager
+def timed(histogram: Histogram, *labels: str):
+    """Observe the time spent in the block, whether or not it raises"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.labels(*labels).observe(time.perf_counter() - start)
+
+
+class GaugeCollector:
+    """Gauges read from component stats at scrape time rather than kept up to date on the hot path.
+
+    Each source returns (name, documentation, label names, samples), where
+    samples are (label values, value) pairs.
+    """
+
+    def __init__(self):
+        self._sources: List[Callable[[], Iterable]] = []
+
+    def add(self, source: Callable[[], Iterable]):
+        self._sources.append(source)
+
+    def collect(self):
+        for source in self._sources:
+            try:
+                families = list(source())
+            except Exception as e:
+                print(f"Failed to collect gauges: {str(e)}")
+                continue
+            for name, documentation, label_names, samples in families:
+                family = GaugeMetricFamily(name, documentation, labels=label_names)
+                for label_values, value in samples:
+                    family.add_metric(label_values, value)
+                yield family
+
+
+gauges = GaugeCollector()
+REGISTRY.register(gauges)
@@ -0,0 +1,309 @@
+import asyncio
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, List, Optional
+
+from sqlalchemy import or_
+
+from ..models import SessionLocal, Function, Invocation
+from ..monitoring import DB_COMMIT, timed
+from ..executor.concurrency import ConcurrencyLimitExceeded
+from ..executor.layers import LAYER_BUILD_TIMEOUT
+from ..tracing import Trace
+from .metrics_writer import record_invocation
+from .result_cache import result_cache
+
+# Invocation queue configuration
+INVOCATION_WORKERS = int(os.getenv("INVOCATION_WORKERS", "4"))
+INVOCATION_POLL_INTERVAL = float(os.getenv("INVOCATION_POLL_INTERVAL", "1"))  # seconds
+INVOCATION_SLOT_RETRY_MAX = float(os.getenv("INVOCATION_SLOT_RETRY_MAX", "5"))  # seconds between tries for a slot
+INVOCATION_HEARTBEAT_INTERVAL = float(os.getenv("INVOCATION_HEARTBEAT_INTERVAL", "10"))  # seconds
+INVOCATION_LEASE_TIMEOUT = float(os.getenv("INVOCATION_LEASE_TIMEOUT", "60"))  # seconds without a heartbeat
+
+
+class QueueStopped(Exception):
+    """The queue stopped while a job waited for an execution slot"""
+
+
+class InvocationQueue:
+    """Durable queue of asynchronous invocations.
+
+    Jobs are rows in the invocations table, so queued work survives a
+    restart. Worker threads claim the oldest queued job, run it on the
+    executor and store the result; metrics go through the metrics writer.
+    A job whose function's dependencies are still being installed waits
+    for them, and cacheable functions are answered from the result cache.
+
+    Jobs hold a slot from the same concurrency limiter as direct calls,
+    taken on the API's event loop, so they count towards the global and
+    per-function limits. A job over a limit waits for a slot instead of
+    failing.
+
+    A claimed job is leased to the queue that claimed it, which renews the
+    lease while the job runs. Only jobs whose lease has expired are queued
+    again, so several API processes can share the table without re-running
+    each other's work.
+    """
+
+    def __init__(self, executor, layers, limiter, workers: int = INVOCATION_WORKERS,
+                 poll_interval: float = INVOCATION_POLL_INTERVAL,
+                 heartbeat_interval: float = INVOCATION_HEARTBEAT_INTERVAL,
+                 lease_timeout: float = INVOCATION_LEASE_TIMEOUT):
+        self.executor = executor
+        self.layers = layers
+        self.limiter = limiter
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.lease_timeout = lease_timeout
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup = threading.Condition()
+        self._stopped = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        """Start the workers; loop is the event loop the limiter's slots are taken on"""
+        self._loop = loop
+        self._stopped.clear()
+        self._requeue_expired()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"invocation-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._keep_leases, name="invocation-leases", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self):
+        self._stopped.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    def enqueue(self, function_id: int, event: Any = None) -> Invocation:
+        db = SessionLocal()
+        try:
+            invocation = Invocation(
+                id=uuid.uuid4().hex, function_id=function_id, status="queued", event=event
+            )
+            db.add(invocation)
+            with timed(DB_COMMIT, "invocation_enqueue"):
+                db.commit()
+            db.refresh(invocation)
+        finally:
+            db.close()
+        with self._wakeup:
+            self._wakeup.notify()
+        return invocation
+
+    def depth(self) -> int:
+        """Jobs waiting for a worker"""
+        db = SessionLocal()
+        try:
+            return db.query(Invocation).filter(Invocation.status == "queued").count()
+        finally:
+            db.close()
+
+    def _keep_leases(self):
+        while not self._stopped.wait(self.heartbeat_interval):
+            try:
+                self._heartbeat()
+                self._requeue_expired()
+            except Exception as e:
+                print(f"Failed to renew invocation leases: {str(e)}")
+
+    def _heartbeat(self):
+        """Renew the lease on every job this queue is running"""
+        db = SessionLocal()
+        try:
+            db.query(Invocation).filter(
+                Invocation.status == "running", Invocation.owner == self.owner
+            ).update({"heartbeat_at": datetime.utcnow()}, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _requeue_expired(self):
+        """Jobs whose owner stopped renewing their lease, e.g. because it crashed, are retried"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.lease_timeout)
+        db = SessionLocal()
+        try:
+            requeued = db.query(Invocation).filter(
+                Invocation.status == "running",
+                # Jobs claimed before leases existed have no heartbeat
+                or_(Invocation.heartbeat_at < cutoff, Invocation.heartbeat_at.is_(None))
+            ).update({"status": "queued", "started_at": None, "owner": None, "heartbeat_at": None},
+                     synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        if requeued:
+            print(f"Requeued {requeued} invocations with expired leases")
+            with self._wakeup:
+                self._wakeup.notify_all()
+
+    def _work(self):
+        while not self._stopped.is_set():
+            try:
+                job_id = self._claim()
+            except Exception as e:
+                print(f"Failed to claim invocation: {str(e)}")
+                job_id = None
+            if job_id is None:
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_interval)
+                continue
+            self._run(job_id)
+
+    def _claim(self):
+        db = SessionLocal()
+        try:
+            while True:
+                job = (
+                    db.query(Invocation.id)
+                    .filter(Invocation.status == "queued")
+                    .order_by(Invocation.created_at)
+                    .first()
+                )
+                if job is None:
+                    return None
+                # Conditional update so only one worker wins the job
+                now = datetime.utcnow()
+                claimed = (
+                    db.query(Invocation)
+                    .filter(Invocation.id == job.id, Invocation.status == "queued")
+                    .update({"status": "running", "started_at": now, "owner": self.owner,
+                             "heartbeat_at": now}, synchronize_session=False)
+                )
+                with timed(DB_COMMIT, "invocation_claim"):
+                    db.commit()
+                if claimed:
+                    return job.id
+        finally:
+            db.close()
+
+    def _acquire(self, function):
+        """Take an execution slot from the limiter, retrying with backoff while the function is at its limit"""
+        delay = self.poll_interval
+        while True:
+            slot = self.limiter.slot(function.id, function.max_concurrency)
+            try:
+                asyncio.run_coroutine_threadsafe(slot.__aenter__(), self._loop).result()
+                return slot
+            except ConcurrencyLimitExceeded:
+                if self._stopped.wait(delay):
+                    raise QueueStopped()
+                delay = min(delay * 2, INVOCATION_SLOT_RETRY_MAX)
+
+    def _release(self, slot):
+        # Not waited on, so a loop that is shutting down can't hold up the worker
+        asyncio.run_coroutine_threadsafe(slot.__aexit__(None, None, None), self._loop)
+
+    def _run(self, job_id: str):
+        db = SessionLocal()
+        try:
+            invocation = db.query(Invocation).filter(Invocation.id == job_id).first()
+            if invocation is None:
+                # Deleted along with its function
+                return
+            function = db.query(Function).filter(Function.id == invocation.function_id).first()
+            trace = Trace("invocation")
+            start_time = time.time()
+            cache_key = cached = None
+            if function is not None and function.cacheable:
+                cache_key = result_cache.key(function, invocation.event)
+                cached = result_cache.get(function.id, cache_key)
+            if function is None:
+                result = {"status": "error", "output": "Function not found", "exit_code": -1}
+            elif cached is not None:
+                result = dict(cached, cache_hit=True)
+            else:
+                try:
+                    with trace.span("layer"):
+                        layer = self.layers.wait(function, LAYER_BUILD_TIMEOUT)
+                    with trace.span("queue"):
+                        slot = self._acquire(function)
+                    try:
+                        with trace.span("execute"):
+                            result = self.executor.execute(
+                                code=function.code,
+                                runtime=function.runtime,
+                                timeout=function.timeout,
+                                limits=function.limits,
+                                event=invocation.event,
+                                context=function.context(invocation.id),
+                                layer=layer
+                            )
+                    finally:
+                        self._release(slot)
+                except QueueStopped:
+                    self._release_job(job_id)
+                    return
+                except Exception as e:
+                    result = {"status": "error", "output": str(e), "exit_code": -1}
+            execution_time = time.time() - start_time
+
+            # Only while the lease is still ours, so a job requeued after a stall isn't overwritten
+            saved = self._owned(db, job_id).update({
+                "status": result["status"],
+                "output": result["output"],
+                "result": result.get("result"),
+                "exit_code": result.get("exit_code"),
+                "execution_time": execution_time,
+                "completed_at": datetime.utcnow()
+            }, synchronize_session=False)
+            with timed(DB_COMMIT, "invocation_result"):
+                db.commit()
+            if not saved:
+                print(f"Invocation {job_id} lost its lease; its result was discarded")
+            # Cache hits didn't execute, so they have no metrics
+            if function is not None and cached is None:
+                record_invocation(function, result, execution_time, trace)
+                if cache_key is not None:
+                    result_cache.put(function.id, cache_key, result, function.cache_ttl)
+        except Exception as e:
+            print(f"Invocation {job_id} failed: {str(e)}")
+            db.rollback()
+            self._fail(job_id, f"Failed to save the invocation result: {str(e)}")
+        finally:
+            db.close()
+
+    def _owned(self, db, job_id: str):
+        return db.query(Invocation).filter(
+            Invocation.id == job_id, Invocation.status == "running", Invocation.owner == self.owner
+        )
+
+    def _release_job(self, job_id: str):
+        """Put a job this queue won't finish back in the queue"""
+        db = SessionLocal()
+        try:
+            self._owned(db, job_id).update(
+                {"status": "queued", "started_at": None, "owner": None, "heartbeat_at": None},
+                synchronize_session=False
+            )
+            db.commit()
+        except Exception as e:
+            print(f"Failed to requeue invocation {job_id}: {str(e)}")
+        finally:
+            db.close()
+
+    def _fail(self, job_id: str, output: str):
+        """Mark a running job failed, so it doesn't stay running forever"""
+        db = SessionLocal()
+        try:
+            self._owned(db, job_id).update(
+                {"status": "error", "output": output, "exit_code": -1, "completed_at": datetime.utcnow()},
+                synchronize_session=False
+            )
+            db.commit()
+        except Exception as e:
+            print(f"Failed to mark invocation {job_id} failed: {str(e)}")
+        finally:
+            db.close()
@@ -0,0 +1,325 @@
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.exc import IntegrityError
+
+from ..executor.layers import normalize_dependencies, layer_hash
+from ..executor.runtimes import get_runtime
+from ..models import SessionLocal, Function, Layer
+
+# Dependency layer configuration
+LAYER_DIR = os.getenv("LAYER_DIR", os.path.join(tempfile.gettempdir(), "serverless-layers"))
+LAYER_CACHE_MAX_LAYERS = int(os.getenv("LAYER_CACHE_MAX_LAYERS", "50"))
+LAYER_CACHE_MAX_BYTES = int(os.getenv("LAYER_CACHE_MAX_BYTES", str(5 * 1024 ** 3)))
+LAYER_MIN_IDLE = float(os.getenv("LAYER_MIN_IDLE", "600"))  # seconds unused before a layer may be collected
+LAYER_GC_INTERVAL = float(os.getenv("LAYER_GC_INTERVAL", "300"))  # seconds
+
+
+class LayerNotReady(Exception):
+    """A function's dependencies are still being installed, or failed to install when failed is set"""
+
+    def __init__(self, message: str, failed: bool = False):
+        super().__init__(message)
+        self.failed = failed
+
+
+def directory_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class LayerService:
+    """Builds dependency layers in the background and garbage collects them.
+
+    A layer is the installed form of one normalized dependency set,
+    stored in a directory named by its hash and shared by every function
+    that declares the same set. Saving a function only records the layer;
+    a single background thread installs it through the executor, so no
+    call ever waits on a package install. Calls made before the layer is
+    ready are turned away rather than run without their dependencies.
+
+    Ready layers are an LRU cache capped at max_layers and max_bytes. Only
+    layers no function references are collected, least recently used
+    first, sparing any used in the last min_idle seconds. A referenced
+    layer may be mounted by warm containers or on the path of pooled
+    workers, so it is kept even over the caps.
+    """
+
+    def __init__(self, executor, directory: str = LAYER_DIR, max_layers: int = LAYER_CACHE_MAX_LAYERS,
+                 max_bytes: int = LAYER_CACHE_MAX_BYTES, min_idle: float = LAYER_MIN_IDLE,
+                 gc_interval: float = LAYER_GC_INTERVAL):
+        self.executor = executor
+        self.directory = directory
+        self.max_layers = max_layers
+        self.max_bytes = max_bytes
+        self.min_idle = min_idle
+        self.gc_interval = gc_interval
+        self.built = 0
+        self.failed = 0
+        self.evicted = 0
+        self._ready: Dict[str, str] = {}  # hash to directory
+        self._used: Dict[str, float] = {}  # last use times not yet written to the database
+        self._queue: queue.Queue = queue.Queue()
+        self._changed = threading.Condition()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        db = SessionLocal()
+        try:
+            for layer in db.query(Layer).all():
+                path = self.path(layer.hash)
+                if layer.status == "ready" and os.path.isdir(path):
+                    self._ready[layer.hash] = path
+                elif layer.status != "failed":
+                    # Interrupted builds and layers whose directory is gone are rebuilt
+                    layer.status = "pending"
+                    self._queue.put(layer.hash)
+            db.commit()
+        finally:
+            db.close()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="layer-builder", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._queue.put(None)
+        if self._thread is not None:
+            # A build in progress finishes on its own; its daemon thread doesn't hold up exit
+            self._thread.join(timeout=10)
+            self._thread = None
+        self._flush_used()
+
+    def path(self, hash: str) -> str:
+        return os.path.join(self.directory, hash)
+
+    def request(self, runtime: str, dependencies: Optional[str]) -> Optional[str]:
+        """Record the layer for a dependency set and queue its build; returns its hash.
+
+        None when there is nothing to install. Raises ValueError for a
+        manifest that can't be parsed.
+        """
+        normalized = normalize_dependencies(runtime, dependencies or "")
+        if not normalized:
+            return None
+        hash = layer_hash(runtime, normalized)
+        db = SessionLocal()
+        try:
+            layer = db.query(Layer).filter(Layer.hash == hash).first()
+            if layer is None:
+                db.add(Layer(hash=hash, runtime=get_runtime(runtime)["name"], dependencies=normalized))
+            elif layer.status == "failed" or (layer.status == "ready" and not os.path.isdir(self.path(hash))):
+                # Saving the function again retries a failed install
+                layer.status, layer.error = "pending", None
+            else:
+                return hash
+            try:
+                db.commit()
+            except IntegrityError:
+                # Requested concurrently; the other request queued the build
+                db.rollback()
+                return hash
+        finally:
+            db.close()
+        self._queue.put(hash)
+        return hash
+
+    def ready_path(self, function) -> Optional[str]:
+        """The directory of the function's layer if it is built here, without touching the database"""
+        return self._ready.get(function.layer_hash) if function.layer_hash else None
+
+    def resolve(self, function) -> Optional[str]:
+        """The directory of the function's layer, or None when it has no dependencies.
+
+        Raises LayerNotReady while the layer is being built and when its
+        build failed.
+        """
+        hash = function.layer_hash
+        if not hash:
+            return None
+        path = self._ready.get(hash)
+        if path is not None:
+            self._used[hash] = time.time()
+            return path
+        db = SessionLocal()
+        try:
+            layer = db.query(Layer).filter(Layer.hash == hash).first()
+        finally:
+            db.close()
+        if layer is not None and layer.status == "failed":
+            raise LayerNotReady(f"Dependency install failed: {layer.error}", failed=True)
+        if layer is not None and layer.status == "ready" and os.path.isdir(self.path(hash)):
+            # Built by another process sharing the layer directory
+            self._ready[hash] = self.path(hash)
+            self._used[hash] = time.time()
+            return self._ready[hash]
+        if layer is None or layer.status == "ready":
+            # Collected since the function was saved
+            self.request(function.runtime, function.dependencies)
+        raise LayerNotReady("Dependencies are still being installed")
+
+    def wait(self, function, timeout: float) -> Optional[str]:
+        """Like resolve, but waits up to timeout seconds for a layer that is being built"""
+        deadline = time.time() + timeout
+        while True:
+            try:
+                return self.resolve(function)
+            except LayerNotReady as e:
+                remaining = deadline - time.time()
+                if e.failed or remaining <= 0:
+                    raise
+            with self._changed:
+                self._changed.wait(min(remaining, 5))
+
+    def layers(self) -> List[Layer]:
+        db = SessionLocal()
+        try:
+            return db.query(Layer).order_by(Layer.created_at).all()
+        finally:
+            db.close()
+
+    def get(self, hash: str) -> Optional[Layer]:
+        db = SessionLocal()
+        try:
+            return db.query(Layer).filter(Layer.hash == hash).first()
+        finally:
+            db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ready": len(self._ready),
+            "queued": self._queue.qsize(),
+            "built": self.built,
+            "failed": self.failed,
+            "evicted": self.evicted
+        }
+
+    def run_once(self):
+        """Write last use times and collect unreferenced layers over the cache limits"""
+        self._flush_used()
+        cutoff = datetime.utcfromtimestamp(time.time() - self.min_idle)
+        db = SessionLocal()
+        try:
+            # From the database rather than the route table, so functions of every API process count
+            referenced = {hash for hash, in db.query(Function.layer_hash).filter(Function.layer_hash.isnot(None))}
+            ready = db.query(Layer).filter(Layer.status == "ready").all()
+            count = len(ready)
+            total = sum(layer.size_bytes or 0 for layer in ready)
+            candidates = sorted(
+                (layer for layer in ready if layer.hash not in referenced
+                 and (layer.last_used_at or layer.built_at or datetime.min) < cutoff),
+                key=lambda layer: layer.last_used_at or datetime.min
+            )
+            for layer in candidates:
+                if count <= self.max_layers and total <= self.max_bytes:
+                    break
+                count -= 1
+                total -= layer.size_bytes or 0
+                self._evict(layer.hash)
+                db.delete(layer)
+                db.commit()
+        finally:
+            db.close()
+
+    def _evict(self, hash: str):
+        self._ready.pop(hash, None)
+        self._used.pop(hash, None)
+        path = self.path(hash)
+        if os.path.isdir(path):
+            # Moved aside first so nothing mounts a half-deleted layer
+            trash = os.path.join(self.directory, f".trash-{uuid.uuid4().hex}")
+            os.rename(path, trash)
+            shutil.rmtree(trash, ignore_errors=True)
+        self.evicted += 1
+        print(f"Collected dependency layer {hash[:12]}")
+
+    def _flush_used(self):
+        used, self._used = self._used, {}
+        if not used:
+            return
+        db = SessionLocal()
+        try:
+            for hash, last_used in used.items():
+                db.query(Layer).filter(Layer.hash == hash).update(
+                    {"last_used_at": datetime.utcfromtimestamp(last_used)}, synchronize_session=False
+                )
+            db.commit()
+        finally:
+            db.close()
+
+    def _build(self, hash: str):
+        db = SessionLocal()
+        try:
+            # Conditional update so only one process builds the layer
+            claimed = (
+                db.query(Layer)
+                .filter(Layer.hash == hash, Layer.status == "pending")
+                .update({"status": "building"}, synchronize_session=False)
+            )
+            db.commit()
+            if not claimed:
+                return
+            layer = db.query(Layer).filter(Layer.hash == hash).first()
+            config = get_runtime(layer.runtime)
+            staging = os.path.join(self.directory, f".build-{hash}-{uuid.uuid4().hex}")
+            start_time = time.time()
+            try:
+                os.makedirs(staging)
+                with open(os.path.join(staging, config["manifest"]), "w") as f:
+                    f.write(layer.dependencies + "\n")
+                self.executor.build_layer(layer.runtime, staging)
+                path = self.path(hash)
+                shutil.rmtree(path, ignore_errors=True)
+                os.rename(staging, path)
+            except Exception as e:
+                shutil.rmtree(staging, ignore_errors=True)
+                layer.status, layer.error = "failed", str(e)[-2000:]
+                db.commit()
+                self.failed += 1
+                print(f"Dependency layer {hash[:12]} failed to build: {str(e)[-200:]}")
+                return
+            now = datetime.utcnow()
+            layer.status, layer.error = "ready", None
+            layer.size_bytes = directory_size(path)
+            layer.built_at = layer.last_used_at = now
+            db.commit()
+            self._ready[hash] = path
+            self.built += 1
+            print(f"Built dependency layer {hash[:12]} in {time.time() - start_time:.1f}s")
+        finally:
+            db.close()
+            with self._changed:
+                self._changed.notify_all()
+
+    def _run(self):
+        next_collection = time.time() + self.gc_interval
+        while not self._stopped.is_set():
+            try:
+                hash = self._queue.get(timeout=max(0.0, next_collection - time.time()))
+            except queue.Empty:
+                hash = None
+            if self._stopped.is_set():
+                break
+            try:
+                if hash is not None:
+                    self._build(hash)
+                if time.time() >= next_collection:
+                    next_collection = time.time() + self.gc_interval
+                    self.run_once()
+            except Exception as e:
+                print(f"Dependency layer maintenance failed: {str(e)}")
@@ -0,0 +1,68 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+# Login throttling configuration
+LOGIN_ATTEMPTS_PER_USER = float(os.getenv("LOGIN_ATTEMPTS_PER_USER", "5"))  # per minute
+LOGIN_ATTEMPTS_PER_IP = float(os.getenv("LOGIN_ATTEMPTS_PER_IP", "20"))  # per minute
+LOGIN_THROTTLE_MAX_KEYS = int(os.getenv("LOGIN_THROTTLE_MAX_KEYS", "100000"))
+
+
+class LoginThrottled(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__("Too many login attempts")
+        self.retry_after = retry_after
+
+
+class LoginThrottle:
+    """Token buckets limiting login attempts per username and per client address.
+
+    Each bucket holds a minute's worth of attempts and refills continuously,
+    so bursts are allowed up to the limit and sustained attempts are
+    smoothed to the per-minute rate. The least recently used buckets are
+    dropped past max_keys; a dropped bucket would have refilled anyway.
+    """
+
+    def __init__(
+        self,
+        per_user: float = LOGIN_ATTEMPTS_PER_USER,
+        per_ip: float = LOGIN_ATTEMPTS_PER_IP,
+        max_keys: int = LOGIN_THROTTLE_MAX_KEYS
+    ):
+        self.per_user = per_user
+        self.per_ip = per_ip
+        self.max_keys = max_keys
+        self.throttled = 0
+        self._buckets: "OrderedDict[Tuple[str, str], Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def attempt(self, username: str, address: str):
+        """Spend one attempt from both buckets, raising LoginThrottled if either is empty"""
+        keys = [(("user", username), self.per_user), (("ip", address), self.per_ip)]
+        now = time.monotonic()
+        with self._lock:
+            levels = []
+            for key, rate in keys:
+                if rate <= 0:
+                    continue
+                tokens, updated = self._buckets.get(key, (rate, now))
+                tokens = min(rate, tokens + (now - updated) * rate / 60)
+                if tokens < 1:
+                    self.throttled += 1
+                    raise LoginThrottled(retry_after=(1 - tokens) * 60 / rate)
+                levels.append((key, tokens))
+            # Only charge once both buckets have room
+            for key, tokens in levels:
+                self._buckets[key] = (tokens - 1, now)
+                self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"tracked": len(self._buckets), "throttled": self.throttled}
+
+
+login_throttle = LoginThrottle()
@@ -0,0 +1,197 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Tuple
+
+from sqlalchemy.exc import DBAPIError, DisconnectionError, OperationalError, TimeoutError
+
+from ..models import engine, FunctionMetrics
+from ..monitoring import DB_COMMIT, observe_invocation, timed
+from ..tracing import Trace, trace_exporter
+from .rollups import update_rollups, backfill_rollups
+
+# Metrics writer configuration
+METRICS_BUFFER_SIZE = int(os.getenv("METRICS_BUFFER_SIZE", "10000"))
+METRICS_BATCH_SIZE = int(os.getenv("METRICS_BATCH_SIZE", "500"))
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "1"))  # seconds
+METRICS_OVERFLOW_POLICY = os.getenv("METRICS_OVERFLOW_POLICY", "drop_oldest")  # or drop_newest
+
+# Failures worth retrying: the database being locked, restarting or out of connections
+TRANSIENT_ERRORS = (OperationalError, DisconnectionError, TimeoutError)
+
+
+def is_transient(error: Exception) -> bool:
+    return isinstance(error, TRANSIENT_ERRORS) or (
+        isinstance(error, DBAPIError) and error.connection_invalidated
+    )
+
+
+class MetricsWriter:
+    """Buffers metrics rows in memory and writes them in batches.
+
+    Invocations only append to a bounded ring buffer. A background thread
+    inserts whatever has accumulated with a single executemany once
+    batch_size rows are waiting or flush_interval has passed, and folds
+    the batch into the metrics rollups in the same transaction. When the
+    buffer is full the overflow policy decides which rows are lost: the
+    oldest buffered ones or the new ones. Every lost row is counted.
+
+    A batch that fails for a transient reason goes back into the buffer
+    to be retried. One that fails because of its data, such as a row for
+    a function deleted since, is split in halves until the bad rows are
+    isolated; those are dropped and the rest are written.
+    """
+
+    def __init__(self, buffer_size: int = METRICS_BUFFER_SIZE, batch_size: int = METRICS_BATCH_SIZE,
+                 flush_interval: float = METRICS_FLUSH_INTERVAL,
+                 overflow_policy: str = METRICS_OVERFLOW_POLICY):
+        if overflow_policy not in ("drop_oldest", "drop_newest"):
+            raise ValueError(f"Unknown metrics overflow policy: {overflow_policy}")
+        self.buffer_size = buffer_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow_policy = overflow_policy
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+        self._buffer = deque()
+        self._lock = threading.Condition()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def record(self, function_id: int, result: dict, execution_time: float):
+        """Queue a metrics row for an executor result without touching the database"""
+        self.add(FunctionMetrics.values(function_id, result, execution_time))
+
+    def add(self, row: Dict):
+        self.add_many([row])
+
+    def add_many(self, rows: List[Dict]):
+        """Queue rows together, so a batch of invocations lands in as few writes as possible"""
+        with self._lock:
+            for row in rows:
+                if len(self._buffer) >= self.buffer_size:
+                    self.dropped += 1
+                    if self.overflow_policy == "drop_newest":
+                        continue
+                    self._buffer.popleft()
+                self._buffer.append(row)
+            if len(self._buffer) >= self.batch_size:
+                self._lock.notify()
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the flush thread, writing out everything still buffered"""
+        self._stopped.set()
+        with self._lock:
+            self._lock.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            rows = list(self._buffer)
+            self._buffer.clear()
+        if rows:
+            self._write_batch(rows)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            buffered = len(self._buffer)
+        return {
+            "buffered": buffered,
+            "written": self.written,
+            "dropped": self.dropped,
+            "flushes": self.flushes
+        }
+
+    def _write(self, rows: List[Dict]):
+        with engine.connect() as connection:
+            with connection.begin() as transaction:
+                # A list of parameter sets runs as one executemany
+                connection.execute(FunctionMetrics.__table__.insert(), rows)
+                update_rollups(connection, rows)
+                with timed(DB_COMMIT, "metrics_batch"):
+                    transaction.commit()
+        self.written += len(rows)
+        self.flushes += 1
+
+    def _write_batch(self, rows: List[Dict]):
+        """Write rows, retrying later on transient failures and dropping rows the database rejects"""
+        try:
+            self._write(rows)
+        except Exception as e:
+            if is_transient(e):
+                print(f"Failed to write {len(rows)} metrics rows, will retry: {str(e)}")
+                self._requeue(rows)
+            elif len(rows) == 1:
+                print(f"Dropped a metrics row the database rejected: {str(e)}")
+                with self._lock:
+                    self.dropped += 1
+            else:
+                middle = len(rows) // 2
+                self._write_batch(rows[:middle])
+                self._write_batch(rows[middle:])
+
+    def _requeue(self, rows):
+        """Put back rows from a failed flush, as far as the buffer has room"""
+        with self._lock:
+            room = self.buffer_size - len(self._buffer)
+            kept = rows[-room:] if room > 0 else []
+            self.dropped += len(rows) - len(kept)
+            self._buffer.extendleft(reversed(kept))
+
+    def _run(self):
+        # On this thread so no batch is written while history is being rolled up
+        try:
+            backfill_rollups()
+        except Exception as e:
+            print(f"Failed to build metrics rollups: {str(e)}")
+        while not self._stopped.is_set():
+            deadline = time.time() + self.flush_interval
+            with self._lock:
+                while len(self._buffer) < self.batch_size and not self._stopped.is_set():
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self._lock.wait(remaining)
+            self.flush()
+
+
+metrics_writer = MetricsWriter()
+
+
+def record_invocation(function, result: dict, execution_time: float, trace: Trace):
+    """Record a finished invocation: Prometheus metrics, a metrics row and its trace.
+
+    The executor's phase spans are moved from the result into the trace,
+    and the result is tagged with the trace id.
+    """
+    result["trace_id"] = trace.trace_id
+    trace.extend(result.pop("spans", None))
+    with trace.span("persist"):
+        observe_invocation(function.id, function.runtime, result, execution_time)
+        # Buffered and written in batches, so the caller doesn't wait on the database
+        metrics_writer.record(function.id, dict(result, spans=trace.to_dict()["spans"]), execution_time)
+    trace.finish()
+    trace_exporter.export(trace, function_id=function.id, runtime=function.runtime, status=result["status"])
+
+
+def record_invocations(function, invocations: List[Tuple[dict, float, Trace]]):
+    """Record finished invocations of one function like record_invocation, queuing their rows at once"""
+    rows = []
+    for result, execution_time, trace in invocations:
+        result["trace_id"] = trace.trace_id
+        trace.extend(result.pop("spans", None))
+        observe_invocation(function.id, function.runtime, result, execution_time)
+        trace.finish()
+        rows.append(FunctionMetrics.values(function.id, dict(result, spans=trace.to_dict()["spans"]), execution_time))
+        trace_exporter.export(trace, function_id=function.id, runtime=function.runtime, status=result["status"])
+    metrics_writer.add_many(rows)
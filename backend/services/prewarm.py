@@ -0,0 +1,267 @@
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func, select
+
+from ..models import engine, FunctionMetrics, MetricsRollup
+from .rollups import EPOCH
+from .route_table import route_table
+
+# Pre-warming configuration
+PREWARM_INTERVAL = float(os.getenv("PREWARM_INTERVAL", "15"))  # seconds between passes; 0 disables
+PREWARM_HORIZON = float(os.getenv("PREWARM_HORIZON", "60"))  # seconds of traffic to prepare for
+PREWARM_THRESHOLD = float(os.getenv("PREWARM_THRESHOLD", "0.5"))  # expected calls in the horizon
+PREWARM_HEADROOM = float(os.getenv("PREWARM_HEADROOM", "1.5"))  # on top of the expected concurrency
+PREWARM_MAX_TARGET = int(os.getenv("PREWARM_MAX_TARGET", "10"))  # environments per function
+PREWARM_RATE_HALF_LIFE = float(os.getenv("PREWARM_RATE_HALF_LIFE", "300"))  # seconds
+PREWARM_HISTORY_DAYS = float(os.getenv("PREWARM_HISTORY_DAYS", "7"))
+PREWARM_KEEP_ALIVE = float(os.getenv("PREWARM_KEEP_ALIVE", "600"))  # seconds warm after the last call
+PREWARM_POLL_BATCH_SIZE = 5000
+
+HOUR = 3600.0
+DAY = 86400.0
+
+
+def epoch_seconds(timestamp: datetime) -> float:
+    """Seconds since the epoch for a naive UTC timestamp, as stored in metrics"""
+    return (timestamp - EPOCH).total_seconds()
+
+
+class ArrivalModel:
+    """A function's arrival pattern, learned from its invocation timestamps.
+
+    rate is an exponentially weighted moving average of calls per second.
+    hours counts calls by UTC hour of day, decayed with a time constant of
+    history_days, so a daily schedule shows up as traffic in its hour
+    before the rate has seen any of it.
+    """
+
+    def __init__(self, now: float, half_life: float = PREWARM_RATE_HALF_LIFE,
+                 history_days: float = PREWARM_HISTORY_DAYS):
+        self.half_life = half_life
+        self.history = history_days * DAY
+        self.rate = 0.0
+        self.predicted = 0.0
+        self.hours = [0.0] * 24
+        self.duration = 0.0  # mean execution time in seconds
+        self.last_call: Optional[float] = None
+        self.since = now  # start of the observed history
+        self.updated = now
+        self.hits = 0  # warm starts
+        self.misses = 0  # cold starts
+
+    def tick(self, now: float, calls: int):
+        """Age the model to now, with calls arrivals since the last tick"""
+        elapsed = now - self.updated
+        if elapsed <= 0:
+            return
+        decay = math.exp(-elapsed / self.history)
+        self.hours = [count * decay for count in self.hours]
+        alpha = 1 - 0.5 ** (elapsed / self.half_life)
+        self.rate += alpha * (calls / elapsed - self.rate)
+        self.updated = now
+
+    def observe(self, timestamp: float, count: int = 1, execution_time: Optional[float] = None):
+        """Add count calls at timestamp, taking at most the model's current time"""
+        age = max(0.0, self.updated - timestamp)
+        self.hours[int(timestamp // HOUR) % 24] += count * math.exp(-age / self.history)
+        self.last_call = max(self.last_call or timestamp, timestamp)
+        if execution_time is not None:
+            self.duration = execution_time if not self.duration else 0.9 * self.duration + 0.1 * execution_time
+
+    def hour_rate(self, timestamp: float) -> float:
+        """Calls per second usually seen in the hour of day of timestamp"""
+        # Weight of the history behind each hour; under a day, every hour has been seen at most once
+        observed = max(self.updated - self.since, DAY)
+        weight = self.history * (1 - math.exp(-observed / self.history))
+        return self.hours[int(timestamp // HOUR) % 24] * DAY / weight / HOUR
+
+    def predict(self, now: float, horizon: float) -> float:
+        """Calls per second expected over the next horizon seconds"""
+        self.predicted = max(self.rate, self.hour_rate(now), self.hour_rate(now + horizon))
+        return self.predicted
+
+
+class PrewarmScheduler:
+    """Keeps execution environments warm ahead of predicted traffic.
+
+    Each pass reads the metrics rows written since the last one, updates
+    every function's arrival model and asks the executor to keep enough
+    environments warm for the concurrency expected over the horizon. A
+    function with no expected traffic keeps one environment until
+    keep_alive has passed since its last call, then drops to its min_warm
+    and its environments idle out. Functions can opt out with prewarm,
+    and those whose dependency layer isn't built yet are skipped.
+
+    Warm and cold starts seen in the metrics are counted as hits and
+    misses.
+    """
+
+    def __init__(self, executor, layers, interval: float = PREWARM_INTERVAL, horizon: float = PREWARM_HORIZON,
+                 threshold: float = PREWARM_THRESHOLD, headroom: float = PREWARM_HEADROOM,
+                 max_target: int = PREWARM_MAX_TARGET, keep_alive: float = PREWARM_KEEP_ALIVE):
+        self.executor = executor
+        self.layers = layers
+        self.interval = interval
+        self.horizon = horizon
+        self.threshold = threshold
+        self.headroom = headroom
+        self.max_target = max_target
+        self.keep_alive = keep_alive
+        self.prewarmed = 0
+        self._models: Dict[int, ArrivalModel] = {}
+        self._targets: Dict[int, int] = {}
+        self._last_id: Optional[int] = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if not self.interval:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="prewarm", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    def run_once(self):
+        now = time.time()
+        if self._last_id is None:
+            self._seed(now)
+        rows = self._poll()
+        functions = route_table.functions()
+
+        calls: Dict[int, List] = {}
+        for row in rows:
+            calls.setdefault(row.function_id, []).append(row)
+        with self._lock:
+            ids = {function.id for function in functions}
+            for function_id in set(self._models) - ids:
+                del self._models[function_id]
+            targets = {}
+            for function in functions:
+                model = self._models.setdefault(function.id, ArrivalModel(now))
+                new = calls.get(function.id, [])
+                model.tick(now, len(new))
+                for row in new:
+                    model.observe(epoch_seconds(row.timestamp), 1, row.execution_time)
+                    if row.cold_start:
+                        model.misses += 1
+                    else:
+                        model.hits += 1
+                targets[function.id] = self._target(function, model, now)
+            self._targets = targets
+
+        warm = [
+            (function.runtime, function.limits, self.layers.ready_path(function), targets[function.id])
+            for function in functions
+            if targets[function.id] and (not function.layer_hash or self.layers.ready_path(function))
+        ]
+        self.prewarmed += self.executor.prewarm(warm)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            functions = {
+                function_id: {
+                    "rate": model.rate,
+                    "predicted_rate": model.predicted,
+                    "target": self._targets.get(function_id, 0),
+                    "hits": model.hits,
+                    "misses": model.misses,
+                    "hit_rate": hit_rate(model.hits, model.misses)
+                }
+                for function_id, model in self._models.items()
+            }
+        hits = sum(stats["hits"] for stats in functions.values())
+        misses = sum(stats["misses"] for stats in functions.values())
+        return {
+            "prewarmed": self.prewarmed,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hit_rate(hits, misses),
+            "functions": functions
+        }
+
+    def _target(self, function, model: ArrivalModel, now: float) -> int:
+        """Environments to keep warm for the function over the next horizon"""
+        target = 0
+        rate = model.predict(now, self.horizon)
+        if function.prewarm is not False:
+            keep_alive = self.keep_alive if function.keep_alive is None else function.keep_alive
+            if rate * self.horizon >= self.threshold:
+                # Little's law: calls in flight are arrivals per second times seconds per call
+                target = max(1, math.ceil(rate * model.duration * self.headroom))
+            elif model.last_call is not None and now - model.last_call < keep_alive:
+                target = 1
+            target = min(target, self.max_target, function.max_concurrency or self.max_target)
+        return max(target, function.min_warm or 0)
+
+    def _seed(self, now: float):
+        """Start the models from the history already in the database"""
+        cutoff = datetime.utcfromtimestamp(now) - timedelta(days=PREWARM_HISTORY_DAYS)
+        rollup = MetricsRollup.__table__
+        metrics = FunctionMetrics.__table__
+        with engine.connect() as connection:
+            self._last_id = connection.execute(select(func.max(metrics.c.id))).scalar() or 0
+            # Hour rollups carry the same timestamps as the raw rows, at the resolution the model needs
+            buckets = connection.execute(
+                select(rollup.c.function_id, rollup.c.bucket_start, rollup.c.count, rollup.c.sum_execution_time)
+                .where(rollup.c.resolution == "hour", rollup.c.bucket_start >= cutoff)
+                .order_by(rollup.c.bucket_start)
+            ).all()
+            last_calls = connection.execute(
+                select(metrics.c.function_id, func.max(metrics.c.timestamp))
+                .where(metrics.c.timestamp >= cutoff)
+                .group_by(metrics.c.function_id)
+            ).all()
+        with self._lock:
+            for function_id, bucket_start, count, total_time in buckets:
+                if not count:
+                    continue
+                model = self._models.setdefault(function_id, ArrivalModel(now))
+                start = epoch_seconds(bucket_start)
+                model.since = min(model.since, start)
+                model.observe(start, count, total_time / count)
+            for function_id, timestamp in last_calls:
+                if function_id in self._models:
+                    self._models[function_id].last_call = epoch_seconds(timestamp)
+
+    def _poll(self) -> List:
+        """Metrics rows written since the last pass"""
+        table = FunctionMetrics.__table__
+        rows = []
+        with engine.connect() as connection:
+            while True:
+                batch = connection.execute(
+                    select(table.c.id, table.c.function_id, table.c.timestamp,
+                           table.c.execution_time, table.c.cold_start)
+                    .where(table.c.id > self._last_id)
+                    .order_by(table.c.id)
+                    .limit(PREWARM_POLL_BATCH_SIZE)
+                ).all()
+                rows.extend(batch)
+                if batch:
+                    self._last_id = batch[-1].id
+                if len(batch) < PREWARM_POLL_BATCH_SIZE:
+                    return rows
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Pre-warm pass failed: {str(e)}")
+            self._stopped.wait(self.interval)
+
+
+def hit_rate(hits: int, misses: int) -> Optional[float]:
+    return hits / (hits + misses) if hits + misses else None
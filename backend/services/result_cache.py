@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from ..executor.cache import code_hash
+
+# Result cache configuration
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "10000"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESULT_CACHE_MAX_RESULT_BYTES = int(os.getenv("RESULT_CACHE_MAX_RESULT_BYTES", str(1024 * 1024)))  # larger results aren't cached
+RESULT_CACHE_DEFAULT_TTL = float(os.getenv("RESULT_CACHE_DEFAULT_TTL", "300"))  # seconds
+RESULT_CACHE_DB = os.getenv("RESULT_CACHE_DB", "")  # SQLite file the cache is persisted to; empty keeps it in memory
+
+# Fields of an executor result that are replayed on a hit
+CACHED_FIELDS = ("status", "output", "result", "exit_code")
+
+
+def payload_hash(event: Any) -> str:
+    """Hash of an event, the same for equal JSON values whatever their key order"""
+    payload = json.dumps(event, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResultCache:
+    """LRU cache of successful results of functions marked cacheable.
+
+    Entries are keyed by function id, code hash, dependency layer and
+    event hash, so a changed function never sees its old results, and
+    expire after the function's cache_ttl. Size is capped by entries and
+    by the bytes of the serialized results. With a database path, entries
+    are written through to SQLite and loaded back on start, so the cache
+    survives restarts; lookups are always served from memory.
+
+    Hits and misses are counted per function since the process started.
+    """
+
+    def __init__(self, max_entries: int = RESULT_CACHE_MAX_ENTRIES, max_bytes: int = RESULT_CACHE_MAX_BYTES,
+                 max_result_bytes: int = RESULT_CACHE_MAX_RESULT_BYTES, path: str = RESULT_CACHE_DB):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_result_bytes = max_result_bytes
+        self.path = path
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Tuple[int, float, int, Dict[str, Any]]]" = OrderedDict()
+        self._size = 0
+        self._counts: Dict[int, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+    def start(self):
+        if not self.path or self._db is not None:
+            return
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, function_id INTEGER, expires_at REAL, value TEXT)"
+        )
+        now = time.time()
+        self._db.execute("DELETE FROM results WHERE expires_at <= ?", (now,))
+        # Soonest to expire first, so they are the ones evicted if the caps are hit
+        rows = self._db.execute(
+            "SELECT key, function_id, expires_at, value FROM results ORDER BY expires_at"
+        ).fetchall()
+        with self._lock:
+            for key, function_id, expires_at, value in rows:
+                self._insert(key, function_id, expires_at, json.loads(value), len(value))
+            self._delete(self._evict())
+
+    def stop(self):
+        with self._lock:
+            db, self._db = self._db, None
+        if db is not None:
+            db.close()
+
+    def key(self, function, event: Any) -> str:
+        parts = (str(function.id), code_hash(function.code, function.runtime),
+                 function.layer_hash or "", payload_hash(event))
+        return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+    def get(self, function_id: int, key: str) -> Optional[Dict[str, Any]]:
+        """A copy of the cached result, or None, counting the lookup as a hit or a miss"""
+        with self._lock:
+            counts = self._counts.setdefault(function_id, {"hits": 0, "misses": 0})
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.time():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                counts["misses"] += 1
+                return None
+            counts["hits"] += 1
+            self._entries.move_to_end(key)
+            return dict(entry[3])
+
+    def put(self, function_id: int, key: str, result: Dict[str, Any], ttl: Optional[float] = None):
+        """Cache the replayable fields of a successful result for ttl seconds"""
+        if result.get("status") != "success":
+            return
+        value = {field: result.get(field) for field in CACHED_FIELDS}
+        serialized = json.dumps(value, default=str)
+        if len(serialized) > self.max_result_bytes:
+            return
+        expires_at = time.time() + (RESULT_CACHE_DEFAULT_TTL if ttl is None else ttl)
+        with self._lock:
+            self._insert(key, function_id, expires_at, value, len(serialized))
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results (key, function_id, expires_at, value) VALUES (?, ?, ?, ?)",
+                    (key, function_id, expires_at, serialized)
+                )
+            self._delete(self._evict())
+
+    def invalidate(self, function_id: int):
+        """Drop a function's entries, such as when its settings change"""
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry[0] == function_id]:
+                self._remove(key)
+            if self._db is not None:
+                self._db.execute("DELETE FROM results WHERE function_id = ?", (function_id,))
+
+    def function_stats(self, function_id: int) -> Dict[str, Any]:
+        """Hits and misses of this process only; hit_rate is a 0-1 fraction like the pre-warm hit rates"""
+        with self._lock:
+            counts = dict(self._counts.get(function_id, {"hits": 0, "misses": 0}))
+        lookups = counts["hits"] + counts["misses"]
+        return {
+            "scope": "process",
+            "pid": os.getpid(),
+            "hits": counts["hits"],
+            "misses": counts["misses"],
+            "hit_rate": counts["hits"] / lookups if lookups else None
+        }
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "hits": sum(counts["hits"] for counts in self._counts.values()),
+                "misses": sum(counts["misses"] for counts in self._counts.values()),
+                "evictions": self.evictions
+            }
+
+    def _insert(self, key: str, function_id: int, expires_at: float, value: Dict[str, Any], size: int):
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (function_id, expires_at, size, value)
+        self._size += size
+
+    def _remove(self, key: str):
+        _, _, size, _ = self._entries.pop(key)
+        self._size -= size
+
+    def _evict(self):
+        """Drop least recently used entries over the caps; returns their keys"""
+        evicted = []
+        while self._entries and (len(self._entries) > self.max_entries or self._size > self.max_bytes):
+            key = next(iter(self._entries))
+            self._remove(key)
+            evicted.append(key)
+        self.evictions += len(evicted)
+        return evicted
+
+    def _delete(self, keys):
+        if self._db is not None and keys:
+            self._db.executemany("DELETE FROM results WHERE key = ?", [(key,) for key in keys])
+
+
+result_cache = ResultCache()
@@ -0,0 +1,111 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict
+
+from sqlalchemy import select
+
+from ..models import engine, FunctionMetrics, MetricsRollup
+
+# Retention configuration; 0 keeps data forever
+METRICS_RETENTION_DAYS = float(os.getenv("METRICS_RETENTION_DAYS", "7"))  # raw metrics rows
+METRICS_MINUTE_ROLLUP_RETENTION_DAYS = float(os.getenv("METRICS_MINUTE_ROLLUP_RETENTION_DAYS", "30"))
+METRICS_HOUR_ROLLUP_RETENTION_DAYS = float(os.getenv("METRICS_HOUR_ROLLUP_RETENTION_DAYS", "365"))
+METRICS_RETENTION_INTERVAL = float(os.getenv("METRICS_RETENTION_INTERVAL", "3600"))  # seconds
+METRICS_RETENTION_BATCH_SIZE = int(os.getenv("METRICS_RETENTION_BATCH_SIZE", "1000"))
+
+
+class RetentionService:
+    """Deletes expired metrics in the background.
+
+    Raw rows are already folded into rollups as they are written, so
+    expiring them loses no totals or percentiles. Minute and hour rollups
+    are expired in turn, leaving day and all-time rollups for the long
+    range. Deletes run per function over the (function_id, timestamp)
+    index in small batches, each in its own transaction, so no single
+    write lock is held for long.
+    """
+
+    def __init__(
+        self,
+        raw_days: float = METRICS_RETENTION_DAYS,
+        minute_days: float = METRICS_MINUTE_ROLLUP_RETENTION_DAYS,
+        hour_days: float = METRICS_HOUR_ROLLUP_RETENTION_DAYS,
+        interval: float = METRICS_RETENTION_INTERVAL,
+        batch_size: int = METRICS_RETENTION_BATCH_SIZE
+    ):
+        self.raw_days = raw_days
+        self.minute_days = minute_days
+        self.hour_days = hour_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self.deleted = {"raw": 0, "minute": 0, "hour": 0}
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics-retention", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    def run_once(self):
+        now = datetime.utcnow()
+        table = FunctionMetrics.__table__
+        if self.raw_days:
+            self.deleted["raw"] += self._expire(
+                table, table.c.timestamp, now - timedelta(days=self.raw_days)
+            )
+        table = MetricsRollup.__table__
+        for resolution, days in (("minute", self.minute_days), ("hour", self.hour_days)):
+            if days:
+                self.deleted[resolution] += self._expire(
+                    table, table.c.bucket_start, now - timedelta(days=days),
+                    table.c.resolution == resolution
+                )
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self.deleted)
+
+    def _expire(self, table, timestamp, cutoff: datetime, *conditions) -> int:
+        """Delete rows older than cutoff, one function and one batch at a time"""
+        with engine.connect() as connection:
+            function_ids = connection.execute(
+                select(table.c.function_id).distinct()
+            ).scalars().all()
+
+        deleted = 0
+        for function_id in function_ids:
+            while not self._stopped.is_set():
+                expired = (
+                    select(table.c.id)
+                    .where(table.c.function_id == function_id, timestamp < cutoff, *conditions)
+                    .limit(self.batch_size)
+                )
+                with engine.begin() as connection:
+                    count = connection.execute(
+                        table.delete().where(table.c.id.in_(expired.scalar_subquery()))
+                    ).rowcount
+                deleted += count
+                if count < self.batch_size:
+                    break
+                # Let queued writers in between batches
+                time.sleep(0.01)
+        return deleted
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Metrics retention failed: {str(e)}")
+            self._stopped.wait(self.interval)
+
+
+retention = RetentionService()
@@ -0,0 +1,378 @@
+import math
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, or_, select, false
+from sqlalchemy.dialects import postgresql, sqlite
+
+from ..models import SessionLocal, engine, FunctionMetrics, MetricsRollup
+
+# Percentiles are estimated to within this relative error
+SKETCH_RELATIVE_ACCURACY = 0.01
+SKETCH_GAMMA = (1 + SKETCH_RELATIVE_ACCURACY) / (1 - SKETCH_RELATIVE_ACCURACY)
+SKETCH_MIN_VALUE = 1e-6  # seconds; anything faster shares the lowest bucket
+
+RESOLUTIONS = ("minute", "hour", "day", "total")
+EPOCH = datetime(1970, 1, 1)
+BACKFILL_BATCH_SIZE = 5000
+
+# Fields of each downsampled interval
+POINT_FIELDS = (
+    "timestamp", "count", "success_count", "cold_starts", "avg_execution_time",
+    "max_execution_time", "p95_execution_time", "avg_memory_usage", "max_memory_usage",
+    "avg_cpu_time"
+)
+
+
+class LatencySketch:
+    """Mergeable histogram with logarithmic buckets for approximate percentiles.
+
+    Bucket bounds grow by a factor of SKETCH_GAMMA, so any quantile is
+    reported within SKETCH_RELATIVE_ACCURACY of the true value, and
+    sketches merge by adding bucket counts.
+    """
+
+    def __init__(self, counts: Optional[Dict[Any, int]] = None):
+        self.counts = Counter({int(index): count for index, count in (counts or {}).items()})
+
+    def add(self, value: float):
+        self.counts[self.index(value)] += 1
+
+    def merge(self, other: "LatencySketch"):
+        self.counts.update(other.counts)
+
+    def quantile(self, q: float) -> Optional[float]:
+        total = sum(self.counts.values())
+        if not total:
+            return None
+        rank = q * (total - 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen > rank:
+                return 2 * SKETCH_GAMMA ** index / (SKETCH_GAMMA + 1)
+        return None
+
+    def to_json(self) -> Dict[str, int]:
+        return {str(index): count for index, count in self.counts.items()}
+
+    @staticmethod
+    def index(value: float) -> int:
+        return math.ceil(math.log(max(value, SKETCH_MIN_VALUE), SKETCH_GAMMA))
+
+
+def utc(timestamp: datetime) -> datetime:
+    """Naive UTC, as timestamps are stored"""
+    if timestamp.tzinfo is not None:
+        return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def bucket_start(timestamp: datetime, resolution: str) -> datetime:
+    if resolution == "minute":
+        return timestamp.replace(second=0, microsecond=0)
+    if resolution == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    if resolution == "day":
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    return EPOCH
+
+
+def _empty() -> Dict[str, Any]:
+    return {
+        "count": 0,
+        "success_count": 0,
+        "cold_starts": 0,
+        "sum_execution_time": 0.0,
+        "min_execution_time": None,
+        "max_execution_time": None,
+        "sum_memory_usage": 0.0,
+        "max_memory_usage": None,
+        "sum_cpu_time": 0.0,
+        "latency_sketch": LatencySketch()
+    }
+
+
+def _merge(total: Dict[str, Any], part: Dict[str, Any]):
+    for field in ("count", "success_count", "cold_starts", "sum_execution_time",
+                  "sum_memory_usage", "sum_cpu_time"):
+        total[field] += part[field] or 0
+    for field, pick in (("min_execution_time", min), ("max_execution_time", max),
+                        ("max_memory_usage", max)):
+        values = [v for v in (total[field], part[field]) if v is not None]
+        total[field] = pick(values) if values else None
+    total["latency_sketch"].merge(part["latency_sketch"])
+
+
+def _from_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Rollup fields for a single metrics row"""
+    execution_time = row.get("execution_time") or 0.0
+    memory_usage = row.get("memory_usage") or 0.0
+    sketch = LatencySketch()
+    sketch.add(execution_time)
+    return {
+        "count": 1,
+        "success_count": 1 if row.get("status") == "success" else 0,
+        "cold_starts": 1 if row.get("cold_start") else 0,
+        "sum_execution_time": execution_time,
+        "min_execution_time": execution_time,
+        "max_execution_time": execution_time,
+        "sum_memory_usage": memory_usage,
+        "max_memory_usage": memory_usage,
+        "sum_cpu_time": row.get("cpu_time") or 0.0,
+        "latency_sketch": sketch
+    }
+
+
+def _fields(rollup: MetricsRollup) -> Dict[str, Any]:
+    """Mergeable fields of a stored rollup"""
+    return {
+        "count": rollup.count,
+        "success_count": rollup.success_count,
+        "cold_starts": rollup.cold_starts,
+        "sum_execution_time": rollup.sum_execution_time,
+        "min_execution_time": rollup.min_execution_time,
+        "max_execution_time": rollup.max_execution_time,
+        "sum_memory_usage": rollup.sum_memory_usage,
+        "max_memory_usage": rollup.max_memory_usage,
+        "sum_cpu_time": rollup.sum_cpu_time,
+        "latency_sketch": LatencySketch(rollup.latency_sketch)
+    }
+
+
+def _insert_if_absent(connection, table, values: Dict[str, Any]) -> bool:
+    """Insert a rollup unless its bucket already has one; returns whether it was inserted"""
+    dialect = connection.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = (postgresql if dialect == "postgresql" else sqlite).insert(table)
+        result = connection.execute(insert.values(**values).on_conflict_do_nothing(
+            index_elements=["function_id", "resolution", "bucket_start"]
+        ))
+        return result.rowcount == 1
+    connection.execute(table.insert().values(**values))
+    return True
+
+
+def update_rollups(connection, rows: Iterable[Dict[str, Any]]):
+    """Fold new metrics rows into every rollup bucket they fall in.
+
+    Runs on the caller's connection, so rollups commit with the rows.
+    Each existing bucket is read with SELECT ... FOR UPDATE, locked in a
+    fixed order, and a new bucket is inserted with ON CONFLICT DO NOTHING
+    and merged into instead when another writer got there first, so
+    concurrent writers never lose each other's counts.
+    """
+    deltas: Dict[Tuple, Dict[str, Any]] = {}
+    for row in rows:
+        timestamp = row.get("timestamp") or datetime.utcnow()
+        part = _from_row(row)
+        for resolution in RESOLUTIONS:
+            key = (row["function_id"], resolution, bucket_start(timestamp, resolution))
+            _merge(deltas.setdefault(key, _empty()), part)
+
+    table = MetricsRollup.__table__
+    # Locked in the same order by every writer, so two batches can't deadlock
+    for (function_id, resolution, start), delta in sorted(deltas.items(), key=lambda item: item[0]):
+        match = and_(
+            table.c.function_id == function_id,
+            table.c.resolution == resolution,
+            table.c.bucket_start == start
+        )
+        existing = connection.execute(select(table).where(match).with_for_update()).mappings().first()
+        if existing is None:
+            values = dict(delta, latency_sketch=delta["latency_sketch"].to_json())
+            if _insert_if_absent(connection, table, dict(
+                values, function_id=function_id, resolution=resolution, bucket_start=start
+            )):
+                continue
+            # Inserted by a concurrent writer since it was read
+            existing = connection.execute(select(table).where(match).with_for_update()).mappings().first()
+        merged = _empty()
+        _merge(merged, dict(existing, latency_sketch=LatencySketch(existing["latency_sketch"])))
+        _merge(merged, delta)
+        merged["latency_sketch"] = merged["latency_sketch"].to_json()
+        connection.execute(table.update().where(match).values(**merged))
+
+
+def backfill_rollups():
+    """Build rollups from raw metrics recorded before rollups existed"""
+    db = SessionLocal()
+    try:
+        if db.query(MetricsRollup.id).first() is not None:
+            return
+        if db.query(FunctionMetrics.id).first() is None:
+            return
+    finally:
+        db.close()
+
+    print("Building metrics rollups from existing metrics...")
+    columns = [c for c in FunctionMetrics.__table__.columns]
+    last_id = 0
+    while True:
+        with engine.begin() as connection:
+            rows = connection.execute(
+                select(*columns)
+                .where(FunctionMetrics.__table__.c.id > last_id)
+                .order_by(FunctionMetrics.__table__.c.id)
+                .limit(BACKFILL_BATCH_SIZE)
+            ).mappings().all()
+            if not rows:
+                return
+            update_rollups(connection, rows)
+            last_id = rows[-1]["id"]
+
+
+def _window_ranges(since: datetime, until: datetime) -> List[Tuple[str, datetime, datetime]]:
+    """Cover [since, until) with as few buckets as possible: whole days, then hours, then minutes"""
+    def ceil(timestamp: datetime, resolution: str, step: timedelta) -> datetime:
+        start = bucket_start(timestamp, resolution)
+        return start if start == timestamp else start + step
+
+    hour, day = timedelta(hours=1), timedelta(days=1)
+    first_hour, last_hour = ceil(since, "hour", hour), bucket_start(until, "hour")
+    if first_hour >= last_hour:
+        return [("minute", since, until)]
+    ranges = [("minute", since, first_hour), ("minute", last_hour, until)]
+    first_day, last_day = ceil(first_hour, "day", day), bucket_start(last_hour, "day")
+    if first_day >= last_day:
+        return ranges + [("hour", first_hour, last_hour)]
+    return ranges + [
+        ("hour", first_hour, first_day),
+        ("hour", last_day, last_hour),
+        ("day", first_day, last_day)
+    ]
+
+
+def window_stats(db, function_id: int, since: Optional[datetime] = None,
+                 until: Optional[datetime] = None) -> Dict[str, Any]:
+    """Execution stats for a function from its rollups.
+
+    Without a window this reads the single all-time bucket. A window is
+    resolved to whole minutes and read from at most a few dozen buckets
+    plus one per whole day it spans.
+    """
+    query = db.query(MetricsRollup).filter(MetricsRollup.function_id == function_id)
+    if since is None and until is None:
+        query = query.filter(MetricsRollup.resolution == "total")
+    else:
+        start = bucket_start(utc(since) if since else EPOCH, "minute")
+        if until is None:
+            end = bucket_start(datetime.utcnow(), "minute") + timedelta(minutes=1)
+        else:
+            end = bucket_start(utc(until), "minute")
+        ranges = [
+            and_(
+                MetricsRollup.resolution == resolution,
+                MetricsRollup.bucket_start >= first,
+                MetricsRollup.bucket_start < last
+            )
+            for resolution, first, last in _window_ranges(start, end)
+            if first < last
+        ]
+        query = query.filter(or_(*ranges) if ranges else false())
+
+    total = _empty()
+    for rollup in query.all():
+        _merge(total, _fields(rollup))
+
+    count = total["count"]
+    if not count:
+        return {
+            "total_executions": 0,
+            "avg_execution_time": 0,
+            "avg_memory_usage": 0,
+            "avg_cpu_time": 0,
+            "success_rate": 0,
+            "error_rate": 0
+        }
+    sketch = total["latency_sketch"]
+    return {
+        "total_executions": count,
+        "avg_execution_time": total["sum_execution_time"] / count,
+        "avg_memory_usage": total["sum_memory_usage"] / count,
+        "avg_cpu_time": total["sum_cpu_time"] / count,
+        "success_rate": (total["success_count"] / count) * 100,
+        "error_rate": ((count - total["success_count"]) / count) * 100,
+        "cold_start_rate": (total["cold_starts"] / count) * 100,
+        "min_execution_time": total["min_execution_time"],
+        "max_execution_time": total["max_execution_time"],
+        "p50_execution_time": sketch.quantile(0.5),
+        "p95_execution_time": sketch.quantile(0.95),
+        "p99_execution_time": sketch.quantile(0.99),
+        "max_memory_usage": total["max_memory_usage"]
+    }
+
+
+def downsample(db, function_id: int, since: Optional[datetime], until: Optional[datetime],
+               points: int) -> List[Dict[str, Any]]:
+    """Metrics over [since, until) aggregated into at most points equal-width intervals.
+
+    Reads the coarsest rollups that still fit inside one interval, so the
+    number of buckets read stays proportional to points, not to history.
+    Intervals without invocations are left out.
+    """
+    end = utc(until) if until else datetime.utcnow()
+    if since is None:
+        first = {}
+        for resolution in ("day", "minute"):
+            row = (
+                db.query(MetricsRollup.bucket_start)
+                .filter(MetricsRollup.function_id == function_id, MetricsRollup.resolution == resolution)
+                .order_by(MetricsRollup.bucket_start)
+                .first()
+            )
+            if row is not None:
+                first[resolution] = row.bucket_start
+        if not first:
+            return []
+        # Day rollups outlive minute rollups; start at the first minute
+        # only while the first day's minutes are still retained
+        start = first.get("day") or first["minute"]
+        if "minute" in first and bucket_start(first["minute"], "day") == start:
+            start = first["minute"]
+    else:
+        start = utc(since)
+    if start >= end:
+        return []
+
+    width = (end - start) / points
+    resolution = "minute"
+    for candidate, size in (("day", timedelta(days=1)), ("hour", timedelta(hours=1))):
+        if size <= width:
+            resolution = candidate
+            break
+
+    rollups = (
+        db.query(MetricsRollup)
+        .filter(
+            MetricsRollup.function_id == function_id,
+            MetricsRollup.resolution == resolution,
+            MetricsRollup.bucket_start >= bucket_start(start, resolution),
+            MetricsRollup.bucket_start < end
+        )
+        .order_by(MetricsRollup.bucket_start)
+        .all()
+    )
+    intervals: Dict[int, Dict[str, Any]] = {}
+    for rollup in rollups:
+        index = min(points - 1, max(0, int((rollup.bucket_start - start) / width)))
+        _merge(intervals.setdefault(index, _empty()), _fields(rollup))
+
+    result = []
+    for index in sorted(intervals):
+        total = intervals[index]
+        count = total["count"]
+        result.append({
+            "timestamp": start + width * index,
+            "count": count,
+            "success_count": total["success_count"],
+            "cold_starts": total["cold_starts"],
+            "avg_execution_time": total["sum_execution_time"] / count,
+            "max_execution_time": total["max_execution_time"],
+            "p95_execution_time": total["latency_sketch"].quantile(0.95),
+            "avg_memory_usage": total["sum_memory_usage"] / count,
+            "max_memory_usage": total["max_memory_usage"],
+            "avg_cpu_time": total["sum_cpu_time"] / count
+        })
+    return result
@@ -0,0 +1,153 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from ..models import SessionLocal, Function
+
+# Route table configuration
+ROUTE_TABLE_REFRESH_INTERVAL = float(os.getenv("ROUTE_TABLE_REFRESH_INTERVAL", "30"))  # seconds; 0 disables
+ROUTE_TABLE_MISS_TTL = float(os.getenv("ROUTE_TABLE_MISS_TTL", "5"))  # seconds an unknown route is remembered
+ROUTE_TABLE_MAX_MISSES = 10000
+
+
+def normalize_route(route: str) -> str:
+    return "/" + route.strip("/")
+
+
+class RouteTable:
+    """In-memory index of functions by route and id.
+
+    Invocations look functions up here instead of querying the database.
+    Entries are detached Function rows, replaced whole whenever a function
+    changes so readers never see a half-applied update. The index is per
+    process: ids and routes it hasn't seen, such as those of functions
+    created by another API process, can be loaded with fetch() and
+    fetch_route(), and a background thread reloads it every
+    refresh_interval seconds to pick up other processes' updates and
+    deletes. Routes fetch_route() found nowhere are remembered for
+    miss_ttl seconds, so repeated requests for unknown paths don't each
+    query the database.
+    """
+
+    def __init__(self, refresh_interval: float = ROUTE_TABLE_REFRESH_INTERVAL,
+                 miss_ttl: float = ROUTE_TABLE_MISS_TTL):
+        self.refresh_interval = refresh_interval
+        self.miss_ttl = miss_ttl
+        self._misses: "OrderedDict[str, float]" = OrderedDict()  # route -> when the miss expires
+        self._by_route: Dict[str, Function] = {}
+        self._by_id: Dict[int, Function] = {}
+        self._version = 0  # changes made by this process, so a reload doesn't undo newer ones
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.load()
+        if self.refresh_interval <= 0:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="route-table", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def load(self) -> bool:
+        """Replace the index with the database's functions.
+
+        Returns False without changing anything when this process changed
+        the index while the functions were read, as the read may predate it.
+        """
+        with self._lock:
+            version = self._version
+        db = SessionLocal()
+        try:
+            functions = db.query(Function).all()
+        finally:
+            db.close()
+        with self._lock:
+            if self._version != version:
+                return False
+            self._by_id = {function.id: function for function in functions}
+            self._by_route = {normalize_route(function.route): function for function in functions}
+            self._misses.clear()
+            return True
+
+    def put(self, function: Function):
+        with self._lock:
+            self._discard(function.id)
+            self._by_id[function.id] = function
+            self._by_route[normalize_route(function.route)] = function
+            self._misses.pop(normalize_route(function.route), None)
+            self._version += 1
+
+    def remove(self, function_id: int):
+        with self._lock:
+            self._discard(function_id)
+            self._version += 1
+
+    def by_route(self, route: str) -> Optional[Function]:
+        return self._by_route.get(normalize_route(route))
+
+    def by_id(self, function_id: int) -> Optional[Function]:
+        return self._by_id.get(function_id)
+
+    def functions(self) -> List[Function]:
+        return list(self._by_id.values())
+
+    def fetch(self, function_id: int) -> Optional[Function]:
+        """Load a function the index hasn't seen, such as one created by another process"""
+        db = SessionLocal()
+        try:
+            function = db.query(Function).filter(Function.id == function_id).first()
+        finally:
+            db.close()
+        if function is not None:
+            self.put(function)
+        return function
+
+    def fetch_route(self, route: str) -> Optional[Function]:
+        """Load the function at a route the index hasn't seen"""
+        normalized = normalize_route(route)
+        with self._lock:
+            expires_at = self._misses.get(normalized)
+            if expires_at is not None and expires_at > time.time():
+                return None
+        # Routes are stored as they were given, with or without their slashes
+        candidates = {normalized, normalized[1:], normalized + "/", normalized[1:] + "/"}
+        db = SessionLocal()
+        try:
+            function = db.query(Function).filter(Function.route.in_(candidates)).first()
+        finally:
+            db.close()
+        if function is not None:
+            self.put(function)
+        elif self.miss_ttl > 0:
+            with self._lock:
+                self._misses.pop(normalized, None)
+                self._misses[normalized] = time.time() + self.miss_ttl
+                if len(self._misses) > ROUTE_TABLE_MAX_MISSES:
+                    self._misses.popitem(last=False)
+        return function
+
+    def _run(self):
+        while not self._stopped.wait(self.refresh_interval):
+            try:
+                self.load()
+            except Exception as e:
+                print(f"Failed to refresh the route table: {str(e)}")
+
+    def _discard(self, function_id: int):
+        function = self._by_id.pop(function_id, None)
+        if function is not None:
+            route = normalize_route(function.route)
+            if self._by_route.get(route) is function:
+                del self._by_route[route]
+
+
+route_table = RouteTable()
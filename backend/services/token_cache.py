@@ -0,0 +1,92 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+from sqlalchemy import event
+
+from ..models import User
+
+# Token cache configuration
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", "60"))  # seconds
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+
+
+class TokenCache:
+    """Bounded TTL cache of verified bearer tokens and the users they belong to.
+
+    Entries are detached User rows, kept until the cache TTL or the token's
+    own expiry, whichever comes first, so a cached token is never honoured
+    past its exp claim; tokens without one are kept for the TTL. Changing
+    or deleting a user drops its tokens.
+    """
+
+    def __init__(self, ttl: float = TOKEN_CACHE_TTL, max_size: int = TOKEN_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[User, float]]" = OrderedDict()
+        self._by_user: Dict[int, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[User]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            user, expires_at = entry
+            if expires_at <= time.time():
+                self._discard(token)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return user
+
+    def put(self, token: str, user: User, token_expires_at: Optional[float] = None):
+        if self.max_size <= 0:
+            return
+        expires_at = time.time() + self.ttl
+        if token_expires_at is not None:
+            expires_at = min(expires_at, token_expires_at)
+        with self._lock:
+            self._discard(token)
+            self._entries[token] = (user, expires_at)
+            self._by_user.setdefault(user.id, set()).add(token)
+            while len(self._entries) > self.max_size:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for token in list(self._by_user.get(user_id, ())):
+                self._discard(token)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def _discard(self, token: str):
+        entry = self._entries.pop(token, None)
+        if entry is not None:
+            tokens = self._by_user.get(entry[0].id)
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    del self._by_user[entry[0].id]
+
+
+token_cache = TokenCache()
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_tokens(mapper, connection, target):
+    token_cache.invalidate_user(target.id)
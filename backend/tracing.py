@@ -0,0 +1,180 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from .monitoring import EXECUTOR_PHASE
+
+# Trace export configuration
+TRACE_EXPORT_FILE = os.getenv("TRACE_EXPORT_FILE", "")  # Zipkin JSON lines; empty disables export
+TRACE_EXPORT_BUFFER_SIZE = int(os.getenv("TRACE_EXPORT_BUFFER_SIZE", "10000"))
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "serverless-platform")
+
+
+def record_phase(spans: List[Dict[str, Any]], engine: str, name: str, start: float, duration: float):
+    """Add an executor phase, started at epoch seconds start, as a span and to the phase histogram"""
+    EXECUTOR_PHASE.labels(engine, name).observe(duration)
+    spans.append({"name": name, "start": start, "duration": duration})
+
+
+@contextmanager
+def phase(spans: List[Dict[str, Any]], engine: str, name: str):
+    """Time the block as an executor phase"""
+    start = time.time()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(spans, engine, name, start, time.perf_counter() - started)
+
+
+class Trace:
+    """Spans timing the phases of one invocation.
+
+    Span starts are epoch seconds while recording and are reported as
+    offsets from the start of the trace.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.trace_id = uuid.uuid4().hex
+        self.start = time.time()
+        self.end: Optional[float] = None
+        self.spans: List[Dict[str, Any]] = []
+
+    def finish(self):
+        self.end = time.time()
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.time()) - self.start
+
+    @contextmanager
+    def span(self, name: str):
+        start = time.time()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, start, time.perf_counter() - started)
+
+    def add(self, name: str, start: float, duration: float):
+        self.spans.append({"name": name, "start": start, "duration": duration})
+
+    def extend(self, spans: Optional[List[Dict[str, Any]]]):
+        """Add spans recorded elsewhere, such as an executor's phases"""
+        self.spans.extend(spans or [])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "duration": self.duration,
+            "spans": [
+                {"name": span["name"], "start": span["start"] - self.start, "duration": span["duration"]}
+                for span in sorted(self.spans, key=lambda span: span["start"])
+            ]
+        }
+
+    def zipkin(self, tags: Dict[str, str]) -> List[Dict[str, Any]]:
+        """The trace as Zipkin v2 spans: a root span with each phase as its child"""
+        root_id = uuid.uuid4().hex[:16]
+        endpoint = {"serviceName": TRACE_SERVICE_NAME}
+        spans = [{
+            "traceId": self.trace_id,
+            "id": root_id,
+            "name": self.name,
+            "timestamp": int(self.start * 1e6),
+            "duration": max(1, int(self.duration * 1e6)),
+            "localEndpoint": endpoint,
+            "tags": tags
+        }]
+        for span in self.spans:
+            spans.append({
+                "traceId": self.trace_id,
+                "parentId": root_id,
+                "id": uuid.uuid4().hex[:16],
+                "name": span["name"],
+                "timestamp": int(span["start"] * 1e6),
+                "duration": max(1, int(span["duration"] * 1e6)),
+                "localEndpoint": endpoint
+            })
+        return spans
+
+
+class TraceExporter:
+    """Appends finished traces to a file from a background thread.
+
+    Each line is a JSON array of Zipkin v2 spans, ready to POST to a Zipkin
+    collector's /api/v2/spans. When writes fall behind, the oldest traces
+    are dropped rather than slowing invocations down.
+    """
+
+    def __init__(self, path: str = TRACE_EXPORT_FILE, buffer_size: int = TRACE_EXPORT_BUFFER_SIZE):
+        self.path = path
+        self.exported = 0
+        self.dropped = 0
+        self._buffer: deque = deque()
+        self._buffer_size = buffer_size
+        self._lock = threading.Condition()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def export(self, trace: Trace, **tags):
+        if not self.enabled:
+            return
+        with self._lock:
+            if len(self._buffer) >= self._buffer_size:
+                self._buffer.popleft()
+                self.dropped += 1
+            self._buffer.append((trace, {k: str(v) for k, v in tags.items()}))
+            self._lock.notify()
+
+    def start(self):
+        if not self.enabled:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        with self._lock:
+            self._lock.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self._write()
+
+    def _write(self):
+        with self._lock:
+            batch = list(self._buffer)
+            self._buffer.clear()
+        if not batch:
+            return
+        try:
+            with open(self.path, "a") as f:
+                for trace, tags in batch:
+                    f.write(json.dumps(trace.zipkin(tags)) + "\n")
+        except OSError as e:
+            print(f"Failed to export {len(batch)} traces: {str(e)}")
+            self.dropped += len(batch)
+            return
+        self.exported += len(batch)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            with self._lock:
+                if not self._buffer:
+                    self._lock.wait(1.0)
+            self._write()
+
+
+trace_exporter = TraceExporter()
@@ -0,0 +1,198 @@
+"""Executor worker node for the API's fleet engine.
+
+Runs functions on its own executor and registers with the API through
+heartbeats carrying its capacity, load, free memory and warm functions.
+Start the API with EXECUTOR_ENGINE=fleet and any number of nodes:
+
+    FLEET_TOKEN=secret python -m backend.worker --port 9001 --api http://localhost:8000
+"""
+import argparse
+import hmac
+import json
+import os
+import socket
+import threading
+from collections import OrderedDict
+from itertools import chain
+from typing import Any, Dict, Optional
+
+import requests
+import uvicorn
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from .executor import LazyExecutor
+from .executor.cache import code_hash
+from .executor.concurrency import EXECUTOR_WORKERS
+from .executor.fleet.registry import FLEET_TOKEN, FLEET_TOKEN_HEADER
+
+FLEET_API_URL = os.getenv("FLEET_API_URL", "http://localhost:8000")
+FLEET_NODE_CAPACITY = int(os.getenv("FLEET_NODE_CAPACITY", str(EXECUTOR_WORKERS)))  # concurrent calls
+FLEET_HEARTBEAT_INTERVAL = float(os.getenv("FLEET_HEARTBEAT_INTERVAL", "5"))  # seconds
+FLEET_WARM_FUNCTIONS = 256  # recently run functions reported for affinity
+
+
+def free_memory() -> Optional[float]:
+    """Available memory in MB, or None where /proc/meminfo doesn't exist"""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class InvokeRequest(BaseModel):
+    code: str
+    runtime: str
+    timeout: float
+    limits: Optional[Dict[str, Any]] = None
+    event: Any = None
+    context: Optional[Dict[str, Any]] = None
+    layer: Optional[str] = None  # always None: the fleet engine builds no dependency layers
+    stream: bool = False
+
+
+class WorkerNode:
+    """Accepts calls up to its capacity and reports itself to the API"""
+
+    def __init__(self, node_id: str, url: str, api_url: str = FLEET_API_URL,
+                 capacity: int = FLEET_NODE_CAPACITY, heartbeat_interval: float = FLEET_HEARTBEAT_INTERVAL):
+        self.id = node_id
+        self.url = url
+        self.api_url = api_url.rstrip("/")
+        self.capacity = capacity
+        self.heartbeat_interval = heartbeat_interval
+        self.executor = LazyExecutor()
+        self.in_flight = 0
+        self._warm: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._session = requests.Session()
+
+    def start(self):
+        self.executor.start()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="fleet-heartbeat", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        try:
+            # Leave the fleet straight away rather than waiting to be timed out
+            self._session.delete(f"{self.api_url}/api/v1/fleet/nodes/{self.id}",
+                                 headers={FLEET_TOKEN_HEADER: FLEET_TOKEN}, timeout=5)
+        except requests.RequestException:
+            pass
+        self.executor.shutdown()
+
+    def invoke(self, request: InvokeRequest):
+        """Run a call, as NDJSON protocol messages; raises 503 when full or still starting"""
+        with self._lock:
+            if not self.executor.ready or self.in_flight >= self.capacity:
+                raise HTTPException(status_code=503, detail="Node unavailable")
+            self.in_flight += 1
+            key = code_hash(request.code, request.runtime)
+            self._warm.pop(key, None)
+            self._warm[key] = True
+            while len(self._warm) > FLEET_WARM_FUNCTIONS:
+                self._warm.popitem(last=False)
+        messages = self._messages(request)
+        # Started here, so closing an abandoned response always frees the slot
+        return chain([next(messages)], messages)
+
+    def heartbeat(self) -> Dict[str, Any]:
+        with self._lock:
+            in_flight, warm = self.in_flight, list(self._warm)
+        return {
+            "id": self.id,
+            "url": self.url,
+            "capacity": self.capacity if self.executor.ready else 0,
+            "in_flight": in_flight,
+            "free_memory": free_memory(),
+            "warm": warm,
+            "pools": self.executor.stats()
+        }
+
+    def _messages(self, request: InvokeRequest):
+        try:
+            args = (request.code, request.runtime, request.timeout, request.limits,
+                    request.event, request.context, request.layer)
+            if request.stream:
+                for message in self.executor.stream(*args):
+                    yield json.dumps(message, default=str) + "\n"
+            else:
+                yield json.dumps(self.executor.execute(*args), default=str) + "\n"
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def _run(self):
+        while not self._stopped.is_set():
+            if self.executor.ready:
+                try:
+                    response = self._session.post(
+                        f"{self.api_url}/api/v1/fleet/nodes/heartbeat", json=self.heartbeat(),
+                        headers={FLEET_TOKEN_HEADER: FLEET_TOKEN}, timeout=5
+                    )
+                    response.raise_for_status()
+                except requests.RequestException as e:
+                    print(f"Heartbeat to {self.api_url} failed: {str(e)}")
+            self._stopped.wait(self.heartbeat_interval)
+
+
+def create_app(node: WorkerNode) -> FastAPI:
+    app = FastAPI(title="Serverless Worker Node")
+
+    @app.on_event("startup")
+    def start_node():
+        node.start()
+
+    @app.on_event("shutdown")
+    def stop_node():
+        node.stop()
+
+    # Sync, so the first message is awaited on the threadpool
+    @app.post("/invoke")
+    def invoke(request: InvokeRequest, x_fleet_token: Optional[str] = Header(None)):
+        if not FLEET_TOKEN or not hmac.compare_digest(x_fleet_token or "", FLEET_TOKEN):
+            raise HTTPException(status_code=403, detail="Invalid fleet token")
+        return StreamingResponse(node.invoke(request), media_type="application/x-ndjson")
+
+    @app.get("/status")
+    def status():
+        return dict(node.heartbeat(), executor=node.executor.status())
+
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run an executor worker node")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=9001)
+    parser.add_argument("--api", default=FLEET_API_URL, help="URL of the API to register with")
+    parser.add_argument("--url", help="URL the API reaches this node at, by default from host and port")
+    parser.add_argument("--node-id", help="unique node name, by default hostname:port")
+    parser.add_argument("--capacity", type=int, default=FLEET_NODE_CAPACITY, help="concurrent calls")
+    args = parser.parse_args(argv)
+    if not FLEET_TOKEN:
+        parser.error("FLEET_TOKEN must be set to the token the API was started with")
+
+    node = WorkerNode(
+        args.node_id or f"{socket.gethostname()}:{args.port}",
+        args.url or f"http://{args.host}:{args.port}",
+        args.api,
+        args.capacity
+    )
+    uvicorn.run(create_app(node), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
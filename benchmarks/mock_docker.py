@@ -0,0 +1,136 @@
+"""A stand-in Docker client that runs runtime containers as local processes.
+
+Containers run the same bootstrap command they would run in their image,
+with stdio bridged to the multiplexed attach socket and log stream the
+Docker API provides, so DockerExecutor and its warm pool are exercised
+end to end without a Docker daemon. startup_delay simulates the time a
+real daemon takes to create and start a container.
+"""
+import shutil
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+STDOUT = 1
+STDERR = 2
+
+
+def _local_command(command, volumes=None):
+    """Map an in-container command onto this machine: interpreters and bind mounts"""
+    command = list(command)
+    if command[0] == "python":
+        command[0] = sys.executable
+    elif command[0] == "node":
+        command[0] = shutil.which("node") or "node"
+    for host, spec in (volumes or {}).items():
+        bind = spec["bind"] + "/"
+        command = [host + "/" + arg[len(bind):] if arg.startswith(bind) else arg for arg in command]
+    return command
+
+
+class MockContainer:
+    def __init__(self, command, volumes=None, startup_delay: float = 0.0):
+        self.id = uuid.uuid4().hex
+        self.attrs = {"State": {"OOMKilled": False}}
+        self._command = _local_command(command, volumes)
+        self._startup_delay = startup_delay
+        self._process = None
+        self._peer = None
+
+    # Warm pool path: attach, start, then talk over the socket
+
+    def attach_socket(self, params=None):
+        sock, self._peer = socket.socketpair()
+        return sock
+
+    def start(self):
+        time.sleep(self._startup_delay)
+        self._process = subprocess.Popen(
+            self._command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        threading.Thread(target=self._pump_stdin, daemon=True).start()
+        threading.Thread(target=self._pump_output, args=(self._process.stdout, STDOUT), daemon=True).start()
+        threading.Thread(target=self._pump_output, args=(self._process.stderr, STDERR), daemon=True).start()
+
+    def _pump_stdin(self):
+        while True:
+            data = self._peer.recv(65536)
+            if not data:
+                break
+            try:
+                self._process.stdin.write(data)
+                self._process.stdin.flush()
+            except OSError:
+                break
+
+    def _pump_output(self, pipe, stream: int):
+        while True:
+            data = pipe.read1(65536)
+            if not data:
+                break
+            try:
+                self._peer.sendall(bytes([stream, 0, 0, 0]) + struct.pack(">I", len(data)) + data)
+            except OSError:
+                break
+        if stream == STDOUT:
+            self._peer.close()
+
+    # One-off path: run detached, follow the logs, wait
+
+    def run(self):
+        time.sleep(self._startup_delay)
+        self._process = subprocess.Popen(self._command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        return self
+
+    def logs(self, stream: bool = False, follow: bool = False, **kwargs):
+        if not stream:
+            return self._process.stdout.read()
+        return iter(lambda: self._process.stdout.read1(65536), b"")
+
+    def wait(self, timeout=None):
+        return {"StatusCode": self._process.wait(timeout)}
+
+    def reload(self):
+        pass
+
+    def kill(self):
+        if self._process is not None and self._process.poll() is None:
+            self._process.kill()
+
+    def remove(self, force: bool = False):
+        self.kill()
+
+
+class MockContainers:
+    def __init__(self, startup_delay: float):
+        self.startup_delay = startup_delay
+        self.created = 0
+
+    def create(self, image, command=None, **kwargs):
+        self.created += 1
+        return MockContainer(command, startup_delay=self.startup_delay)
+
+    def run(self, image, command=None, volumes=None, **kwargs):
+        self.created += 1
+        return MockContainer(command, volumes, self.startup_delay).run()
+
+
+class MockImages:
+    def pull(self, *args, **kwargs):
+        pass
+
+    def get(self, name):
+        return name
+
+
+class MockDockerClient:
+    def __init__(self, startup_delay: float = 0.0):
+        self.containers = MockContainers(startup_delay)
+        self.images = MockImages()
+
+    def ping(self):
+        return True
@@ -0,0 +1,316 @@
+"""Load generator and latency benchmark for the execute API.
+
+Seeds functions through the functions API, drives POST /execute/{id} at a
+fixed concurrency and, optionally, a fixed request rate, then reports
+throughput, latency percentiles, cold versus warm starts and metrics
+write rates as JSON.
+
+By default the backend runs in-process against a throwaway SQLite
+database, on one of three engines:
+
+    process      the pre-forked process pool
+    local        DockerExecutor's local fallback, as when Docker is down
+    docker-mock  DockerExecutor and its warm pool on a mock Docker client
+
+so it needs no Docker daemon or network. --url benchmarks a running
+server instead.
+
+    python -m benchmarks.run --engine docker-mock --concurrency 16 --requests 2000
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+ENGINES = ("process", "local", "docker-mock")
+
+FUNCTION_CODE = {
+    "python": (
+        "def handler(event, context):\n"
+        "    return {\"echo\": event}\n"
+    ),
+    "javascript": (
+        "exports.handler = async (event, context) => ({ echo: event });\n"
+    ),
+}
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    """Summary of latencies in milliseconds"""
+    if not values:
+        return {"mean": None, "p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(values)
+
+    def rank(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+    return {
+        "mean": sum(ordered) / len(ordered) * 1000,
+        "p50": rank(0.50),
+        "p95": rank(0.95),
+        "p99": rank(0.99),
+        "max": ordered[-1] * 1000,
+    }
+
+
+def in_process_client(engine: str, startup_delay: float):
+    """A TestClient for the app, running on engine against a fresh database"""
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "benchmark.db")
+    os.environ["EXECUTOR_ENGINE"] = "process" if engine == "process" else "docker"
+
+    # The executor is built when the app starts, so the Docker client is swapped in first
+    import docker
+    if engine == "docker-mock":
+        from .mock_docker import MockDockerClient
+        client = MockDockerClient(startup_delay)
+        docker.from_env = lambda *args, **kwargs: client
+    elif engine == "local":
+        def unavailable(*args, **kwargs):
+            raise docker.errors.DockerException("Docker disabled for benchmark")
+        docker.from_env = docker.DockerClient = unavailable
+
+    from fastapi.testclient import TestClient
+    from backend.main import app
+    return TestClient(app)
+
+
+class RemoteClient:
+    """requests.Session with URLs relative to a server, shaped like TestClient"""
+
+    def __init__(self, url: str):
+        import requests
+        self.url = url.rstrip("/")
+        self.session = requests.Session()
+
+    def request(self, method: str, path: str, **kwargs):
+        return self.session.request(method, self.url + path, **kwargs)
+
+    def get(self, path: str, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+
+def authenticate(client) -> Dict[str, str]:
+    username = f"bench-{uuid.uuid4().hex[:8]}"
+    password = uuid.uuid4().hex
+    response = client.post("/api/v1/auth/register", json={
+        "username": username, "email": f"{username}@example.com", "password": password
+    })
+    response.raise_for_status()
+    response = client.post("/api/v1/auth/token", data={"username": username, "password": password})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def seed_functions(client, headers: Dict[str, str], runtime: str, count: int) -> List[int]:
+    ids = []
+    for index in range(count):
+        name = f"bench-{uuid.uuid4().hex[:8]}-{index}"
+        response = client.post("/api/v1/functions/", headers=headers, json={
+            "name": name,
+            "runtime": runtime,
+            "code": FUNCTION_CODE[runtime],
+            "route": f"/{name}",
+            "timeout": 30,
+        })
+        response.raise_for_status()
+        ids.append(response.json()["id"])
+    return ids
+
+
+def metrics_rows(client, headers: Dict[str, str], function_ids: List[int]) -> int:
+    total = 0
+    for function_id in function_ids:
+        response = client.get(f"/api/v1/metrics/stats/function/{function_id}", headers=headers)
+        response.raise_for_status()
+        total += response.json()["total_executions"]
+    return total
+
+
+def drive(client, headers: Dict[str, str], function_ids: List[int], requests: int,
+          concurrency: int, rate: float, payload_bytes: int) -> Dict[str, Any]:
+    """Send requests calls from concurrency threads.
+
+    With a rate, calls are scheduled at fixed intervals and latency is
+    measured from the scheduled time, so a stalled server shows up as
+    latency instead of silently slowing the load down.
+    """
+    event = {"data": "x" * payload_bytes}
+    samples = []
+    lock = threading.Lock()
+    counter = iter(range(requests))
+    start = time.perf_counter()
+
+    def worker():
+        while True:
+            with lock:
+                index = next(counter, None)
+            if index is None:
+                return
+            scheduled = start + index / rate if rate else time.perf_counter()
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            function_id = function_ids[index % len(function_ids)]
+            try:
+                response = client.post(f"/api/v1/execute/{function_id}", headers=headers, json=event)
+                status = response.status_code
+                body = response.json() if status == 200 else {}
+            except Exception as e:
+                status, body = type(e).__name__, {}
+            latency = time.perf_counter() - scheduled
+            sample = (latency, status, body.get("status"), body.get("cold_start", False))
+            with lock:
+                samples.append(sample)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    succeeded = [s for s in samples if s[1] == 200 and s[2] == "success"]
+    return {
+        "requests": len(samples),
+        "succeeded": len(succeeded),
+        "duration": elapsed,
+        "throughput": len(samples) / elapsed if elapsed else 0.0,
+        "http_status": dict(Counter(str(s[1]) for s in samples)),
+        "function_status": dict(Counter(s[2] for s in samples if s[2])),
+        "latency_ms": percentiles([s[0] for s in samples]),
+        "cold_starts": sum(1 for s in succeeded if s[3]),
+        "warm_starts": sum(1 for s in succeeded if not s[3]),
+        "cold_latency_ms": percentiles([s[0] for s in succeeded if s[3]]),
+        "warm_latency_ms": percentiles([s[0] for s in succeeded if not s[3]]),
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def wait_for_rows(client, headers: Dict[str, str], function_ids: List[int], expected: int,
+                  timeout: float) -> int:
+    """Metrics are written in batches; poll until expected rows have landed"""
+    deadline = time.perf_counter() + timeout
+    while True:
+        rows = metrics_rows(client, headers, function_ids)
+        if rows >= expected or time.perf_counter() >= deadline:
+            return rows
+        time.sleep(0.1)
+
+
+def wait_until_ready(client, timeout: float):
+    """The executor starts in the background; keep its startup out of the measurements"""
+    deadline = time.perf_counter() + timeout
+    while client.get("/ready").status_code != 200:
+        if time.perf_counter() >= deadline:
+            raise RuntimeError(f"Executor not ready after {timeout}s")
+        time.sleep(0.1)
+
+
+def run(args) -> Dict[str, Any]:
+    client = RemoteClient(args.url) if args.url else in_process_client(args.engine, args.startup_delay)
+    # Entering a TestClient runs the app's startup and shutdown hooks
+    with contextlib.nullcontext(client) if args.url else client:
+        wait_until_ready(client, args.ready_timeout)
+        headers = authenticate(client)
+        function_ids = seed_functions(client, headers, args.runtime, args.functions)
+        warmed = 0
+        if args.warmup:
+            warmed = drive(client, headers, function_ids, args.warmup, args.concurrency, 0,
+                           args.payload_bytes)["succeeded"]
+        rows_before = wait_for_rows(client, headers, function_ids, warmed, args.flush_timeout)
+
+        results = drive(client, headers, function_ids, args.requests, args.concurrency,
+                        args.rate, args.payload_bytes)
+
+        finished = time.perf_counter()
+        rows = wait_for_rows(client, headers, function_ids, rows_before + results["succeeded"],
+                             args.flush_timeout)
+        written = rows - rows_before
+        results["db"] = {
+            "metrics_rows": written,
+            "metrics_rows_per_second": written / results["duration"] if results["duration"] else 0.0,
+            "flush_lag": time.perf_counter() - finished,
+        }
+        if not args.url:
+            from backend.services.metrics_writer import metrics_writer
+            results["db"]["metrics_writer"] = metrics_writer.stats()
+
+    return {
+        "benchmark": "execute",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "revision": git_revision(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "config": {
+            "target": args.url or args.engine,
+            "runtime": args.runtime,
+            "functions": args.functions,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "concurrency": args.concurrency,
+            "rate": args.rate,
+            "payload_bytes": args.payload_bytes,
+            "startup_delay": args.startup_delay,
+        },
+        "results": results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the execute API")
+    parser.add_argument("--engine", choices=ENGINES, default="process",
+                        help="executor for the in-process backend")
+    parser.add_argument("--url", help="benchmark a running server instead, e.g. http://localhost:8000")
+    parser.add_argument("--runtime", choices=sorted(FUNCTION_CODE), default="python")
+    parser.add_argument("--functions", type=int, default=1, help="functions to spread calls across")
+    parser.add_argument("--requests", type=int, default=500, help="measured calls")
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured calls before the run")
+    parser.add_argument("--concurrency", type=int, default=8, help="calls in flight")
+    parser.add_argument("--rate", type=float, default=0, help="calls per second; 0 sends as fast as possible")
+    parser.add_argument("--payload-bytes", type=int, default=64, help="size of each call's event")
+    parser.add_argument("--startup-delay", type=float, default=0.0,
+                        help="seconds the mock Docker client takes to start a container")
+    parser.add_argument("--flush-timeout", type=float, default=10.0,
+                        help="seconds to wait for metrics rows to be written")
+    parser.add_argument("--ready-timeout", type=float, default=120.0,
+                        help="seconds to wait for the executor to finish starting")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    # The backend logs with print(); keep stdout for the report
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
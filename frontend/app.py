@@ -97,10 +97,15 @@ else:
                 with st.expander(f"{func['name']} ({func['runtime']})"):
                     st.write(f"Route: {func['route']}")
                     st.write(f"Timeout: {func['timeout']} seconds")
+                    st.write(f"Limits: {func.get('memory_limit')} MB, {func.get('cpu_limit')} CPU")
+                    event = st.text_area("Event (JSON)", value="{}", key=f"event_{func['id']}")
                     col1, col2 = st.columns(2)
                     with col1:
                         if st.button(f"Execute {func['name']}", key=f"exec_{func['id']}"):
-                            execute_response = api_call("post", f"execute/{func['id']}")
+                            execute_response = api_call(
+                                "post", f"execute/{func['id']}",
+                                data=event, headers={"Content-Type": "application/json"}
+                            )
                             if execute_response.status_code == 200:
                                 result = execute_response.json()
                                 st.success("Function executed successfully!")
@@ -124,6 +129,8 @@ else:
             runtime = st.selectbox("Runtime", ["python", "javascript"])
             route = st.text_input("Route")
             timeout = st.number_input("Timeout (seconds)", min_value=1.0, value=30.0)
+            memory_limit = st.number_input("Memory limit (MB)", min_value=16, value=256)
+            cpu_limit = st.number_input("CPU limit (cores)", min_value=0.1, value=1.0)
             code = st.text_area("Code")
             
             if st.form_submit_button("Create"):
@@ -132,6 +139,8 @@ else:
                     "runtime": runtime,
                     "route": route,
                     "timeout": timeout,
+                    "memory_limit": int(memory_limit),
+                    "cpu_limit": cpu_limit,
                     "code": code
                 }
                 
@@ -163,13 +172,15 @@ else:
                     stats = stats_response.json()
                     
                     # Display stats in columns
-                    col1, col2, col3 = st.columns(3)
+                    col1, col2, col3, col4 = st.columns(4)
                     with col1:
                         st.metric("Total Executions", stats['total_executions'])
                     with col2:
                         st.metric("Success Rate", f"{stats['success_rate']:.1f}%")
                     with col3:
                         st.metric("Avg Execution Time", f"{stats['avg_execution_time']:.2f}s")
+                    with col4:
+                        st.metric("p95 Execution Time", f"{stats.get('p95_execution_time') or 0:.2f}s")
                     
                     # Execute button
                     if st.button("Execute Function"):
@@ -182,32 +193,45 @@ else:
                         else:
                             st.error(f"Error executing function: {execute_response.text}")
                     
-                    # Get detailed metrics
-                    metrics_response = api_call("get", f"metrics/function/{selected_function['id']}")
+                    # Get metrics for the chosen window, downsampled on the server
+                    window = st.selectbox("Time Range", ["1 hour", "24 hours", "7 days", "30 days"], index=1)
+                    hours = {"1 hour": 1, "24 hours": 24, "7 days": 24 * 7, "30 days": 24 * 30}[window]
+                    since = (datetime.utcnow() - timedelta(hours=hours)).isoformat()
+                    metrics_response = api_call(
+                        "get", f"metrics/function/{selected_function['id']}",
+                        params={"since": since, "points": 200, "format": "columnar"}
+                    )
                     if metrics_response.status_code == 200:
-                        metrics = metrics_response.json()
-                        if metrics:
-                            # Convert to DataFrame
+                        metrics = metrics_response.json()["data"]
+                        if metrics["timestamp"]:
+                            # Columnar data loads straight into a DataFrame
                             df = pd.DataFrame(metrics)
                             df['timestamp'] = pd.to_datetime(df['timestamp'])
                             
                             # Execution time chart
                             st.subheader("Execution Time History")
-                            fig = px.line(df, x='timestamp', y='execution_time',
-                                        title="Function Execution Time")
+                            fig = px.line(df, x='timestamp', y=['avg_execution_time', 'p95_execution_time'],
+                                        title="Function Execution Time (s)")
                             st.plotly_chart(fig)
                             
                             # Memory usage chart
                             st.subheader("Memory Usage History")
-                            fig = px.line(df, x='timestamp', y='memory_usage',
+                            fig = px.line(df, x='timestamp', y=['avg_memory_usage', 'max_memory_usage'],
                                         title="Function Memory Usage (MB)")
                             st.plotly_chart(fig)
                             
+                            # CPU time chart
+                            st.subheader("CPU Time History")
+                            fig = px.line(df, x='timestamp', y='avg_cpu_time',
+                                        title="Function CPU Time (s)")
+                            st.plotly_chart(fig)
+                            
                             # Status distribution
                             st.subheader("Status Distribution")
-                            status_counts = df['status'].value_counts()
-                            fig = px.pie(values=status_counts.values,
-                                       names=status_counts.index,
+                            successes = int(df['success_count'].sum())
+                            failures = int(df['count'].sum()) - successes
+                            fig = px.pie(values=[successes, failures],
+                                       names=["success", "failed"],
                                        title="Execution Status Distribution")
                             st.plotly_chart(fig)
                         else:
@@ -0,0 +1,43 @@
+import os
+import tempfile
+import uuid
+
+import pytest
+
+# Point the app at a throwaway database before any backend module creates its engine
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
+os.environ.setdefault("EXECUTOR_ENGINE", "process")
+
+
+@pytest.fixture
+def make_function():
+    """Create function rows, deleting them and their metrics and invocations afterwards"""
+    from backend.models import SessionLocal, Function, FunctionMetrics, Invocation, MetricsRollup
+
+    created = []
+
+    def make(**fields):
+        name = f"test-{uuid.uuid4().hex[:8]}"
+        fields = dict({"name": name, "route": f"/{name}", "runtime": "python", "timeout": 5,
+                       "code": "def handler(event):\n    return event"}, **fields)
+        db = SessionLocal()
+        try:
+            function = Function(**fields)
+            db.add(function)
+            db.commit()
+            db.refresh(function)
+            db.expunge(function)
+        finally:
+            db.close()
+        created.append(function.id)
+        return function
+
+    yield make
+    db = SessionLocal()
+    try:
+        for model in (FunctionMetrics, MetricsRollup, Invocation):
+            db.query(model).filter(model.function_id.in_(created)).delete(synchronize_session=False)
+        db.query(Function).filter(Function.id.in_(created)).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
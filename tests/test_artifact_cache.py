@@ -0,0 +1,41 @@
+import os
+
+from backend.executor.cache import ArtifactCache
+
+CODE = "def handler():\n    return 1"
+
+
+def handler_file(path: str) -> str:
+    return os.path.join(path, "function.py")
+
+
+def test_entry_is_reused(tmp_path):
+    cache = ArtifactCache(root=str(tmp_path))
+    with cache.prepared(CODE, "python", CODE) as first:
+        pass
+    with cache.prepared(CODE, "python", CODE) as second:
+        assert second == first
+    assert cache.stats()["hits"] == 1
+
+
+def test_invalidated_pin_release_keeps_replacement(tmp_path):
+    cache = ArtifactCache(root=str(tmp_path))
+    with cache.prepared(CODE, "python", CODE) as old:
+        cache.invalidate(CODE, "python")
+        with cache.prepared(CODE, "python", CODE) as new:
+            assert new != old
+        assert os.path.exists(handler_file(old))
+    # Releasing the stale pin removes only its own directory
+    assert not os.path.exists(old)
+    assert os.path.exists(handler_file(new))
+    with cache.prepared(CODE, "python", CODE) as again:
+        assert again == new
+
+
+def test_cleared_pin_release_keeps_replacement(tmp_path):
+    cache = ArtifactCache(root=str(tmp_path))
+    with cache.prepared(CODE, "python", CODE) as old:
+        cache.clear()
+        with cache.prepared(CODE, "python", CODE) as new:
+            assert new != old
+    assert os.path.exists(handler_file(new))
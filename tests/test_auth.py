@@ -0,0 +1,57 @@
+import asyncio
+import time
+import uuid
+
+import pytest
+from fastapi import HTTPException
+from jose import jwt
+
+from backend.api.auth import ALGORITHM, SECRET_KEY, create_access_token, get_current_user
+from backend.models import SessionLocal, User
+from backend.services.token_cache import token_cache
+
+
+@pytest.fixture
+def user():
+    name = f"user-{uuid.uuid4().hex[:8]}"
+    db = SessionLocal()
+    try:
+        user = User(username=name, email=f"{name}@example.com", hashed_password="unused")
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        db.expunge(user)
+    finally:
+        db.close()
+    yield user
+    token_cache.clear()
+    db = SessionLocal()
+    try:
+        db.query(User).filter(User.id == user.id).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_token_is_cached(user):
+    token = create_access_token({"sub": user.username, "uid": user.id})
+    assert asyncio.run(get_current_user(token)).id == user.id
+    assert token_cache.get(token).id == user.id
+
+
+def test_token_without_exp_is_accepted_and_cached_for_the_ttl(user):
+    token = jwt.encode({"sub": user.username}, SECRET_KEY, algorithm=ALGORITHM)
+    assert asyncio.run(get_current_user(token)).id == user.id
+    _, expires_at = token_cache._entries[token]
+    assert expires_at <= time.time() + token_cache.ttl
+
+
+def test_cache_never_outlives_token_expiry(user):
+    token_cache.put("short-lived", user, time.time() - 1)
+    assert token_cache.get("short-lived") is None
+
+
+def test_invalid_token_is_rejected():
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(get_current_user("not-a-token"))
+    assert error.value.status_code == 401
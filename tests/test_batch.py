@@ -0,0 +1,115 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from backend.api import batch as batch_module
+from backend.api.batch import Batch, InvalidEvent, parse_event
+from backend.executor.concurrency import ConcurrencyLimiter
+
+
+class FakeExecutor:
+    """Doubles the event after a delay that shrinks with it, so later events finish first"""
+
+    def __init__(self):
+        self.running = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def execute(self, code, runtime, timeout, limits=None, event=None, context=None, layer=None):
+        with self._lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(0.01 * (5 - event % 5))
+        with self._lock:
+            self.running -= 1
+        if event < 0:
+            return {"status": "error", "output": "negative", "exit_code": 1}
+        return {"status": "success", "output": "", "result": event * 2, "exit_code": 0}
+
+
+@pytest.fixture
+def executor(monkeypatch):
+    executor = FakeExecutor()
+    recorded = []
+    monkeypatch.setattr(batch_module, "executor", executor)
+    monkeypatch.setattr(batch_module, "record_invocations",
+                        lambda function, invocations: recorded.extend(invocations))
+    executor.recorded = recorded
+    return executor
+
+
+def run_batch(function, events, parallelism=4, ordered=False, limiter=None, monkeypatch=None):
+    if limiter is not None:
+        monkeypatch.setattr(batch_module, "limiter", limiter)
+
+    async def collect():
+        return [json.loads(line) async for line in Batch(function, None, events, parallelism, ordered).relay()]
+
+    lines = asyncio.run(collect())
+    return lines[:-1], lines[-1]
+
+
+def test_ordered_results_follow_input(make_function, executor):
+    results, summary = run_batch(make_function(), list(range(10)), ordered=True)
+    assert [line["index"] for line in results] == list(range(10))
+    assert [line["result"] for line in results] == [n * 2 for n in range(10)]
+    assert summary["type"] == "summary"
+    assert (summary["count"], summary["succeeded"], summary["failed"]) == (10, 10, 0)
+
+
+def test_unordered_results_cover_every_event(make_function, executor):
+    results, _ = run_batch(make_function(), list(range(10)))
+    assert sorted(line["index"] for line in results) == list(range(10))
+    assert all(line["result"] == line["index"] * 2 for line in results)
+    assert len(executor.recorded) == 10
+
+
+def test_invalid_and_failed_events_are_reported_in_place(make_function, executor):
+    events = [1, InvalidEvent("Invalid JSON event: bad"), -1]
+    results, summary = run_batch(make_function(), events, ordered=True)
+    assert [line["status"] for line in results] == ["success", "error", "error"]
+    assert results[1]["output"] == "Invalid JSON event: bad"
+    assert (summary["succeeded"], summary["failed"]) == (1, 2)
+    # Invalid events never run, so they have no metrics
+    assert len(executor.recorded) == 2
+
+
+def test_events_wait_out_the_concurrency_limit(make_function, executor, monkeypatch):
+    function = make_function(max_concurrency=1)
+    limiter = ConcurrencyLimiter(queue_timeout=0.01)
+    results, summary = run_batch(function, list(range(6)), parallelism=3, limiter=limiter,
+                                 monkeypatch=monkeypatch)
+    assert summary["succeeded"] == 6
+    assert executor.peak == 1
+    assert limiter.in_flight == 0
+
+
+def test_parse_event():
+    assert parse_event(b'{"a": 1}') == {"a": 1}
+    assert isinstance(parse_event(b"{nope"), InvalidEvent)
+
+
+def test_failures_outside_the_executor_become_error_results(make_function, executor, monkeypatch):
+    class BrokenCache:
+        def key(self, function, event):
+            return "key"
+
+        def get(self, function_id, key):
+            raise RuntimeError("cache database is locked")
+
+    monkeypatch.setattr(batch_module, "result_cache", BrokenCache())
+    results, summary = run_batch(make_function(cacheable=True), [1, 2], ordered=True)
+    assert [line["status"] for line in results] == ["error", "error"]
+    assert results[0]["output"] == "cache database is locked"
+    assert summary["failed"] == 2
+
+
+def test_results_without_status_become_error_results(make_function, executor, monkeypatch):
+    monkeypatch.setattr(executor, "execute", lambda **kwargs: {"output": "partial"})
+    results, summary = run_batch(make_function(), [1])
+    assert results[0]["status"] == "error"
+    assert results[0]["output"] == "'status'"
+    assert summary["failed"] == 1
@@ -0,0 +1,85 @@
+import asyncio
+import json
+import subprocess
+import sys
+
+import pytest
+
+from backend.executor.concurrency import ConcurrencyLimiter, ConcurrencyLimitExceeded
+from backend.executor.runtimes import BOOTSTRAP_DIR
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_per_function_limit_queues_then_rejects():
+    async def scenario():
+        limiter = ConcurrencyLimiter(global_limit=10, per_function_limit=1, queue_timeout=0.1)
+        async with limiter.slot(1):
+            with pytest.raises(ConcurrencyLimitExceeded):
+                async with limiter.slot(1):
+                    pass
+            # Other functions have slots of their own
+            async with limiter.slot(2):
+                assert limiter.in_flight == 2
+        assert limiter.in_flight == 0
+
+    run(scenario())
+
+
+def test_max_concurrency_overrides_default():
+    async def scenario():
+        limiter = ConcurrencyLimiter(global_limit=10, per_function_limit=1, queue_timeout=0.1)
+        async with limiter.slot(1, 2):
+            async with limiter.slot(1, 2):
+                assert limiter.in_flight == 2
+
+    run(scenario())
+
+
+def test_global_limit_releases_function_slot():
+    async def scenario():
+        limiter = ConcurrencyLimiter(global_limit=1, per_function_limit=5, queue_timeout=0.1)
+        async with limiter.slot(1):
+            with pytest.raises(ConcurrencyLimitExceeded):
+                async with limiter.slot(2):
+                    pass
+        # The failed caller gave back its function slot as well
+        async with limiter.slot(2):
+            pass
+        assert limiter.waiting == 0
+
+    run(scenario())
+
+
+def test_waiting_caller_gets_released_slot():
+    async def scenario():
+        limiter = ConcurrencyLimiter(global_limit=10, per_function_limit=1, queue_timeout=2)
+        order = []
+
+        async def call(name, hold):
+            async with limiter.slot(1):
+                order.append(name)
+                await asyncio.sleep(hold)
+
+        await asyncio.gather(call("first", 0.1), call("second", 0))
+        return order
+
+    assert run(scenario()) == ["first", "second"]
+
+
+@pytest.mark.parametrize("code, limits, status", [
+    ("def handler():\n    return len(bytearray(512 * 1024 * 1024))", {"memory": 64}, "oom"),
+    ("def handler():\n    while True:\n        pass", {"cpu_seconds": 1}, "cpu_throttled"),
+    ("def handler():\n    return 1", {"memory": 64, "cpu_seconds": 1}, "success"),
+])
+def test_runner_enforces_process_limits(tmp_path, code, limits, status):
+    function = tmp_path / "function.py"
+    function.write_text(code)
+    process = subprocess.run(
+        [sys.executable, f"{BOOTSTRAP_DIR}/python_runtime.py", str(function)],
+        env={"FUNCTION_LIMITS": json.dumps(limits)}, capture_output=True, timeout=30
+    )
+    result = json.loads(process.stdout.splitlines()[-1])
+    assert result["status"] == status
@@ -0,0 +1,205 @@
+import asyncio
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend.executor.concurrency import ConcurrencyLimiter
+from backend.models import SessionLocal, Invocation
+from backend.services.invocation_queue import InvocationQueue
+
+
+class FakeExecutor:
+    """Returns the event as the result after a delay, tracking how many calls overlap"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.running = 0
+        self.peak = 0
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def execute(self, code, runtime, timeout, limits=None, event=None, context=None, layer=None):
+        with self._lock:
+            self.calls += 1
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(self.delay)
+        with self._lock:
+            self.running -= 1
+        return {"status": "success", "output": "", "result": event, "exit_code": 0}
+
+
+class NoLayers:
+    def wait(self, function, timeout):
+        return None
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield loop
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+def start_queue(executor, loop, limiter=None, workers=4):
+    queue = InvocationQueue(executor, NoLayers(), limiter or ConcurrencyLimiter(), workers=workers,
+                            poll_interval=0.05)
+    queue.start(loop)
+    return queue
+
+
+def wait_for(job_ids, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        db = SessionLocal()
+        try:
+            jobs = db.query(Invocation).filter(Invocation.id.in_(job_ids)).all()
+        finally:
+            db.close()
+        if jobs and all(job.status not in ("queued", "running") for job in jobs):
+            return {job.id: job for job in jobs}
+        time.sleep(0.05)
+    raise AssertionError("Jobs did not finish")
+
+
+def test_job_result_is_stored(make_function, loop):
+    function = make_function()
+    queue = start_queue(FakeExecutor(), loop)
+    try:
+        job = queue.enqueue(function.id, {"x": 1})
+        stored = wait_for([job.id])[job.id]
+    finally:
+        queue.stop()
+    assert stored.status == "success"
+    assert stored.result == {"x": 1}
+    assert stored.completed_at is not None
+
+
+def test_jobs_respect_max_concurrency(make_function, loop):
+    function = make_function(max_concurrency=1)
+    executor = FakeExecutor(delay=0.1)
+    # A short queue timeout, so jobs must wait out the limit rather than fail
+    limiter = ConcurrencyLimiter(queue_timeout=0.01)
+    queue = start_queue(executor, loop, limiter)
+    try:
+        jobs = [queue.enqueue(function.id, i).id for i in range(4)]
+        stored = wait_for(jobs)
+    finally:
+        queue.stop()
+    assert executor.peak == 1
+    assert all(job.status == "success" for job in stored.values())
+    assert limiter.in_flight == 0
+
+
+def test_jobs_count_towards_global_limit(make_function, loop):
+    functions = [make_function() for _ in range(3)]
+    executor = FakeExecutor(delay=0.1)
+    queue = start_queue(executor, loop, ConcurrencyLimiter(global_limit=2, queue_timeout=0.01))
+    try:
+        jobs = [queue.enqueue(function.id).id for function in functions for _ in range(2)]
+        wait_for(jobs)
+    finally:
+        queue.stop()
+    assert executor.peak == 2
+
+
+def test_job_is_failed_when_result_cannot_be_saved(make_function, loop):
+    class Unserializable(FakeExecutor):
+        def execute(self, *args, **kwargs):
+            return {"status": "success", "output": "", "result": object(), "exit_code": 0}
+
+    function = make_function()
+    queue = start_queue(Unserializable(), loop)
+    try:
+        job = queue.enqueue(function.id)
+        stored = wait_for([job.id])[job.id]
+    finally:
+        queue.stop()
+    assert stored.status == "error"
+    assert stored.output.startswith("Failed to save the invocation result")
+
+
+def test_delete_function_removes_its_invocations(make_function, loop):
+    from backend.api.functions import delete_function
+
+    function = make_function()
+    queue = start_queue(FakeExecutor(), loop)
+    try:
+        job = queue.enqueue(function.id)
+        wait_for([job.id])
+    finally:
+        queue.stop()
+    db = SessionLocal()
+    try:
+        delete_function(function.id, db)
+        assert db.query(Invocation).filter(Invocation.function_id == function.id).count() == 0
+    finally:
+        db.close()
+
+
+def running_job(function_id, owner, heartbeat_at):
+    db = SessionLocal()
+    try:
+        job = Invocation(id=uuid.uuid4().hex, function_id=function_id, status="running", owner=owner,
+                         started_at=heartbeat_at, heartbeat_at=heartbeat_at)
+        db.add(job)
+        db.commit()
+        return job.id
+    finally:
+        db.close()
+
+
+def status(job_id):
+    db = SessionLocal()
+    try:
+        return db.query(Invocation).filter(Invocation.id == job_id).first().status
+    finally:
+        db.close()
+
+
+def test_start_leaves_jobs_with_live_leases_alone(make_function, loop):
+    function = make_function()
+    job_id = running_job(function.id, "other-process", datetime.utcnow())
+    # No workers, so a requeued job would stay queued
+    queue = start_queue(FakeExecutor(), loop, workers=0)
+    queue.stop()
+    assert status(job_id) == "running"
+
+
+def test_expired_leases_are_retried(make_function, loop):
+    function = make_function()
+    job_id = running_job(function.id, "crashed-process", datetime.utcnow() - timedelta(hours=1))
+    queue = start_queue(FakeExecutor(), loop)
+    try:
+        stored = wait_for([job_id])[job_id]
+    finally:
+        queue.stop()
+    assert stored.status == "success"
+    assert stored.owner == queue.owner
+
+
+def test_running_jobs_keep_their_lease(make_function, loop):
+    function = make_function()
+    executor = FakeExecutor(delay=1)
+    queue = InvocationQueue(executor, NoLayers(), ConcurrencyLimiter(), poll_interval=0.05,
+                            heartbeat_interval=0.1, lease_timeout=0.5)
+    other = InvocationQueue(FakeExecutor(), NoLayers(), ConcurrencyLimiter(), workers=0,
+                            heartbeat_interval=0.1, lease_timeout=0.5)
+    queue.start(loop)
+    other.start(loop)
+    try:
+        job = queue.enqueue(function.id, 1)
+        stored = wait_for([job.id])[job.id]
+    finally:
+        queue.stop()
+        other.stop()
+    # The job outlived the lease timeout without being taken over
+    assert stored.status == "success"
+    assert executor.calls == 1
@@ -0,0 +1,58 @@
+import os
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend.executor.fleet.executor import FleetExecutor
+from backend.models import SessionLocal, Layer
+from backend.services.layers import LayerService
+
+
+@pytest.fixture
+def built_layer(tmp_path):
+    """Record ready layers with a directory under tmp_path, deleting the rows afterwards"""
+    created = []
+
+    def build():
+        hash = uuid.uuid4().hex
+        os.makedirs(tmp_path / hash)
+        last_used = datetime.utcnow() - timedelta(days=1)
+        db = SessionLocal()
+        try:
+            db.add(Layer(hash=hash, runtime="python", dependencies="requests", status="ready", size_bytes=1,
+                         built_at=last_used, last_used_at=last_used))
+            db.commit()
+        finally:
+            db.close()
+        created.append(hash)
+        return hash
+
+    yield build
+    db = SessionLocal()
+    try:
+        db.query(Layer).filter(Layer.hash.in_(created)).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_referenced_layers_are_never_collected(tmp_path, built_layer, make_function):
+    kept, collected = built_layer(), built_layer()
+    make_function(layer_hash=kept)
+    service = LayerService(executor=None, directory=str(tmp_path), max_layers=0, max_bytes=0, min_idle=0)
+    service.run_once()
+    assert os.path.isdir(tmp_path / kept)
+    assert not os.path.exists(tmp_path / collected)
+    assert service.get(kept).status == "ready"
+    assert service.get(collected) is None
+    assert service.evicted == 1
+
+
+def test_fleet_refuses_to_build_layers(tmp_path):
+    executor = FleetExecutor()
+    try:
+        with pytest.raises(RuntimeError, match="not supported"):
+            executor.build_layer("python", str(tmp_path))
+    finally:
+        executor.shutdown()
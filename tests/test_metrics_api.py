@@ -0,0 +1,61 @@
+import json
+import os
+
+from backend.api.metrics import get_function_metrics, get_function_stats
+from backend.models import SessionLocal, FunctionMetrics
+from backend.services.metrics_writer import MetricsWriter
+from backend.services.result_cache import result_cache
+
+
+def record(function_id: int, count: int):
+    writer = MetricsWriter()
+    writer.add_many([FunctionMetrics.values(function_id, {"status": "success", "output": ""}, 0.1)
+                     for _ in range(count)])
+    writer.flush()
+
+
+def fetch(function_id: int, **params):
+    params = dict({"since": None, "until": None, "after_id": None, "limit": 1000, "points": None,
+                   "format": "rows"}, **params)
+    db = SessionLocal()
+    try:
+        response = get_function_metrics(function_id, db=db, **params)
+    finally:
+        db.close()
+    return json.loads(response.body), response.headers.get("X-Next-After-Id")
+
+
+def test_pages_follow_after_id(make_function):
+    function = make_function()
+    record(function.id, 5)
+    first, next_after_id = fetch(function.id, limit=3)
+    assert len(first) == 3 and next_after_id == str(first[-1]["id"])
+    second, next_after_id = fetch(function.id, limit=3, after_id=int(next_after_id))
+    assert len(second) == 2 and next_after_id is None
+    assert [row["id"] for row in first + second] == sorted({row["id"] for row in first + second})
+
+
+def test_columnar_and_points(make_function):
+    function = make_function()
+    record(function.id, 4)
+    columnar, _ = fetch(function.id, format="columnar", limit=2)
+    assert len(columnar["data"]["id"]) == 2
+    assert columnar["next_after_id"] == columnar["data"]["id"][-1]
+    points, _ = fetch(function.id, points=10)
+    assert sum(point["count"] for point in points) == 4
+
+
+def test_stats_label_cache_counts_per_process(make_function):
+    function = make_function(cacheable=True)
+    key = result_cache.key(function, {"x": 1})
+    assert result_cache.get(function.id, key) is None
+    result_cache.put(function.id, key, {"status": "success", "output": "", "result": 1}, 60)
+    assert result_cache.get(function.id, key) is not None
+    db = SessionLocal()
+    try:
+        stats = get_function_stats(function.id, db=db)
+    finally:
+        db.close()
+    result_cache.invalidate(function.id)
+    assert stats["result_cache"] == {"scope": "process", "pid": os.getpid(), "hits": 1, "misses": 1,
+                                     "hit_rate": 0.5}
@@ -0,0 +1,81 @@
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from backend.models import SessionLocal, FunctionMetrics
+from backend.services import metrics_writer as writer_module
+from backend.services.metrics_writer import MetricsWriter
+
+
+def row(function_id: int, status: str = "success", **fields) -> dict:
+    result = dict({"status": status, "output": "", "execution_time": 0.1}, **fields)
+    return FunctionMetrics.values(function_id, result, 0.1)
+
+
+def stored(function_id: int) -> int:
+    db = SessionLocal()
+    try:
+        return db.query(FunctionMetrics).filter(FunctionMetrics.function_id == function_id).count()
+    finally:
+        db.close()
+
+
+def test_flush_writes_buffered_rows(make_function):
+    function = make_function()
+    writer = MetricsWriter(batch_size=100)
+    writer.add_many([row(function.id) for _ in range(5)])
+    writer.flush()
+    assert stored(function.id) == 5
+    assert writer.stats() == {"buffered": 0, "written": 5, "dropped": 0, "flushes": 1}
+
+
+def test_overflow_drops_oldest():
+    writer = MetricsWriter(buffer_size=3, overflow_policy="drop_oldest")
+    writer.add_many([{"n": n} for n in range(5)])
+    assert [r["n"] for r in writer._buffer] == [2, 3, 4]
+    assert writer.dropped == 2
+
+
+def test_overflow_drops_newest():
+    writer = MetricsWriter(buffer_size=3, overflow_policy="drop_newest")
+    writer.add_many([{"n": n} for n in range(5)])
+    assert [r["n"] for r in writer._buffer] == [0, 1, 2]
+    assert writer.dropped == 2
+
+
+def test_bad_rows_are_dropped_and_the_rest_written(make_function):
+    function = make_function()
+    writer = MetricsWriter()
+    rows = [row(function.id) for _ in range(7)]
+    # Spans that can't be stored as JSON make the database reject the row
+    rows[2]["spans"] = rows[5]["spans"] = object()
+    writer.add_many(rows)
+    writer.flush()
+    assert stored(function.id) == 5
+    assert writer.dropped == 2
+    assert writer.stats()["buffered"] == 0
+    # Later flushes aren't held up by the bad rows
+    writer.add(row(function.id))
+    writer.flush()
+    assert stored(function.id) == 6
+
+
+def test_transient_failure_keeps_rows_for_retry(make_function, monkeypatch):
+    function = make_function()
+    writer = MetricsWriter()
+    writer.add_many([row(function.id) for _ in range(3)])
+
+    def locked():
+        raise OperationalError("INSERT", {}, Exception("database is locked"))
+
+    with monkeypatch.context() as patch:
+        patch.setattr(writer_module.engine, "connect", locked)
+        writer.flush()
+    assert writer.stats()["buffered"] == 3
+    assert writer.dropped == 0
+    writer.flush()
+    assert stored(function.id) == 3
+
+
+def test_unknown_overflow_policy_is_rejected():
+    with pytest.raises(ValueError):
+        MetricsWriter(overflow_policy="drop_all")
@@ -0,0 +1,69 @@
+import shutil
+
+import pytest
+
+from backend.executor.process.executor import ProcessExecutor
+
+needs_node = pytest.mark.skipif(shutil.which("node") is None, reason="Node.js is not installed")
+
+
+@pytest.fixture
+def executor():
+    executor = ProcessExecutor(size=2)
+    yield executor
+    executor.shutdown()
+
+
+def test_python_handler_gets_event(executor):
+    result = executor.execute("def handler(event):\n    return event['x'] * 2", "python", 5, event={"x": 21})
+    assert result["status"] == "success"
+    assert result["result"] == 42
+
+
+def test_python_timeout_replaces_worker(executor):
+    result = executor.execute("import time\ndef handler():\n    time.sleep(10)", "python", 1)
+    assert result["status"] == "timeout"
+    assert executor.execute("def handler():\n    return 1", "python", 5)["result"] == 1
+
+
+def test_python_memory_limit(executor):
+    code = "def handler():\n    return len(bytearray(512 * 1024 * 1024))"
+    result = executor.execute(code, "python", 10, {"memory": 64})
+    assert result["status"] == "oom"
+    # The limit only applies to the call that set it
+    assert executor.execute(code, "python", 10)["result"] == 512 * 1024 * 1024
+
+
+def test_python_cpu_limit(executor):
+    result = executor.execute("def handler():\n    while True:\n        pass", "python", 5, {"cpus": 0.2})
+    assert result["status"] == "cpu_throttled"
+
+
+@needs_node
+def test_node_heap_limit(executor):
+    code = "exports.handler = () => { const a = []; for (let i = 0; i < 3e7; i++) a.push({ i }); return a.length }"
+    result = executor.execute(code, "javascript", 20, {"memory": 64})
+    assert result["status"] == "oom"
+
+
+@needs_node
+def test_node_buffer_limit(executor):
+    code = "exports.handler = () => [1, 2, 3, 4, 5, 6].map(() => Buffer.alloc(100 * 2 ** 20, 1)).length"
+    result = executor.execute(code, "javascript", 20, {"memory": 64})
+    assert result["status"] == "oom"
+
+
+@needs_node
+def test_node_cpu_limit(executor):
+    code = "exports.handler = () => { const start = Date.now(); while (Date.now() - start < 5000) {} }"
+    result = executor.execute(code, "javascript", 10, {"cpus": 0.1})
+    assert result["status"] == "cpu_throttled"
+
+
+@needs_node
+def test_node_workers_kept_per_memory_limit(executor):
+    code = "exports.handler = (event) => event.x * 2"
+    assert executor.execute(code, "javascript", 5, {"memory": 64}, event={"x": 21})["result"] == 42
+    assert executor.execute(code, "javascript", 5, {"memory": 128}, event={"x": 1})["result"] == 2
+    assert executor._idle_queue("javascript", None, 64).qsize() == 1
+    assert executor._idle_queue("javascript", None, 128).qsize() == 1
@@ -0,0 +1,14 @@
+from backend.executor.protocol import collect
+
+
+def test_chunks_are_folded_into_the_result_output():
+    messages = [{"type": "chunk", "data": "hello\n"},
+                {"type": "result", "status": "success", "output": "", "result": 1}]
+    assert collect(messages) == {"status": "success", "output": "hello", "result": 1}
+
+
+def test_stream_without_result_is_an_error():
+    assert collect([]) == {"status": "error", "output": "No result from runtime", "exit_code": -1}
+    result = collect([{"type": "chunk", "data": "Traceback ...\n"}])
+    assert result["status"] == "error"
+    assert result["output"] == "Traceback ..."
@@ -0,0 +1,90 @@
+import threading
+from datetime import datetime
+
+from backend.models import SessionLocal, engine, FunctionMetrics, MetricsRollup
+from backend.services.rollups import LatencySketch, _insert_if_absent, update_rollups, window_stats
+
+
+def rows(function_id: int, count: int, status: str = "success", execution_time: float = 0.1):
+    result = {"status": status, "output": ""}
+    return [FunctionMetrics.values(function_id, result, execution_time) for _ in range(count)]
+
+
+def stats(function_id: int):
+    db = SessionLocal()
+    try:
+        return window_stats(db, function_id)
+    finally:
+        db.close()
+
+
+def test_rows_fold_into_every_resolution(make_function):
+    function = make_function()
+    with engine.begin() as connection:
+        update_rollups(connection, rows(function.id, 3) + rows(function.id, 1, "error", 0.5))
+    db = SessionLocal()
+    try:
+        rollups = db.query(MetricsRollup).filter(MetricsRollup.function_id == function.id).all()
+    finally:
+        db.close()
+    assert sorted(rollup.resolution for rollup in rollups) == ["day", "hour", "minute", "total"]
+    assert all(rollup.count == 4 and rollup.success_count == 3 for rollup in rollups)
+    result = stats(function.id)
+    assert result["total_executions"] == 4
+    assert result["success_rate"] == 75
+    assert result["max_execution_time"] == 0.5
+
+
+def test_existing_bucket_is_merged_not_replaced(make_function):
+    function = make_function()
+    with engine.begin() as connection:
+        update_rollups(connection, rows(function.id, 2))
+    with engine.begin() as connection:
+        update_rollups(connection, rows(function.id, 3, execution_time=1.0))
+    result = stats(function.id)
+    assert result["total_executions"] == 5
+    assert result["min_execution_time"] == 0.1
+    assert result["max_execution_time"] == 1.0
+
+
+def test_insert_if_absent_leaves_existing_bucket(make_function):
+    function = make_function()
+    values = {"function_id": function.id, "resolution": "total", "bucket_start": datetime(1970, 1, 1),
+              "count": 1, "latency_sketch": {}}
+    with engine.begin() as connection:
+        assert _insert_if_absent(connection, MetricsRollup.__table__, values)
+        assert not _insert_if_absent(connection, MetricsRollup.__table__, dict(values, count=99))
+    assert stats(function.id)["total_executions"] == 1
+
+
+def test_concurrent_writers_keep_every_count(make_function):
+    function = make_function()
+    errors = []
+
+    def write():
+        try:
+            for _ in range(10):
+                with engine.begin() as connection:
+                    connection.execute(FunctionMetrics.__table__.insert(), rows(function.id, 5))
+                    update_rollups(connection, rows(function.id, 5))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert stats(function.id)["total_executions"] == 200
+
+
+def test_sketch_quantiles_within_accuracy():
+    sketch = LatencySketch()
+    for value in range(1, 1001):
+        sketch.add(value / 1000)
+    assert abs(sketch.quantile(0.5) - 0.5) <= 0.5 * 0.01 + 0.001
+    assert abs(sketch.quantile(0.99) - 0.99) <= 0.99 * 0.01 + 0.001
+    merged = LatencySketch(sketch.to_json())
+    merged.merge(sketch)
+    assert sum(merged.counts.values()) == 2000
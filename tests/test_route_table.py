@@ -0,0 +1,76 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+from backend.api.gateway import http_event, http_response
+from backend.models import SessionLocal, Function
+from backend.services.route_table import RouteTable
+
+
+def test_miss_falls_back_to_database(make_function):
+    table = RouteTable()
+    # Created after the table was loaded, as if by another process
+    function = make_function(route="orders/")
+    assert table.by_route("/orders") is None
+    assert table.fetch_route("orders").id == function.id
+    assert table.by_route("/orders").id == function.id
+    assert table.fetch_route("/no-such-route") is None
+
+
+def test_reload_drops_functions_deleted_elsewhere(make_function):
+    function = make_function()
+    table = RouteTable()
+    table.load()
+    assert table.by_id(function.id) is not None
+    db = SessionLocal()
+    try:
+        db.query(Function).filter(Function.id == function.id).delete()
+        db.commit()
+    finally:
+        db.close()
+    assert table.load()
+    assert table.by_id(function.id) is None
+    assert table.by_route(function.route) is None
+
+
+def test_gateway_event_drops_credentials():
+    async def receive():
+        return {"type": "http.request", "body": b"{}", "more_body": False}
+
+    headers = [(b"authorization", b"Bearer secret"), (b"proxy-authorization", b"Basic secret"),
+               (b"x-custom", b"kept")]
+    request = Request({"type": "http", "method": "POST", "headers": headers, "query_string": b""}, receive)
+    event = asyncio.run(http_event(request, "orders"))
+    assert event["headers"] == {"x-custom": "kept"}
+
+
+def test_misses_are_remembered_until_the_route_is_added(make_function):
+    table = RouteTable(miss_ttl=60)
+    assert table.fetch_route("/later") is None
+    function = make_function(route="/later")
+    # Still remembered as missing, so no query is made
+    assert table.fetch_route("/later") is None
+    table.put(function)
+    assert table.fetch_route("/later").id == function.id
+
+
+def test_unknown_paths_are_rejected_before_authentication(make_function):
+    from backend.main import app
+
+    client = TestClient(app)
+    assert client.get("/favicon.ico").status_code == 404
+    response = client.delete("/api/v1/functions/")
+    assert response.status_code == 405
+    assert response.headers["allow"] == "GET, POST"
+    function = make_function()
+    assert client.get(function.route).status_code == 401
+
+
+def test_invalid_status_code_is_a_bad_gateway():
+    result = {"status": "success", "output": "", "trace_id": "t", "result": {"statusCode": "teapot"}}
+    response = http_response("r", result)
+    assert response.status_code == 502
+    assert b"invalid statusCode" in response.body
+    result["result"] = {"statusCode": "201", "body": "made"}
+    assert http_response("r", result).status_code == 201
@@ -0,0 +1,26 @@
+import asyncio
+
+from starlette.requests import Request
+
+from backend.api import execute
+
+
+def request(body: bytes = b"") -> Request:
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return Request({"type": "http", "method": "POST", "headers": [], "query_string": b""}, receive)
+
+
+def test_slot_released_when_body_never_sent(make_function):
+    function = make_function()
+
+    async def scenario():
+        response = await execute.stream_function(function.id, request(), trace=False)
+        held = execute.limiter.in_flight
+        # What Starlette runs after a client disconnects before the first chunk
+        await response.background()
+        await response.background()
+        return held, execute.limiter.in_flight
+
+    assert asyncio.run(scenario()) == (1, 0)